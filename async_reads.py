@@ -0,0 +1,264 @@
+"""
+Async read path for the hot read-only endpoints.
+
+/mps/{id}, /mps/{id}/scores, /leaderboard and the uncached part of
+/mps?ids= run a few fixed SELECTs through `async_reads`. This is one of
+two backends:
+
+- AsyncpgBackend: asyncpg pools for the primary and, if configured, the
+  read replica (when asyncpg is installed and the database is Postgres).
+  Requests wait on the event loop instead of holding one of AnyIO's 40
+  threadpool slots, and asyncpg prepares each statement once per
+  connection and reuses it (ASYNC_READ_STATEMENT_CACHE, set 0 behind a
+  transaction-mode PgBouncer). Like db_routing's RoutingPool it reads from
+  the replica only under route("replica") (@reads_from, DB_ROUTE_OVERRIDES)
+  and falls back to the primary while the replica lags or is unreachable.
+- PonyThreadBackend: the same SQL through Pony in a worker thread, so it
+  follows the endpoint's @reads_from route (see db_routing). Used for
+  SQLite and when asyncpg is missing; both backends share the queries and
+  the row mapping.
+
+Pony stays in charge of the schema, the admin endpoints and every write.
+ASYNC_READS=0 switches the endpoints back to their Pony ORM versions
+(benchmarks/bench_async.py compares the two).
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from db_routing import ReplicaHealth, current_route, PG_LAG_SQL, REPLICA_MAX_LAG_SECONDS, ROUTING_STATS
+
+ASYNC_READS = os.getenv("ASYNC_READS", "1") != "0"
+ASYNC_POOL_MIN = int(os.getenv("ASYNC_READ_POOL_MIN", "2"))
+ASYNC_POOL_MAX = int(os.getenv("ASYNC_READ_POOL_MAX", "20"))
+ASYNC_STATEMENT_CACHE = int(os.getenv("ASYNC_READ_STATEMENT_CACHE", "100"))
+
+MP_COLUMNS = "m.id, m.name, m.slug, m.party, m.riding, m.image_url, m.committees, m.total_score, " \
+             "m.score_breakdown, m.penalty"
+
+# Weekly points summed in SQL, like mp_to_dict() does over mp.daily_scores
+MP_SQL = f"""SELECT {MP_COLUMNS},
+       COALESCE((SELECT SUM(d.points_today) FROM dailyscore d WHERE d.mp = m.id AND d.date >= $2), 0) AS weekly_points
+FROM mp m WHERE m.id = $1"""
+
+# Uncached ids of /mps?ids= in one query; the Pony backend expands ANY($1) to IN (...)
+MPS_BY_IDS_SQL = f"""SELECT {MP_COLUMNS},
+       COALESCE((SELECT SUM(d.points_today) FROM dailyscore d WHERE d.mp = m.id AND d.date >= $2), 0) AS weekly_points
+FROM mp m WHERE m.id = ANY($1)"""
+
+MP_SCORES_SQL = """SELECT m.name, m.total_score, d.date, d.points_today
+FROM mp m LEFT JOIN dailyscore d ON d.mp = m.id
+WHERE m.id = $1
+ORDER BY d.date, d.id"""
+
+LEADERBOARD_FIRST_SQL = """SELECT id, username, score, updated_at FROM leaderboardentry
+ORDER BY score DESC, id LIMIT $1"""
+
+LEADERBOARD_AFTER_SQL = """SELECT id, username, score, updated_at FROM leaderboardentry
+WHERE score < $1 OR (score = $1 AND id > $2)
+ORDER BY score DESC, id LIMIT $3"""
+
+class AsyncpgBackend(ReplicaHealth):
+    name = "asyncpg"
+    # Errors that mean the replica is unreachable, not that the query is wrong
+    connection_errors = (OSError, asyncio.TimeoutError)
+
+    def __init__(self, primary, replica=None, max_lag_seconds=REPLICA_MAX_LAG_SECONDS):
+        super().__init__(max_lag_seconds)
+        self.primary = primary
+        self.replica = replica
+
+    @classmethod
+    async def connect(cls, dsn, replica_dsn=None):
+        import asyncpg
+
+        def create_pool(target):
+            return asyncpg.create_pool(
+                target, min_size=ASYNC_POOL_MIN, max_size=ASYNC_POOL_MAX,
+                statement_cache_size=ASYNC_STATEMENT_CACHE,
+            )
+        backend = cls(await create_pool(dsn))
+        backend.connection_errors += (asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+        if replica_dsn:
+            try:
+                backend.replica = await create_pool(replica_dsn)
+            except Exception as e:
+                print(f"ASYNC READS ERROR: Could not open the replica pool, reading from primary: {e}")
+        return backend
+
+    async def replica_usable(self):
+        if self._replica_down():
+            return False
+        if self._lag_check_due():
+            try:
+                lag = float(await self.replica.fetchval(PG_LAG_SQL) or 0)
+            except Exception as e:
+                self._lag_measured(error=e)
+                return False
+            self._lag_measured(lag)
+        return self._lag_ok()
+
+    async def _pool(self):
+        """The replica pool under route("replica") while it is usable, else the primary."""
+        if current_route() == "replica" and self.replica is not None:
+            if await self.replica_usable():
+                ROUTING_STATS["replica"] += 1
+                return self.replica
+            ROUTING_STATS["fallbacks"] += 1
+        ROUTING_STATS["primary"] += 1
+        return self.primary
+
+    async def fetch(self, sql, *args):
+        pool = await self._pool()
+        if pool is self.primary:
+            return await self._fetch(pool, sql, args)
+        try:
+            return await self._fetch(pool, sql, args)
+        except self.connection_errors as e:
+            self._replica_failed(e)
+            ROUTING_STATS["fallbacks"] += 1
+            return await self._fetch(self.primary, sql, args)
+
+    async def _fetch(self, pool, sql, args):
+        from metrics import record_statement
+        async with pool.acquire() as conn:
+            started = time.perf_counter()
+            rows = await conn.fetch(sql, *args)
+            record_statement(sql, time.perf_counter() - started)
+        return [dict(row) for row in rows]
+
+    async def close(self):
+        await self.primary.close()
+        if self.replica is not None:
+            await self.replica.close()
+
+class PonyThreadBackend:
+    name = "pony-thread"
+
+    def __init__(self):
+        self._converted = {}
+
+    def _pony_sql(self, sql, sizes):
+        # $1, $2 ... -> Pony's $p1, $p2 ... (resolved from the locals we pass);
+        # "= ANY($n)" with a list argument -> "IN ($pn_0, $pn_1, ...)"
+        key = (sql, sizes)
+        if key not in self._converted:
+            converted = sql
+            for i, size in enumerate(sizes, start=1):
+                if size is not None:
+                    items = ", ".join(f"$p{i}_{j}" for j in range(size)) or "NULL"
+                    converted = converted.replace(f"= ANY(${i})", f"IN ({items})")
+            self._converted[key] = re.sub(r"\$(\d+)", r"$p\1", converted)
+        return self._converted[key]
+
+    def _fetch_sync(self, sql, args):
+        from pony.orm import db_session
+        from models import db
+        params = {}
+        for i, value in enumerate(args, start=1):
+            if isinstance(value, (list, tuple)):
+                params.update((f"p{i}_{j}", item) for j, item in enumerate(value))
+            else:
+                params[f"p{i}"] = value
+        sizes = tuple(len(a) if isinstance(a, (list, tuple)) else None for a in args)
+        with db_session:
+            cursor = db.execute(self._pony_sql(sql, sizes), {}, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    async def fetch(self, sql, *args):
+        return await asyncio.to_thread(self._fetch_sync, sql, args)
+
+    async def close(self):
+        pass
+
+class AsyncReads:
+    def __init__(self):
+        self.backend = PonyThreadBackend()
+
+    async def start(self, dsn=None, replica_dsn=None):
+        """Open asyncpg pools for a Postgres `dsn` (and replica) if asyncpg is available."""
+        if not _is_postgres(dsn):
+            return self.backend.name
+        try:
+            self.backend = await AsyncpgBackend.connect(dsn, replica_dsn if _is_postgres(replica_dsn) else None)
+        except ImportError:
+            print("ASYNC READS: asyncpg not installed, reading through Pony in threads")
+        except Exception as e:
+            print(f"ASYNC READS ERROR: Could not open asyncpg pool, reading through Pony in threads: {e}")
+        print(f"ASYNC READS: Using {self.backend.name}")
+        return self.backend.name
+
+    async def close(self):
+        await self.backend.close()
+        self.backend = PonyThreadBackend()
+
+    async def fetch(self, sql, *args):
+        return await self.backend.fetch(sql, *args)
+
+async_reads = AsyncReads()
+
+def _is_postgres(dsn):
+    return bool(dsn) and dsn.startswith(("postgres://", "postgresql://"))
+
+def _json_value(value):
+    # asyncpg returns json/jsonb as text; so does SQLite
+    return json.loads(value) if isinstance(value, str) else value
+
+def _datetime_value(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _week_start():
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+def mp_from_row(row):
+    """Attribute view of an mp row for main.mp_to_dict()."""
+    row = dict(row)
+    row["committees"] = _json_value(row["committees"])
+    row["score_breakdown"] = _json_value(row["score_breakdown"])
+    return SimpleNamespace(**row)
+
+async def fetch_mp(mp_id):
+    """(MP attribute view, weekly points) or None."""
+    rows = await async_reads.fetch(MP_SQL, mp_id, _week_start())
+    if not rows:
+        return None
+    row = rows[0]
+    weekly_points = row.pop("weekly_points")
+    return mp_from_row(row), int(weekly_points or 0)
+
+async def fetch_mps_by_ids(mp_ids):
+    """{id: (MP attribute view, weekly points)} for the ids that exist."""
+    rows = await async_reads.fetch(MPS_BY_IDS_SQL, list(mp_ids), _week_start())
+    found = {}
+    for row in rows:
+        weekly_points = row.pop("weekly_points")
+        found[row["id"]] = (mp_from_row(row), int(weekly_points or 0))
+    return found
+
+async def fetch_mp_scores(mp_id):
+    rows = await async_reads.fetch(MP_SCORES_SQL, mp_id)
+    if not rows:
+        return None
+    return {
+        "mp_id": mp_id,
+        "mp_name": rows[0]["name"],
+        "total_score": rows[0]["total_score"],
+        "scores": [{"date": str(r["date"]), "points": r["points_today"]} for r in rows if r["date"] is not None],
+    }
+
+async def fetch_leaderboard_page(limit=50, cursor=None):
+    """Same contract as leaderboard.get_leaderboard_page(); raises ValueError for a bad cursor."""
+    from leaderboard import decode_cursor, encode_cursor, entry_to_dict
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        rows = await async_reads.fetch(LEADERBOARD_AFTER_SQL, last_score, last_id, limit)
+    else:
+        rows = await async_reads.fetch(LEADERBOARD_FIRST_SQL, limit)
+    entries = [entry_to_dict(r["username"], r["score"], _datetime_value(r["updated_at"])) for r in rows]
+    next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["id"]) if len(rows) == limit else None
+    return entries, next_cursor
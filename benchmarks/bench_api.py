@@ -0,0 +1,159 @@
+"""
+End-to-end API benchmark against a synthetic dataset.
+
+Usage:
+    python benchmarks/bench_api.py --generate --reset --registrations 20000 --output bench.json
+    python benchmarks/bench_api.py --db sqlite:/tmp/fp_bench.sqlite --compare bench.json
+
+Requests go through the full ASGI app in-process (FastAPI TestClient), so
+the numbers include routing, middleware, caches and SQL, but not network or
+uvicorn (see load_test.py for that). Each endpoint gets warmup requests
+and then --requests timed requests run one after another. The leaderboard
+job is timed with the same loop. Results are written as JSON so runs can be
+compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_data
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies_ms, elapsed_s, errors=0):
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 0.50), 3),
+        "p90_ms": round(percentile(values, 0.90), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "mean_ms": round(statistics.fmean(values), 3),
+        "max_ms": round(values[-1], 3),
+        "throughput_rps": round(len(values) / elapsed_s, 1) if elapsed_s > 0 else None,
+    }
+
+def bench_callable(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        if fn() is False:
+            errors += 1
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+def endpoint_cases(sample_mp_ids, sample_user_id):
+    mp_id = sample_mp_ids[0]
+    ids = ",".join(str(i) for i in sample_mp_ids[:5])
+    return [
+        ("GET /mps", "/mps"),
+        ("GET /mps?ids=", f"/mps?ids={ids}"),
+        ("GET /mps/search", "/mps/search?q=synthetic mp 1"),
+        ("GET /mps/{id}/scores", f"/mps/{mp_id}/scores"),
+        ("GET /scoreboard", "/scoreboard?limit=25"),
+        ("GET /scoreboard?window=all", "/scoreboard?limit=25&window=all"),
+        ("GET /leaderboard", "/leaderboard?limit=50"),
+        ("GET /leaderboard/party", "/leaderboard/party"),
+        ("GET /leaderboard/rank/{user}", f"/leaderboard/rank/{sample_user_id}"),
+        ("GET /special", "/special"),
+    ]
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'case':<34} {'p50 ms':>10} {'was':>10} {'p99 ms':>10} {'was':>10}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        print(f"{name:<34} {result['p50_ms']:10.2f} {before['p50_ms']:10.2f} "
+              f"{result['p99_ms']:10.2f} {before['p99_ms']:10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    synthetic_data.add_arguments(parser)
+    parser.add_argument("--generate", action="store_true", help="generate the dataset before benchmarking")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--job-runs", type=int, default=5, help="timed leaderboard job runs")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="print a comparison with an earlier results JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SYNC_API_KEY", "bench-key")
+    synthetic_data.bind_database(args.db)
+    dataset = None
+    if args.generate:
+        if args.reset:
+            synthetic_data.reset_synthetic()
+        dataset = synthetic_data.generate(args.mps, args.days, args.registrations,
+                                          args.subscribers, args.seed, verbose=False)
+
+    # Import after binding: main uses the already-bound database
+    from fastapi.testclient import TestClient
+    from pony.orm import db_session, select
+    from models import MP, Registration
+    import main as app_module
+
+    with db_session:
+        sample_mp_ids = select(m.id for m in MP).order_by(1)[:5]
+        sample_user_id = select(r.user_id for r in Registration).order_by(1).first()
+    if not sample_mp_ids or not sample_user_id:
+        parser.error("database has no MPs/registrations; run with --generate")
+
+    client = TestClient(app_module.app)
+    results = {}
+    print(f"{'case':<34} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for name, url in endpoint_cases(sample_mp_ids, sample_user_id):
+        def request(url=url):
+            return client.get(url).status_code == 200
+        results[name] = bench_callable(request, args.requests, args.warmup)
+        r = results[name]
+        print(f"{name:<34} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['throughput_rps']:8.1f}"
+              + (f"  ({r['errors']} errors)" if r["errors"] else ""))
+
+    results["job leaderboard_calc"] = bench_callable(app_module.recompute_leaderboard, args.job_runs, 1)
+    r = results["job leaderboard_calc"]
+    print(f"{'job leaderboard_calc':<34} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['throughput_rps']:8.1f}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "database": "sqlite" if args.db.startswith("sqlite:") else "postgres",
+        "dataset": dataset,
+        "settings": {"requests": args.requests, "warmup": args.warmup, "job_runs": args.job_runs},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Read-endpoint throughput with and without the async read path.
+
+Usage:
+    python benchmarks/bench_async.py --generate --reset --concurrency 200 --duration 30
+    python benchmarks/bench_async.py --db postgres://... --concurrency 200 --output async.json
+
+Starts the app (see load_test.py) once with ASYNC_READS=0, where /mps,
+/mps/{id}, /mps/{id}/scores and /leaderboard run their Pony handlers in
+the threadpool, and once with ASYNC_READS=1, then drives both with the
+same closed-loop clients spread evenly over those four endpoints. On
+Postgres with asyncpg installed the second run reads through the asyncpg
+pool; otherwise through Pony in worker threads, which mostly measures the
+handler overhead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_data
+from bench_api import git_revision
+from load_test import start_server, wait_for_health, report, print_results
+
+ENDPOINTS = ["mps", "mp", "scores", "leaderboard"]
+
+async def drive(url, concurrency, duration, timeout, seed):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        resp = await client.get("/mps")
+        resp.raise_for_status()
+        mp_ids = [m["id"] for m in resp.json()]
+        if not mp_ids:
+            raise RuntimeError("server has no MPs; run with --generate")
+        samples = []
+
+        async def user(rng, deadline):
+            while time.monotonic() < deadline:
+                kind = rng.choice(ENDPOINTS)
+                path = {
+                    "mps": "/mps",
+                    "mp": f"/mps/{rng.choice(mp_ids)}",
+                    "scores": f"/mps/{rng.choice(mp_ids)}/scores",
+                    "leaderboard": "/leaderboard?limit=50",
+                }[kind]
+                started = time.monotonic()
+                try:
+                    status = (await client.get(path)).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                samples.append((kind, started, (time.monotonic() - started) * 1000, status))
+
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(user(random.Random(seed + i), deadline) for i in range(concurrency)))
+        return report(samples, time.monotonic() - started)
+
+def run_mode(args, async_reads, generate):
+    os.environ["ASYNC_READS"] = "1" if async_reads else "0"
+    args.generate = generate
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"\nStarting server with ASYNC_READS={os.environ['ASYNC_READS']} (log: {args.server_log})")
+    process = start_server(args)
+    try:
+        wait_for_health(url, process)
+        print(f"Running {args.concurrency} clients for {args.duration}s")
+        return asyncio.run(drive(url, args.concurrency, args.duration, args.timeout, args.seed))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    synthetic_data.add_arguments(parser)
+    parser.add_argument("--generate", action="store_true", help="generate the dataset before the first run")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per mode")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "fp_bench_async_server.log"))
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+    args.replay = None
+    args.replay_latency_ms = 0
+
+    generate = args.generate
+    results = {}
+    for mode, enabled in (("threadpool", False), ("async", True)):
+        results[mode] = run_mode(args, enabled, generate)
+        generate = args.reset = False
+        print_results(mode, results[mode])
+
+    base, new = results["threadpool"]["all"], results["async"]["all"]
+    print(f"\nthroughput {base['throughput_rps']} -> {new['throughput_rps']} req/s, "
+          f"p99 {base['p99_ms']} -> {new['p99_ms']} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "database": "sqlite" if args.db.startswith("sqlite:") else "postgres",
+                "settings": {"concurrency": args.concurrency, "duration_s": args.duration},
+                "results": results,
+            }, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark the NumPy team scoring engine against the old per-team loop.
+
+Usage: python benchmarks/bench_scoring.py [--sizes 1000,100000,1000000]
+
+Uses synthetic data only (no database): 343 MPs with random weekly scores
+and N registrations of 1-5 random MPs each.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring_engine import ScoringEngine, TEAM_SIZE
+
+NUM_MPS = 343
+LOOP_MAX_SIZE = 100_000  # the pure-Python baseline gets slow past this
+
+def synthetic_teams(n, mp_ids, rng):
+    return [rng.sample(mp_ids, rng.randint(1, TEAM_SIZE)) for _ in range(n)]
+
+def python_loop(teams, mp_scores):
+    return [sum(mp_scores.get(int(mp_id), 0) for mp_id in team) for team in teams]
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mp_ids = list(range(1000, 1000 + NUM_MPS))
+    mp_scores = {mp_id: rng.randint(-20, 200) for mp_id in mp_ids}
+    engine = ScoringEngine(list(mp_scores), list(mp_scores.values()))
+
+    print(f"{'registrations':>14} {'matrix ms':>10} {'score ms':>9} {'captain ms':>11} {'loop ms':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        teams = synthetic_teams(size, mp_ids, rng)
+        captains = [team[0] for team in teams]
+
+        matrix, matrix_ms = timed(engine.team_matrix, teams)
+        totals, score_ms = timed(engine.score_matrix, matrix)
+        _, captain_ms = timed(engine.score_matrix, matrix, captains, 2.0)
+
+        loop_ms = None
+        if size <= LOOP_MAX_SIZE:
+            expected, loop_ms = timed(python_loop, teams, mp_scores)
+            assert totals.tolist() == expected, "engine and loop disagree"
+
+        loop_col = f"{loop_ms:9.1f}" if loop_ms is not None else f"{'-':>9}"
+        print(f"{size:>14,} {matrix_ms:10.1f} {score_ms:9.2f} {captain_ms:11.2f} {loop_col}")
+
+if __name__ == "__main__":
+    main()
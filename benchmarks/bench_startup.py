@@ -0,0 +1,109 @@
+"""
+Import-time profile of the app module, checked against a budget.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 900 --output startup.json
+
+Runs `python -X importtime -c "import main"` in fresh interpreters (the
+first run only warms the bytecode cache) and reports the median import
+time plus the slowest modules by cumulative and self time. Fails (exit 1)
+if the median exceeds --budget-ms or any --forbid module is imported:
+those are created lazily or by the post-startup warm-up (main.warm_up) and
+must stay off the cold-start path.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_api import git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FORBID = "numpy,apscheduler,better_profanity"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def profile_import(module="main"):
+    """{module: (self_us, cumulative_us, depth)} for one cold interpreter."""
+    env = dict(os.environ, SYNC_API_KEY=os.getenv("SYNC_API_KEY", "bench-key"))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+def summarize_runs(runs, module, top):
+    totals = [run[module][1] / 1000 for run in runs]
+    last = runs[-1]
+    by_cumulative = sorted(((name, c) for name, (_, c, depth) in last.items() if depth == 1),
+                           key=lambda x: x[1], reverse=True)
+    by_self = sorted(((name, s) for name, (s, _, _) in last.items()), key=lambda x: x[1], reverse=True)
+    return {
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "modules_imported": len(last),
+        "top_imports_ms": [(name, round(us / 1000, 1)) for name, us in by_cumulative[:top]],
+        "top_self_ms": [(name, round(us / 1000, 1)) for name, us in by_self[:top]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs after one warm-up run")
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="fail above this median import time")
+    parser.add_argument("--forbid", default=DEFAULT_FORBID,
+                        help=f"comma-separated modules that must not be imported (default {DEFAULT_FORBID})")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    profile_import(args.module)
+    runs = [profile_import(args.module) for _ in range(args.runs)]
+    result = summarize_runs(runs, args.module, args.top)
+    forbidden = [name for name in args.forbid.split(",") if name and name in runs[-1]]
+
+    print(f"import {args.module}: median {result['median_ms']} ms "
+          f"(min {result['min_ms']}, max {result['max_ms']}, {result['modules_imported']} modules)")
+    print(f"\n{'direct import':<40} {'cumulative ms':>14}")
+    for name, ms in result["top_imports_ms"]:
+        print(f"{name:<40} {ms:14.1f}")
+    print(f"\n{'module':<40} {'self ms':>14}")
+    for name, ms in result["top_self_ms"]:
+        print(f"{name:<40} {ms:14.1f}")
+
+    failures = []
+    if result["median_ms"] > args.budget_ms:
+        failures.append(f"median import time {result['median_ms']} ms exceeds budget {args.budget_ms} ms")
+    if forbidden:
+        failures.append(f"imported at startup: {', '.join(forbidden)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "settings": {"module": args.module, "runs": args.runs, "budget_ms": args.budget_ms},
+                "results": result,
+                "failures": failures,
+            }, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
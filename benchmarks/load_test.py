@@ -0,0 +1,318 @@
+"""
+HTTP load test against a locally started uvicorn instance.
+
+Usage:
+    python benchmarks/load_test.py --generate --reset --concurrency 50 --duration 60
+    python benchmarks/load_test.py --concurrency 200 --duration 120 --sync-at 30 --output load.json
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 20
+
+Unless --url is given, the app is started in a subprocess (this script with
+--serve) on the --db dataset, with server output going to --server-log.
+Virtual users then loop over a weighted traffic mix until --duration runs
+out: draft-pool searches, team refreshes via /mps?ids=, scoreboard and
+leaderboard tabs, and registrations (each from its own X-Forwarded-For
+address so the per-IP limit does not kick in). Everything runs on one
+httpx.AsyncClient.
+
+--sync-at N posts /admin/sync-now N seconds into the run. The started
+server reads OpenParliament from a replay fixture built from the MPs in the
+database (installed with replay.install), so the sync does real writes
+without touching the network. Requests that start while the sync runs are
+also reported separately.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_data
+from bench_api import git_revision, summarize
+from replay import replay_key, install as install_replay
+
+DEFAULT_MIX = "search=30,team=30,scoreboard=35,register=5"
+SCOREBOARD_TABS = ["/scoreboard?limit=25", "/scoreboard?limit=25&window=all", "/leaderboard?limit=50",
+                   "/leaderboard/party", "/special"]
+TEAM_SIZE = 5
+API_KEY = "load-test-key"
+
+# --- replay fixture ---------------------------------------------------------
+
+def build_replay_fixture(path, days=7, seed=42):
+    """Write an OpenParliament replay fixture for the MPs currently in the database."""
+    from pony.orm import db_session
+    from models import MP
+    from scraper import BASE_URL
+
+    rng = random.Random(seed)
+    with db_session:
+        mps = [(m.slug, m.name, m.party, m.riding) for m in MP.select(lambda m: m.active)]
+    politicians = [{
+        "name": name,
+        "url": f"/politicians/{slug}/",
+        "current_party": {"short_name": {"en": party or "Independent"}},
+        "current_riding": {"name": {"en": riding}} if riding else None,
+        "image": None,
+    } for slug, name, party, riding in mps]
+    responses = {replay_key(f"{BASE_URL}/politicians/?limit=500"): {
+        "objects": politicians, "pagination": {"next_url": None}}}
+    responses[replay_key(f"{BASE_URL}/bills/?limit=100")] = {"objects": [], "pagination": {"next_url": None}}
+
+    today = date.today()
+    for days_ago in range(days):
+        day = (today - timedelta(days=days_ago)).isoformat()
+        speakers = rng.sample(mps, min(len(mps), 60))
+        responses[replay_key(f"{BASE_URL}/speeches/?date={day}&limit=500")] = {
+            "objects": [{"politician_url": f"/politicians/{slug}/"} for slug, *_ in speakers
+                        for _ in range(rng.randint(1, 4))],
+            "pagination": {"next_url": None}}
+        vote_urls = [f"/votes/45-1/{days_ago * 10 + i}/" for i in range(rng.randint(0, 3))]
+        responses[replay_key(f"{BASE_URL}/votes/?date={day}&limit=500")] = {
+            "objects": [{"url": url} for url in vote_urls], "pagination": {"next_url": None}}
+        for url in vote_urls:
+            responses[replay_key(f"{BASE_URL}/votes/ballots/?vote={url}&limit=500")] = {
+                "objects": [{"politician_url": f"/politicians/{slug}/"} for slug, *_ in mps
+                            if rng.random() < 0.9],
+                "pagination": {"next_url": None}}
+
+    with open(path, "w") as f:
+        json.dump({"created_at": datetime.now().isoformat(timespec="seconds"), "responses": responses}, f)
+    return path
+
+def serve(args):
+    """--serve: bind the dataset, optionally generate it, then run uvicorn in this process."""
+    synthetic_data.bind_database(args.db)
+    if args.generate:
+        if args.reset:
+            synthetic_data.reset_synthetic()
+        synthetic_data.generate(args.mps, args.days, args.registrations, args.subscribers, args.seed)
+    if args.replay:
+        if not os.path.exists(args.replay):
+            build_replay_fixture(args.replay, seed=args.seed)
+        install_replay(args.replay, args.replay_latency_ms)
+
+    import uvicorn
+    import main as app_module
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+def start_server(args):
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--db", args.db, "--port", str(args.port),
+               "--mps", str(args.mps), "--days", str(args.days), "--registrations", str(args.registrations),
+               "--subscribers", str(args.subscribers), "--seed", str(args.seed),
+               "--replay-latency-ms", str(args.replay_latency_ms)]
+    if args.generate:
+        command.append("--generate")
+    if args.reset:
+        command.append("--reset")
+    if args.replay:
+        command += ["--replay", args.replay]
+    env = dict(os.environ, SYNC_API_KEY=API_KEY)
+    env.pop("RENDER", None)  # never start the scheduler under load tests
+    log = open(args.server_log, "w")
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for_health(url, process=None, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}; see the server log")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not become healthy in {timeout}s")
+
+# --- traffic ------------------------------------------------------------------
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("search", "team", "scoreboard", "register"):
+            raise argparse.ArgumentTypeError(f"unknown traffic kind {kind!r}")
+        mix[kind] = float(weight)
+    return mix
+
+class LoadRun:
+    def __init__(self, client, mps, mix, think_time, seed):
+        self.client = client
+        self.mp_ids = [m["id"] for m in mps]
+        # Draft-pool searches type a prefix of a name, party or riding
+        self.search_terms = sorted({word[:n].lower() for m in mps for word in m["name"].split()
+                                    for n in (3, 5)} | {(m["party"] or "")[:4].lower() for m in mps} - {""})
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.samples = []  # (kind, started, latency_ms, status)
+        self.registrations = 0
+
+    def next_request(self):
+        kind = self.rng.choices(self.kinds, weights=self.weights)[0]
+        if kind == "search":
+            return kind, "GET", f"/mps/search?q={self.rng.choice(self.search_terms)}", {}
+        if kind == "team":
+            ids = ",".join(str(i) for i in self.rng.sample(self.mp_ids, TEAM_SIZE))
+            return kind, "GET", f"/mps?ids={ids}", {}
+        if kind == "scoreboard":
+            return kind, "GET", self.rng.choice(SCOREBOARD_TABS), {}
+        self.registrations += 1
+        team = self.rng.sample(self.mp_ids, TEAM_SIZE)
+        address = f"10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}"
+        return kind, "POST", "/api/register", {
+            "json": {"display_name": f"load{self.registrations}", "team_name": "Load Test",
+                     "captain_mp_id": team[0], "team_mp_ids": team},
+            "headers": {"X-Forwarded-For": address},
+        }
+
+    async def user(self, deadline):
+        while time.monotonic() < deadline:
+            kind, method, path, kwargs = self.next_request()
+            started = time.monotonic()
+            try:
+                resp = await self.client.request(method, path, **kwargs)
+                status = resp.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            self.samples.append((kind, started, (time.monotonic() - started) * 1000, status))
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+async def trigger_sync(client, delay):
+    await asyncio.sleep(delay)
+    print(f"  {delay:.0f}s: triggering /admin/sync-now")
+    started = time.monotonic()
+    try:
+        resp = await client.post("/admin/sync-now", headers={"x-api-key": API_KEY}, timeout=None)
+        status = resp.json().get("status") if resp.status_code == 200 else resp.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    finished = time.monotonic()
+    print(f"  sync finished in {finished - started:.1f}s ({status})")
+    return {"started": started, "finished": finished, "duration_s": round(finished - started, 2), "status": status}
+
+def is_error(status):
+    return not isinstance(status, int) or status >= 400
+
+def report(samples, elapsed):
+    by_kind = defaultdict(list)
+    for sample in samples:
+        by_kind[sample[0]].append(sample)
+    by_kind["all"] = samples
+    results = {}
+    for kind, rows in by_kind.items():
+        if not rows:
+            continue
+        errors = sum(1 for *_, status in rows if is_error(status))
+        result = summarize([latency for _, _, latency, _ in rows], elapsed, errors)
+        result["error_rate"] = round(errors / len(rows), 4)
+        statuses = defaultdict(int)
+        for *_, status in rows:
+            statuses[str(status)] += 1
+        result["statuses"] = dict(statuses)
+        results[kind] = result
+    return results
+
+def print_results(title, results):
+    print(f"\n{title}")
+    print(f"{'kind':<12} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>8}")
+    for kind, r in results.items():
+        print(f"{kind:<12} {r['requests']:9d} {r['throughput_rps']:8.1f} {r['p50_ms']:8.1f} "
+              f"{r['p90_ms']:8.1f} {r['p99_ms']:8.1f} {r['error_rate']:8.2%}")
+
+async def run_load(args, url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        resp = await client.get("/mps")
+        resp.raise_for_status()
+        mps = resp.json()
+        if len(mps) < TEAM_SIZE:
+            raise RuntimeError("server has fewer than 5 MPs; run with --generate")
+        run = LoadRun(client, mps, args.mix, args.think_time, args.seed)
+
+        print(f"Running {args.concurrency} users for {args.duration}s against {url}")
+        started = time.monotonic()
+        deadline = started + args.duration
+        sync_task = asyncio.create_task(trigger_sync(client, args.sync_at)) if args.sync_at is not None else None
+        await asyncio.gather(*(run.user(deadline) for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+        sync = await sync_task if sync_task else None
+
+    output = {"overall": report(run.samples, elapsed)}
+    print_results("Overall", output["overall"])
+    if sync:
+        window = [s for s in run.samples if sync["started"] <= s[1] < sync["finished"]]
+        sync_elapsed = min(sync["finished"], started + elapsed) - sync["started"]
+        output["during_sync"] = report(window, sync_elapsed) if window else {}
+        if window:
+            print_results(f"While syncing ({sync['duration_s']}s, {sync['status']})", output["during_sync"])
+        sync = {k: v for k, v in sync.items() if k in ("duration_s", "status")}
+    return output, sync
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    synthetic_data.add_arguments(parser)
+    parser.add_argument("--generate", action="store_true", help="generate the dataset before starting")
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--think-time", type=float, default=0,
+                        help="mean pause between a user's requests, in seconds (0 = closed loop)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"traffic weights (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout")
+    parser.add_argument("--sync-at", type=float, help="trigger a replayed sync this many seconds in")
+    parser.add_argument("--replay", help="replay fixture path (built from the database if missing)")
+    parser.add_argument("--replay-latency-ms", type=float, default=50,
+                        help="simulated OpenParliament latency per replayed request")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "fp_load_server.log"))
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    if args.sync_at is not None and not args.replay and not args.url:
+        args.replay = os.path.join(tempfile.gettempdir(), f"fp_replay_{os.getpid()}.json")
+    process = None
+    url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    try:
+        if not args.url:
+            print(f"Starting server on {url} (log: {args.server_log})")
+            process = start_server(args)
+        wait_for_health(url, process)
+        results, sync = asyncio.run(run_load(args, url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "database": "sqlite" if args.db.startswith("sqlite:") else "postgres",
+                "settings": {"concurrency": args.concurrency, "duration_s": args.duration,
+                             "think_time_s": args.think_time, "mix": args.mix, "sync_at_s": args.sync_at},
+                "sync": sync,
+                "results": results,
+            }, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
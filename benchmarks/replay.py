@@ -0,0 +1,48 @@
+"""
+Replayed OpenParliament responses for load tests and offline syncs.
+
+A fixture is {"responses": {key: json}} keyed by replay_key(url) (see
+load_test.build_replay_fixture). Either pass make_client(fixture) to
+scraper.run_sync() / run_sync_mps_only(), or install(fixture) so syncs
+started by the app itself (e.g. /admin/sync-now) read from it instead of
+the network.
+"""
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def replay_key(url):
+    """Fixture key for a request URL: path plus sorted query, without `format`."""
+    url = httpx.URL(url)
+    params = sorted((k, v) for k, v in url.params.multi_items() if k != "format")
+    path = url.path if url.path.endswith("/") else url.path + "/"
+    return path + ("?" + str(httpx.QueryParams(params)) if params else "")
+
+def replay_transport(fixture_path, latency_ms=0):
+    """MockTransport answering from a fixture; misses are 404s."""
+    with open(fixture_path) as f:
+        responses = json.load(f)["responses"]
+
+    async def handler(request):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        body = responses.get(replay_key(request.url))
+        if body is None:
+            return httpx.Response(404, json={"error": "not in replay fixture"})
+        return httpx.Response(200, json=body)
+
+    return httpx.MockTransport(handler)
+
+def make_client(fixture_path, latency_ms=0):
+    return httpx.AsyncClient(timeout=60.0, transport=replay_transport(fixture_path, latency_ms))
+
+def install(fixture_path, latency_ms=0):
+    """Make every sync in this process read from the fixture."""
+    import scraper
+    scraper.SYNC_TRANSPORT = replay_transport(fixture_path, latency_ms)
+    print(f"Scraper: Replaying responses from {fixture_path}")
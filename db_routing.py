@@ -0,0 +1,226 @@
+"""
+Read-replica routing for Pony sessions.
+
+Pony binds one provider per Database, and each thread keeps one connection
+in the provider's pool. enable_replica() swaps that pool for a
+RoutingPool. The RoutingPool hands out a connection to the replica when the
+session was opened under route("replica"), and a primary connection
+otherwise. The choice is made when a db_session first touches the database,
+so it holds for the whole session. A nested db_session keeps its outer
+session's connection.
+
+Endpoints opt in with @reads_from("replica"). DB_ROUTE_OVERRIDES
+("get_leaderboard=primary,get_mp=replica") flips individual endpoints
+without a deploy. Code that writes, or whose results must match the
+primary, wraps its sessions in route("primary").
+
+The replica is skipped, and reads go to the primary, while its replication
+lag is above max_lag_seconds (checked every LAG_CHECK_SECONDS) or for
+REPLICA_RETRY_SECONDS after it fails to connect. async_reads' asyncpg
+backend follows the same route() and the same checks (ReplicaHealth).
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+LAG_CHECK_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+
+PG_LAG_SQL = """SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END"""
+
+ROUTING_STATS = {"primary": 0, "replica": 0, "fallbacks": 0, "lag_seconds": None, "replica_error": None}
+
+_route = ContextVar("db_route", default="primary")
+
+def _parse_overrides(spec):
+    overrides = {}
+    for part in (spec or "").split(","):
+        name, _, target = part.strip().partition("=")
+        if name and target in ("primary", "replica"):
+            overrides[name] = target
+    return overrides
+
+ROUTE_OVERRIDES = _parse_overrides(os.getenv("DB_ROUTE_OVERRIDES"))
+
+@contextmanager
+def route(target):
+    """Route db_sessions opened inside this block to "primary" or "replica"."""
+    token = _route.set(target)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+def current_route():
+    return _route.get()
+
+def reads_from(target="replica"):
+    """Endpoint decorator: run the handler's sessions against `target` (see ROUTE_OVERRIDES)."""
+    def decorator(fn):
+        def effective():
+            return ROUTE_OVERRIDES.get(fn.__name__, target)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with route(effective()):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with route(effective()):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class ReplicaHealth:
+    """
+    Whether a replica may serve reads: its last measured lag is at most
+    max_lag_seconds and it has not failed in the last REPLICA_RETRY_SECONDS.
+    Subclasses measure the lag (RoutingPool here, async_reads' asyncpg backend).
+    """
+
+    def __init__(self, max_lag_seconds=REPLICA_MAX_LAG_SECONDS):
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_seconds = None
+        self._lag_checked = 0.0
+        self._unavailable_until = 0.0
+        self._check_lock = threading.Lock()
+
+    def _replica_down(self):
+        return time.monotonic() < self._unavailable_until
+
+    def _lag_check_due(self):
+        """True when this caller should re-measure; it must then call _lag_measured()."""
+        # One caller re-checks at a time; the others use the last reading
+        return time.monotonic() - self._lag_checked >= LAG_CHECK_SECONDS \
+            and self._check_lock.acquire(blocking=False)
+
+    def _lag_measured(self, lag=None, error=None):
+        try:
+            if error is not None:
+                self._replica_failed(error)
+            else:
+                self.lag_seconds = lag
+                ROUTING_STATS["lag_seconds"] = lag
+                ROUTING_STATS["replica_error"] = None
+        finally:
+            self._lag_checked = time.monotonic()
+            self._check_lock.release()
+
+    def _lag_ok(self):
+        return self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+
+    def _replica_failed(self, error):
+        print(f"DB ROUTING: Replica unavailable, reading from primary: {error}")
+        ROUTING_STATS["replica_error"] = str(error)
+        self.lag_seconds = None
+        self._unavailable_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+class RoutingPool(ReplicaHealth):
+    """Stands in for the provider's pool; both wrapped pools are thread-local."""
+
+    def __init__(self, primary, replica, max_lag_seconds=REPLICA_MAX_LAG_SECONDS, lag_probe=None):
+        super().__init__(max_lag_seconds)
+        self.primary = primary
+        self.replica = replica
+        self.lag_probe = lag_probe
+
+    def _measure_lag(self):
+        con, _ = self.replica.connect()
+        try:
+            if self.lag_probe is not None:
+                return self.lag_probe(con)
+            cursor = con.cursor()
+            cursor.execute(PG_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+        finally:
+            self.replica.release(con)
+
+    def replica_usable(self):
+        if self._replica_down():
+            return False
+        if self._lag_check_due():
+            try:
+                lag = self._measure_lag()
+            except Exception as e:
+                self._lag_measured(error=e)
+                return False
+            self._lag_measured(lag)
+        return self._lag_ok()
+
+    def _owner(self, con):
+        return self.replica if con is getattr(self.replica, "con", None) else self.primary
+
+    # Pool interface used by Pony's provider
+
+    def connect(self):
+        if _route.get() == "replica":
+            if self.replica_usable():
+                try:
+                    result = self.replica.connect()
+                    ROUTING_STATS["replica"] += 1
+                    return result
+                except Exception as e:
+                    self._replica_failed(e)
+            ROUTING_STATS["fallbacks"] += 1
+        ROUTING_STATS["primary"] += 1
+        return self.primary.connect()
+
+    def release(self, con):
+        self._owner(con).release(con)
+
+    def drop(self, con):
+        self._owner(con).drop(con)
+
+    def disconnect(self):
+        self.primary.disconnect()
+        self.replica.disconnect()
+
+def make_replica_pool(provider, replica):
+    """A pool like the provider's own for `replica`: "sqlite:<path>" or a postgres URL."""
+    if provider.dialect == "SQLite":
+        from pony.orm.dbproviders.sqlite import SQLitePool
+        if not replica.startswith("sqlite:"):
+            raise ValueError("A SQLite primary needs a sqlite:<path> replica")
+        return SQLitePool(False, os.path.abspath(replica[len("sqlite:"):]), False)
+    from pony.orm.dbproviders.postgres import PGPool
+    dsn = replica.replace("postgres://", "postgresql://", 1)
+    if "sslmode=" not in dsn:
+        dsn += f"{'&' if '?' in dsn else '?'}sslmode=require"
+    return PGPool(provider.dbapi_module, dsn=dsn)
+
+def enable_replica(db, replica, max_lag_seconds=REPLICA_MAX_LAG_SECONDS, lag_probe=None):
+    """Route replica-marked sessions of a bound `db` to `replica`."""
+    disable_replica(db)
+    if lag_probe is None and db.provider.dialect == "SQLite":
+        # No replication to measure between SQLite files
+        lag_probe = lambda con: 0
+    db.provider.pool = RoutingPool(db.provider.pool, make_replica_pool(db.provider, replica),
+                                   max_lag_seconds, lag_probe)
+    print(f"DB ROUTING: Read replica enabled (max lag {max_lag_seconds}s)")
+    return db.provider.pool
+
+def disable_replica(db):
+    pool = db.provider.pool
+    if isinstance(pool, RoutingPool):
+        pool.replica.disconnect()
+        db.provider.pool = pool.primary
+
+def replica_status(db):
+    pool = db.provider.pool if db.provider is not None else None
+    return {
+        "enabled": isinstance(pool, RoutingPool),
+        "max_lag_seconds": pool.max_lag_seconds if isinstance(pool, RoutingPool) else None,
+        "overrides": ROUTE_OVERRIDES,
+        **ROUTING_STATS,
+    }
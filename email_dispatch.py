@@ -0,0 +1,181 @@
+"""
+Async email delivery for the weekly score emails.
+
+EmailDispatcher sends already-rendered messages through Resend (primary) or
+MailerSend (fallback) using one pooled httpx.AsyncClient, with at most
+`concurrency` requests in flight. Resend messages without an idempotency
+key go out through its batch endpoint (up to RESEND_BATCH_SIZE emails per
+request).
+
+Messages are plain dicts: {"to", "subject", "html", "text"}, optionally with
+an "idempotency_key" so a resend is not delivered twice. A batch request can
+only carry one key for all its messages, which would not match if a resend
+were batched differently, so keyed messages are always sent one by one
+under their own key.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Email configuration (Resend primary, MailerSend fallback)
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+RESEND_FROM_EMAIL = os.getenv("RESEND_FROM_EMAIL", "onboarding@resend.dev")
+RESEND_API_URL = os.getenv("RESEND_API_URL", "https://api.resend.com")
+MAILERSEND_API_KEY = os.getenv("MAILERSEND_API_KEY")
+MAILERSEND_FROM_EMAIL = "test@test-pzkmgq7yj0yl059v.mlsender.net"  # Verified test domain
+MAILERSEND_API_URL = os.getenv("MAILERSEND_API_URL", "https://api.mailersend.com/v1")
+
+EMAIL_CONCURRENCY = int(os.getenv("EMAIL_CONCURRENCY", "8"))
+EMAIL_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+RESEND_BATCH_SIZE = 100  # Resend's limit per /emails/batch request
+
+# Cumulative counters for this process
+EMAIL_STATS = {
+    "sent": 0,
+    "failed": 0,
+    "requests": 0,
+    "last_run": None,
+}
+
+def default_provider():
+    if RESEND_API_KEY:
+        return "resend"
+    if MAILERSEND_API_KEY:
+        return "mailersend"
+    return None
+
+class EmailDispatcher:
+    def __init__(self, provider=None, concurrency=EMAIL_CONCURRENCY, batch_size=RESEND_BATCH_SIZE,
+                 transport=None, resend_url=RESEND_API_URL, mailersend_url=MAILERSEND_API_URL):
+        self.provider = provider or default_provider()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.resend_url = resend_url.rstrip("/")
+        self.mailersend_url = mailersend_url.rstrip("/")
+        self._transport = transport
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=EMAIL_TIMEOUT,
+            transport=self._transport,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+        self._client = None
+
+    def _resend_payload(self, message):
+        return {
+            "from": RESEND_FROM_EMAIL,
+            "to": [message["to"]],
+            "subject": message["subject"],
+            "html": message["html"],
+            "text": message["text"],
+        }
+
+    async def _post(self, url, api_key, payload, idempotency_key=None):
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        async with self._semaphore:
+            EMAIL_STATS["requests"] += 1
+            return await self._client.post(url, json=payload, headers=headers)
+
+    async def send_batch(self, messages):
+        """Send one Resend batch (messages without idempotency keys). Returns a list of (message, ok, error)."""
+        try:
+            response = await self._post(f"{self.resend_url}/emails/batch", RESEND_API_KEY,
+                                        [self._resend_payload(m) for m in messages])
+        except httpx.HTTPError as e:
+            return [(m, False, str(e)) for m in messages]
+        if response.status_code in (200, 202):
+            return [(m, True, None) for m in messages]
+        error = f"{response.status_code} - {response.text[:200]}"
+        return [(m, False, error) for m in messages]
+
+    async def send_one(self, message):
+        """Send a single message. Returns (message, ok, error)."""
+        if self.provider == "resend":
+            url, api_key = f"{self.resend_url}/emails", RESEND_API_KEY
+            payload = self._resend_payload(message)
+        else:
+            url, api_key = f"{self.mailersend_url}/email", MAILERSEND_API_KEY
+            payload = {
+                "from": {"email": MAILERSEND_FROM_EMAIL, "name": "Fantasy Parliament"},
+                "to": [{"email": message["to"]}],
+                "subject": message["subject"],
+                "html": message["html"],
+                "text": message["text"],
+            }
+        try:
+            response = await self._post(url, api_key, payload, message.get("idempotency_key"))
+        except httpx.HTTPError as e:
+            return message, False, str(e)
+        if response.status_code in (200, 202):
+            return message, True, None
+        return message, False, f"{response.status_code} - {response.text[:200]}"
+
+    async def send_all(self, messages):
+        """
+        Send every message and return a run summary with per-message results
+        and throughput.
+        """
+        started = time.perf_counter()
+        if not self.provider:
+            print(f"EMAIL: No API key configured (Resend or MailerSend), skipping {len(messages)} emails")
+            results = [(m, False, "no provider configured") for m in messages]
+        elif self.provider == "resend" and self.batch_size > 1:
+            unkeyed = [m for m in messages if not m.get("idempotency_key")]
+            keyed = [m for m in messages if m.get("idempotency_key")]
+            batches = [unkeyed[i:i + self.batch_size] for i in range(0, len(unkeyed), self.batch_size)]
+            batch_results, keyed_results = await asyncio.gather(
+                asyncio.gather(*(self.send_batch(b) for b in batches)),
+                asyncio.gather(*(self.send_one(m) for m in keyed)),
+            )
+            results = [r for batch in batch_results for r in batch] + list(keyed_results)
+        else:
+            results = await asyncio.gather(*(self.send_one(m) for m in messages))
+
+        sent = sum(1 for _, ok, _ in results if ok)
+        failed = len(results) - sent
+        duration = time.perf_counter() - started
+        EMAIL_STATS["sent"] += sent
+        EMAIL_STATS["failed"] += failed
+        EMAIL_STATS["last_run"] = datetime.now()
+
+        for message, ok, error in results:
+            if not ok and self.provider:
+                print(f"EMAIL: Failed to send to {message['to']}: {error}")
+        summary = {
+            "provider": self.provider,
+            "sent": sent,
+            "failed": failed,
+            "total": len(results),
+            "duration_s": round(duration, 3),
+            "emails_per_second": round(len(results) / duration, 1) if duration > 0 else None,
+            "results": results,
+        }
+        print(f"EMAIL: {sent}/{len(results)} sent via {self.provider} in {summary['duration_s']}s "
+              f"({summary['emails_per_second']}/s)")
+        return summary
+
+async def send_messages(messages, **kwargs):
+    async with EmailDispatcher(**kwargs) as dispatcher:
+        return await dispatcher.send_all(messages)
+
+def send_messages_sync(messages, **kwargs):
+    """Blocking wrapper for worker threads (no running event loop)."""
+    return asyncio.run(send_messages(messages, **kwargs))
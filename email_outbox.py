@@ -0,0 +1,156 @@
+"""
+Durable outbox for the weekly score emails.
+
+enqueue_week() records one EmailOutbox row per subscriber for the week
+(idempotent: the (email, week_start) key means re-running never duplicates).
+drain_outbox() claims due rows in batches, sends them through EmailDispatcher
+and records the outcome:
+
+    pending -> sending -> sent
+                       -> pending (retry after backoff) -> ... -> failed
+
+A row is claimed by moving it to "sending" with a lease. If the process dies
+mid-send, the lease expires and the row is picked up again by the next drain.
+Each message carries an idempotency key of the form weekly/<week>/<email>.
+The provider uses it to drop a duplicate send, including the resend of a
+row whose first attempt was accepted just before a crash.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from pony.orm import db_session, select, count
+from models import EmailOutbox, Subscriber
+from email_dispatch import EmailDispatcher
+from scores import current_week_start
+from weekly_email import build_email_context, render_score_email
+
+OUTBOX_STATES = ("pending", "sending", "sent", "failed")
+OUTBOX_BATCH_SIZE = 500
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 3600
+SENDING_LEASE = timedelta(minutes=10)
+
+def backoff_delay(attempts):
+    """Delay before the next attempt after `attempts` failed tries."""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+def enqueue_week(week_start=None):
+    """Add an outbox row for every subscriber missing one this week. Returns rows added."""
+    week_start = week_start or current_week_start()
+    with db_session:
+        existing = set(select(o.email for o in EmailOutbox if o.week_start == week_start))
+        added = 0
+        for email in select(s.email for s in Subscriber):
+            if email not in existing:
+                EmailOutbox(email=email, week_start=week_start)
+                added += 1
+    return added
+
+def claim_due(week_start, limit=OUTBOX_BATCH_SIZE, now=None):
+    """
+    Move up to `limit` due rows to "sending" and return (id, email).
+    Includes "sending" rows whose lease expired (left by a crashed run).
+    """
+    now = now or datetime.utcnow()
+    with db_session:
+        rows = EmailOutbox.select(
+            lambda o: o.week_start == week_start
+            and o.state in ("pending", "sending")
+            and o.next_attempt_at <= now
+        ).order_by(EmailOutbox.id).for_update(skip_locked=True)[:limit]
+        for row in rows:
+            row.state = "sending"
+            row.attempts += 1
+            row.next_attempt_at = now + SENDING_LEASE
+        return [(row.id, row.email) for row in rows]
+
+def render_claimed(claimed, week_start, context):
+    """Render messages for claimed rows. Returns (messages, {outbox_id: error})."""
+    emails = [email for _, email in claimed]
+    with db_session:
+        subscribers = {e: (name, mps) for e, name, mps in
+                       select((s.email, s.name, s.selected_mps) for s in Subscriber if s.email in emails)}
+    messages, errors = [], {}
+    for outbox_id, email in claimed:
+        if email not in subscribers:
+            errors[outbox_id] = "unsubscribed"
+            continue
+        name, selected_mps = subscribers[email]
+        try:
+            message = render_score_email(context, email, name, selected_mps)
+        except Exception as e:
+            errors[outbox_id] = f"render failed: {e}"
+            continue
+        message["outbox_id"] = outbox_id
+        message["idempotency_key"] = f"weekly/{week_start.isoformat()}/{email}"
+        messages.append(message)
+    return messages, errors
+
+def record_results(results, errors, now=None):
+    """Apply send results to the outbox. Returns {"sent", "retrying", "failed"}."""
+    now = now or datetime.utcnow()
+    outcomes = [(m["outbox_id"], ok, error) for m, ok, error in results]
+    outcomes += [(outbox_id, None, error) for outbox_id, error in errors.items()]
+    counts = {"sent": 0, "retrying": 0, "failed": 0}
+    with db_session:
+        for outbox_id, ok, error in outcomes:
+            row = EmailOutbox.get(id=outbox_id)
+            if row is None:
+                continue
+            if ok:
+                row.state = "sent"
+                row.sent_at = now
+                row.last_error = None
+                counts["sent"] += 1
+            elif ok is None or row.attempts >= MAX_ATTEMPTS:
+                # ok is None: permanent failure (unsubscribed, render error)
+                row.state = "failed"
+                row.last_error = error
+                counts["failed"] += 1
+            else:
+                # Provider errors and rate limits become delayed retries
+                row.state = "pending"
+                row.last_error = error
+                row.next_attempt_at = now + backoff_delay(row.attempts)
+                counts["retrying"] += 1
+    return counts
+
+async def drain_outbox(week_start=None, batch_size=OUTBOX_BATCH_SIZE, **dispatcher_kwargs):
+    """Send every due outbox row for the week. Safe to run repeatedly."""
+    week_start = week_start or current_week_start()
+    totals = {"sent": 0, "retrying": 0, "failed": 0, "batches": 0}
+    context = None
+    async with EmailDispatcher(**dispatcher_kwargs) as dispatcher:
+        if not dispatcher.provider:
+            print("EMAIL OUTBOX: No API key configured (Resend or MailerSend), leaving outbox pending")
+            return totals
+        while True:
+            claimed = await asyncio.to_thread(claim_due, week_start, batch_size)
+            if not claimed:
+                break
+            if context is None:
+                context = await asyncio.to_thread(build_email_context)
+            messages, errors = await asyncio.to_thread(render_claimed, claimed, week_start, context)
+            summary = await dispatcher.send_all(messages)
+            counts = await asyncio.to_thread(record_results, summary["results"], errors)
+            for key, value in counts.items():
+                totals[key] += value
+            totals["batches"] += 1
+    return totals
+
+def outbox_counts(week_start=None):
+    """Row counts per state for the week, plus rows still to be delivered."""
+    week_start = week_start or current_week_start()
+    with db_session:
+        rows = select((o.state, count(o)) for o in EmailOutbox if o.week_start == week_start)[:]
+        due = count(o for o in EmailOutbox
+                    if o.week_start == week_start and o.state == "pending"
+                    and o.next_attempt_at <= datetime.utcnow())
+    states = dict.fromkeys(OUTBOX_STATES, 0)
+    states.update(rows)
+    return {
+        "week_start": week_start.isoformat(),
+        "states": states,
+        "pending": states["pending"] + states["sending"],
+        "due": due,
+    }
@@ -0,0 +1,96 @@
+"""
+In-process pub/sub for Server-Sent Events.
+
+Jobs publish small events ("generation", "scores", "leaderboard") from any
+thread; every connected /events client has a bounded asyncio queue fed on
+the event loop. A client that falls too far behind is sent a "resync"
+event and should refetch instead of replaying what it missed.
+
+The broker is per process and jobs only run in the scheduler leader, so
+each worker also runs main.watch_data_changes(), which polls the shared
+data generation and leaderboard version and publishes what changed.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 25
+
+class EventBroker:
+    def __init__(self):
+        self.loop = None
+        self.subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self.subscribers.discard(queue)
+
+    def publish(self, event, data):
+        """Queue an event for every subscriber. Safe to call from any thread."""
+        message = (next(self._ids), event, data)
+        with self._lock:
+            subscribers = list(self.subscribers)
+        if not subscribers or self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._deliver(subscribers, message)
+        else:
+            self.loop.call_soon_threadsafe(self._deliver, subscribers, message)
+
+    def _deliver(self, subscribers, message):
+        for queue in subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to refetch
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((message[0], "resync", {}))
+
+broker = EventBroker()
+
+def publish(event, data):
+    broker.publish(event, data)
+
+def format_sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def event_stream(request, events=None, initial=(), source=None):
+    """
+    Async generator of SSE frames for one client. Sends the `initial`
+    (event, data) pairs describing current state, then streams new events
+    from `source` (default: the shared broker) with heartbeats.
+    """
+    source = source or broker
+    queue = source.subscribe()
+    try:
+        for event, data in initial:
+            if events is None or event in events:
+                yield format_sse(0, event, data)
+        while True:
+            try:
+                event_id, event, data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if events is None or event in events or event == "resync":
+                yield format_sse(event_id, event, data)
+    finally:
+        source.unsubscribe(queue)
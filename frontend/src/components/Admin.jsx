@@ -1,9 +1,72 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
+
+const API_URL = 'https://fantasy-parliament-web.onrender.com';
+const LOG_WINDOW = 200;
+const MAX_LOG_LINES = 1000;
+
+const levelColor = {
+  error: 'text-red-400',
+  warning: 'text-yellow-400',
+  info: 'text-green-400',
+};
 
 function Admin() {
   const [key, setKey] = useState(localStorage.getItem('fp_admin_key') || '');
   const [status, setStatus] = useState('');
   const [loading, setLoading] = useState(false);
+  const [logs, setLogs] = useState([]);
+  const [following, setFollowing] = useState(false);
+  const lastSeq = useRef(0);
+  const source = useRef(null);
+
+  const appendLogs = (records) => {
+    const fresh = records.filter(r => r.seq > lastSeq.current);
+    if (!fresh.length) return;
+    lastSeq.current = fresh[fresh.length - 1].seq;
+    setLogs(prev => [...prev, ...fresh].slice(-MAX_LOG_LINES));
+  };
+
+  // Load only the last LOG_WINDOW records instead of the whole log
+  const loadRecentLogs = async () => {
+    try {
+      const headers = { 'x-api-key': key };
+      const head = await (await fetch(`${API_URL}/admin/logs?limit=1`, { headers })).json();
+      const since = Math.max(0, (head.latest || 0) - LOG_WINDOW);
+      const page = await (await fetch(`${API_URL}/admin/logs?since=${since}&limit=${LOG_WINDOW}`, { headers })).json();
+      lastSeq.current = since;
+      setLogs([]);
+      appendLogs(page.records || []);
+    } catch (e) {
+      setStatus(`Error loading logs: ${e.message}`);
+    }
+  };
+
+  const stopFollowing = () => {
+    if (source.current) {
+      source.current.close();
+      source.current = null;
+    }
+    setFollowing(false);
+  };
+
+  const startFollowing = async () => {
+    stopFollowing();
+    if (!lastSeq.current) await loadRecentLogs();
+    const es = new EventSource(
+      `${API_URL}/admin/logs/stream?api_key=${encodeURIComponent(key)}&since=${lastSeq.current}`
+    );
+    es.addEventListener('log', (e) => {
+      try {
+        appendLogs([JSON.parse(e.data)]);
+      } catch {
+        // ignore malformed frames
+      }
+    });
+    source.current = es;
+    setFollowing(true);
+  };
+
+  useEffect(() => stopFollowing, []);
 
   const saveKey = (e) => {
     const newKey = e.target.value;
@@ -63,6 +126,36 @@ function Admin() {
           </button>
         </div>
 
+        <div className="bg-black/50 rounded-xl p-6 border border-gray-700 mb-8">
+          <div className="flex items-center justify-between mb-4">
+            <h3 className="text-xs font-bold text-gray-500 uppercase">Sync Log</h3>
+            <div className="flex gap-2">
+              <button
+                onClick={loadRecentLogs}
+                disabled={!key}
+                className="text-xs bg-gray-700 hover:bg-gray-600 disabled:opacity-50 px-3 py-1 rounded-lg transition"
+              >
+                Load Recent
+              </button>
+              <button
+                onClick={following ? stopFollowing : startFollowing}
+                disabled={!key}
+                className="text-xs bg-gray-700 hover:bg-gray-600 disabled:opacity-50 px-3 py-1 rounded-lg transition"
+              >
+                {following ? 'Stop Following' : 'Follow Live'}
+              </button>
+            </div>
+          </div>
+          <pre className="font-mono text-xs whitespace-pre-wrap leading-relaxed max-h-96 overflow-y-auto">
+            {logs.length === 0 && <span className="text-gray-600">No log lines loaded.</span>}
+            {logs.map(r => (
+              <div key={r.seq} className={levelColor[r.level] || 'text-green-400'}>
+                <span className="text-gray-600">{r.ts.slice(11, 19)} </span>{r.msg}
+              </div>
+            ))}
+          </pre>
+        </div>
+
         {status && (
           <div className="bg-black/50 rounded-xl p-6 border border-gray-700">
             <h3 className="text-xs font-bold text-gray-500 uppercase mb-4">Console Output</h3>
@@ -1,40 +1,20 @@
 import React, { useState, useEffect } from 'react';
-
-const API_URL = import.meta.env.VITE_API_URL || 'https://fantasy-parliament-web.onrender.com';
+import { subscribe } from '../liveEvents';
 
 const ConnectionStatus = () => {
   const [status, setStatus] = useState('connecting'); // 'connecting', 'online', 'offline'
   const [lastChecked, setLastChecked] = useState(null);
 
   useEffect(() => {
-    const checkStatus = async () => {
-      setStatus('connecting');
-      try {
-        // Use GET instead of HEAD - more reliable
-        const response = await fetch(`${API_URL}/health`, { 
-          signal: AbortSignal.timeout(10000)
-        });
-        if (response.ok) {
-          setStatus('online');
-        } else {
-          // Fallback to /mps if /health doesn't exist
-          const fallback = await fetch(`${API_URL}/mps`, { 
-            signal: AbortSignal.timeout(10000)
-          });
-          setStatus(fallback.ok ? 'online' : 'offline');
-        }
-      } catch (e) {
+    // Connection state comes from the shared /events stream (no polling)
+    return subscribe((type) => {
+      if (type === 'error') {
         setStatus('offline');
+      } else {
+        setStatus('online');
       }
       setLastChecked(new Date());
-    };
-
-    // Check immediately on mount
-    checkStatus();
-
-    // Check every 30 seconds
-    const interval = setInterval(checkStatus, 30000);
-    return () => clearInterval(interval);
+    });
   }, []);
 
   const statusConfig = {
@@ -1,36 +1,50 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
+import { subscribe } from '../liveEvents';
+
+// Boards fetched so far, kept across mounts until the server reports a data change
+const boardCache = {};
 
 const Scoreboard = () => {
-    const [topMPs, setTopMPs] = useState([]);
-    const [leaderboard, setLeaderboard] = useState([]);
-    const [specialTeams, setSpecialTeams] = useState([]);
-    const [partyRankings, setPartyRankings] = useState([]);
+    const [topMPs, setTopMPs] = useState(boardCache.mps || []);
+    const [leaderboard, setLeaderboard] = useState(boardCache.users || []);
+    const [specialTeams, setSpecialTeams] = useState(boardCache.special || []);
+    const [partyRankings, setPartyRankings] = useState(boardCache.party || []);
     const [view, setView] = useState('mps'); // 'mps', 'users', 'party', or 'special'
-    const [loading, setLoading] = useState(true);
+    const [loading, setLoading] = useState(!boardCache.mps);
     const [error, setError] = useState(null);
+    const viewRef = useRef(view);
 
-    const fetchData = async () => {
-        setLoading(true);
+    const fetchData = async (force = false) => {
+        const current = viewRef.current;
+        if (!force && boardCache[current]) {
+            setLoading(false);
+            return;
+        }
+        setLoading(!boardCache[current]);
         try {
-            if (view === 'mps') {
+            if (current === 'mps') {
                 const response = await fetch('https://fantasy-parliament-web.onrender.com/scoreboard');
                 const data = await response.json();
+                boardCache.mps = data;
                 setTopMPs(data);
-            } else if (view === 'users') {
+            } else if (current === 'users') {
                 const response = await fetch('https://fantasy-parliament-web.onrender.com/leaderboard');
                 const data = await response.json();
+                boardCache.users = data;
                 setLeaderboard(data);
-            } else if (view === 'party') {
+            } else if (current === 'party') {
                 const response = await fetch('https://fantasy-parliament-web.onrender.com/leaderboard/party');
                 const data = await response.json();
+                boardCache.party = data;
                 setPartyRankings(data);
-            } else if (view === 'special') {
+            } else if (current === 'special') {
                 const response = await fetch('https://fantasy-parliament-web.onrender.com/special');
                 if (!response.ok) {
                     throw new Error('Failed to load special leaderboard');
                 }
                 const data = await response.json();
+                boardCache.special = data;
                 setSpecialTeams(data);
             }
             setLoading(false);
@@ -41,9 +55,34 @@ const Scoreboard = () => {
     };
 
     useEffect(() => {
+        viewRef.current = view;
         fetchData();
     }, [view]);
 
+    // Refetch only when the server pushes a data change
+    useEffect(() => {
+        return subscribe((type, data) => {
+            if (type === 'generation' && data) {
+                // The first event on connect only tells us the current generation
+                if (boardCache.generation === undefined || boardCache.generation === data.generation) {
+                    boardCache.generation = data.generation;
+                    return;
+                }
+                Object.keys(boardCache).forEach(key => delete boardCache[key]);
+                boardCache.generation = data.generation;
+                fetchData(true);
+            } else if (type === 'leaderboard') {
+                delete boardCache.users;
+                if (viewRef.current === 'users') fetchData(true);
+            } else if (type === 'resync') {
+                const generation = boardCache.generation;
+                Object.keys(boardCache).forEach(key => delete boardCache[key]);
+                boardCache.generation = generation;
+                fetchData(true);
+            }
+        });
+    }, []);
+
     return (
         <div className="bg-white rounded-xl shadow-lg p-6 border border-gray-100 h-full">
             <div className="flex justify-between items-center mb-6 border-b pb-2">
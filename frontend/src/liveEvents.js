@@ -0,0 +1,47 @@
+// Shared Server-Sent Events connection to the API's /events stream.
+// Components subscribe to named events instead of polling.
+
+const API_URL = import.meta.env.VITE_API_URL || 'https://fantasy-parliament-web.onrender.com';
+
+const EVENT_NAMES = ['generation', 'scores', 'leaderboard', 'resync'];
+
+let source = null;
+const listeners = new Set();
+
+const notify = (type, data) => {
+  listeners.forEach(listener => listener(type, data));
+};
+
+const connect = () => {
+  if (source) return;
+  source = new EventSource(`${API_URL}/events`);
+  source.onopen = () => notify('open', null);
+  // EventSource reconnects on its own; just report the state
+  source.onerror = () => notify('error', null);
+  EVENT_NAMES.forEach(name => {
+    source.addEventListener(name, (e) => {
+      let data = null;
+      try {
+        data = JSON.parse(e.data);
+      } catch {
+        data = null;
+      }
+      notify(name, data);
+    });
+  });
+};
+
+export const subscribe = (listener) => {
+  listeners.add(listener);
+  connect();
+  if (source && source.readyState === EventSource.OPEN) {
+    listener('open', null);
+  }
+  return () => {
+    listeners.delete(listener);
+    if (listeners.size === 0 && source) {
+      source.close();
+      source = null;
+    }
+  };
+};
@@ -0,0 +1,266 @@
+"""
+Leader election for scheduled jobs.
+
+Every web process (each worker, each instance) starts the APScheduler, but
+jobs wrapped with leader_only() only run in the process that currently
+holds the scheduler lease, so the nightly sync, leaderboard job and emails
+run once rather than once per process.
+
+On Postgres the leader holds a session-level advisory lock
+(pg_try_advisory_lock) on its own connection. Pony's pooled connections run
+DISCARD ALL when released, which would drop the lock, so this connection
+is kept outside the pool. If the process dies or the connection breaks,
+Postgres releases the lock and another process takes it at its next
+renewal. Other databases (SQLite in tests and benchmarks) have no advisory
+locks. There the lease row alone decides: a holder must renew it before
+expires_at, or any process may take it over.
+
+Either way the SchedulerLease row records who leads and when they last
+renewed, for /admin/scheduler. A leader whose renewals fail stops running
+jobs once its lease runs out, even before another process takes over.
+
+Followers skip jobs as they fire, so a job due while leadership changes
+hands would be skipped by everyone. leader_only() records each job's last
+completed run in SchedulerJobRun, and a process that becomes leader fires
+once, straight away, every job that came due since its last run (see
+schedule_missed_jobs).
+"""
+import asyncio
+import functools
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pony.orm import db_session, commit, select
+from models import db, SchedulerLease, SchedulerJobRun
+
+LEADER_LEASE_SECONDS = int(os.getenv("LEADER_LEASE_SECONDS", "60"))
+# Fixed application-wide key for pg_try_advisory_lock ("fpsc")
+SCHEDULER_LOCK_KEY = 0x66707363
+
+class LeaderElection:
+    def __init__(self, name="scheduler", lock_key=SCHEDULER_LOCK_KEY, lease_seconds=LEADER_LEASE_SECONDS):
+        self.name = name
+        self.lock_key = lock_key
+        self.lease_seconds = lease_seconds
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.renewed_at = None  # monotonic time of the last successful renewal as leader
+        self.leader_since = None
+        self._lock_conn = None
+        self._lock_held = False
+        self._task = None
+        self._elected_callbacks = []
+
+    @property
+    def is_leader(self):
+        return self.renewed_at is not None and time.monotonic() - self.renewed_at < self.lease_seconds
+
+    # --- Postgres advisory lock ---------------------------------------------
+
+    def _advisory_lock(self):
+        """Take the advisory lock, or check that the session holding it is alive."""
+        import psycopg2
+        try:
+            if self._lock_conn is None:
+                # The primary's pool, also when reads are routed to a replica
+                pool = getattr(db.provider.pool, "primary", db.provider.pool)
+                self._lock_conn = psycopg2.connect(*pool.args, **pool.kwargs)
+                self._lock_conn.autocommit = True
+            with self._lock_conn.cursor() as cur:
+                if self._lock_held:
+                    # Session-level lock: held for as long as this connection lives
+                    cur.execute("SELECT 1")
+                else:
+                    cur.execute("SELECT pg_try_advisory_lock(%s)", (self.lock_key,))
+                    self._lock_held = cur.fetchone()[0]
+            if not self._lock_held:
+                # Followers don't keep an idle connection open
+                self._close_lock_conn()
+                return False
+            return True
+        except Exception as e:
+            print(f"LEADER: Advisory lock check failed: {e}")
+            self._close_lock_conn()
+            return False
+
+    def _close_lock_conn(self):
+        self._lock_held = False
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()  # releases the advisory lock
+            except Exception:
+                pass
+            self._lock_conn = None
+
+    # --- lease row ----------------------------------------------------------
+
+    def _claim_lease(self, force):
+        """Write ourselves into the lease row. Without force, only if we hold it or it expired."""
+        name, me = self.name, self.identity
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=self.lease_seconds)
+        with db_session:
+            db.execute("""INSERT INTO schedulerlease (name, holder, acquired_at, renewed_at, expires_at)
+                VALUES ($name, $me, $now, $now, $expires) ON CONFLICT (name) DO NOTHING""")
+            condition = "" if force else " AND (holder = $me OR expires_at < $now)"
+            cursor = db.execute(f"""UPDATE schedulerlease
+                SET acquired_at = CASE WHEN holder = $me THEN acquired_at ELSE $now END,
+                    holder = $me, renewed_at = $now, expires_at = $expires
+                WHERE name = $name{condition}""")
+            won = cursor.rowcount == 1
+            commit()
+        return won
+
+    def renew(self):
+        """Acquire or renew leadership. Returns whether this process leads."""
+        advisory = db.provider_name == "postgres"
+        unreachable = False
+        try:
+            if advisory:
+                held = self._advisory_lock() and self._claim_lease(force=True)
+            else:
+                held = self._claim_lease(force=False)
+        except Exception as e:
+            print(f"LEADER: Lease renewal failed: {e}")
+            held = False
+            unreachable = True
+        if held:
+            if self.leader_since is None:
+                self.leader_since = datetime.utcnow()
+                print(f"LEADER: {self.identity} is now the {self.name} leader")
+            self.renewed_at = time.monotonic()
+        # Losing the advisory lock or the lease row means someone else may
+        # lead already; a database we can't reach leaves the lease until expiry
+        elif self.leader_since is not None and (advisory or not unreachable or not self.is_leader):
+            print(f"LEADER: {self.identity} lost {self.name} leadership")
+            self.leader_since = None
+            self.renewed_at = None
+        return self.is_leader
+
+    def step_down(self):
+        """Give up leadership now (on shutdown) so another process can take over."""
+        was_leader = self.leader_since is not None
+        self.renewed_at = None
+        self.leader_since = None
+        self._close_lock_conn()
+        if was_leader:
+            name, me = self.name, self.identity
+            try:
+                with db_session:
+                    db.execute("DELETE FROM schedulerlease WHERE name = $name AND holder = $me")
+                    commit()
+            except Exception as e:
+                print(f"LEADER: Could not clear lease: {e}")
+
+    # --- background renewal --------------------------------------------------
+
+    def on_elected(self, callback):
+        """Call callback() (in a worker thread) each time this process becomes leader."""
+        self._elected_callbacks.append(callback)
+
+    async def _renew_loop(self):
+        while True:
+            was_leader = self.leader_since is not None
+            await asyncio.to_thread(self.renew)
+            if not was_leader and self.leader_since is not None:
+                for callback in self._elected_callbacks:
+                    try:
+                        await asyncio.to_thread(callback)
+                    except Exception as e:
+                        print(f"LEADER: {self.name} election callback failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._renew_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.step_down)
+
+    def status(self):
+        name = self.name
+        with db_session:
+            lease = SchedulerLease.get(name=name)
+            current = lease and {
+                "holder": lease.holder,
+                "acquired_at": lease.acquired_at,
+                "renewed_at": lease.renewed_at,
+                "expires_at": lease.expires_at,
+                "expired": lease.expires_at < datetime.utcnow(),
+            }
+        return {
+            "name": self.name,
+            "identity": self.identity,
+            "is_leader": self.is_leader,
+            "leader_since": self.leader_since,
+            "lease_seconds": self.lease_seconds,
+            "mechanism": "advisory_lock" if db.provider_name == "postgres" else "lease",
+            "lease": current,
+        }
+
+scheduler_election = LeaderElection()
+
+def record_job_run(job):
+    """Record that a leader-only job just completed."""
+    now = datetime.utcnow()
+    with db_session:
+        db.execute("""INSERT INTO schedulerjobrun (job, last_run_at) VALUES ($job, $now)
+            ON CONFLICT (job) DO UPDATE SET last_run_at = $now""")
+        commit()
+
+def last_job_runs():
+    """{job name: last completed run (UTC)} for leader-only jobs."""
+    with db_session:
+        return dict(select((r.job, r.last_run_at) for r in SchedulerJobRun))
+
+def schedule_missed_jobs(scheduler):
+    """
+    Fire, once and now, each leader-only job of scheduler that came due since
+    its last recorded run. Jobs that have never run are left to their schedule.
+    Returns the ids of the jobs brought forward.
+    """
+    runs = last_job_runs()
+    now = datetime.now(timezone.utc)
+    missed = []
+    for job in scheduler.get_jobs():
+        last_run = runs.get(getattr(job.func, "leader_job", None))
+        if last_run is None:
+            continue
+        last_run = last_run.replace(tzinfo=timezone.utc)
+        due = job.trigger.get_next_fire_time(last_run, last_run)
+        if due is not None and due <= now and (job.next_run_time is None or job.next_run_time > now):
+            job.modify(next_run_time=now)
+            missed.append(job.id)
+    if missed:
+        print(f"SCHEDULER: Running jobs missed during the leadership change: {', '.join(missed)}")
+    return missed
+
+def leader_only(fn, election=None):
+    """Wrap a scheduler job so it is skipped unless this process leads; record the runs it completes."""
+    def should_run():
+        current = election or scheduler_election
+        if current.is_leader:
+            return True
+        print(f"SCHEDULER: Skipping {fn.__name__}; another process is the leader")
+        return False
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if should_run():
+                result = await fn(*args, **kwargs)
+                await asyncio.to_thread(record_job_run, fn.__name__)
+                return result
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if should_run():
+                result = fn(*args, **kwargs)
+                record_job_run(fn.__name__)
+                return result
+    wrapper.leader_job = fn.__name__
+    return wrapper
@@ -0,0 +1,260 @@
+"""
+User leaderboard: set-based recompute, keyset pagination and rank lookup.
+
+recompute_leaderboard() scores every registration in SQL: it expands
+team_mp_ids, joins the materialized MPScore rows and upserts
+LeaderboardEntry in bounded chunks of registration ids.
+
+apply_mp_deltas() is the incremental path: after some MPs' scores change it
+uses the TeamMember reverse index to rescore only the teams containing them.
+
+Pages are ordered by (score DESC, id ASC) and addressed by an opaque cursor
+holding the last (score, id) seen, so deep pages cost the same as the first.
+
+Rank lookups are served from RANK_INDEX, an in-memory sorted copy of the
+leaderboard. It is tagged with the "leaderboard" data version, which every
+recompute or delta bumps, so each worker rebuilds its copy from the primary
+on the first lookup after another process changed the leaderboard.
+"""
+import base64
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from pony.orm import db_session, desc, commit, max as pony_max, min as pony_min
+from models import db, LeaderboardEntry, Registration, TeamMember
+from scores import ensure_mp_scores_current, refresh_mp_scores, data_version, bump_data_version
+from db_routing import route
+from events import publish
+
+RANK_INDEX = {
+    "entries": [],       # (username, score, updated_at) sorted by score desc, id asc
+    "neg_scores": [],    # -score for each entry, ascending (for bisect)
+    "positions": {},     # username -> position in entries
+    "built_at": None,
+    "version": None,     # data_version(LEADERBOARD_VERSION) the entries are at least as new as
+}
+LEADERBOARD_VERSION = "leaderboard"
+_rank_index_lock = threading.Lock()
+
+LEADERBOARD_STATS = {
+    "last_run": None,
+    "duration_ms": None,
+    "rows_changed": 0,
+    "chunks": 0,
+    "last_delta": None,
+    "delta_mps": 0,
+    "delta_rows_changed": 0,
+}
+
+RECOMPUTE_CHUNK_SIZE = 5000
+LIVE_TOP_N = 10  # entries pushed to /events clients after each rebuild
+DELTA_CHUNK_SIZE = 500
+
+# Expands registration.team_mp_ids into one row per MP id (column t.value)
+TEAM_EXPANSION_SQL = {
+    "postgres": "LEFT JOIN LATERAL jsonb_array_elements_text(r.team_mp_ids) AS t(value) ON TRUE",
+    "sqlite": "LEFT JOIN json_each(r.team_mp_ids) AS t",
+}
+
+def _upsert_chunk_sql(where_sql):
+    # Duplicate display names: the newest registration wins, as before
+    return f"""INSERT INTO leaderboardentry (username, score, updated_at)
+        SELECT display_name, score, $now FROM (
+            SELECT r.display_name AS display_name,
+                   COALESCE(SUM(s.weekly_score), 0) AS score,
+                   ROW_NUMBER() OVER (PARTITION BY r.display_name ORDER BY r.id DESC) AS rn
+            FROM registration r
+            {TEAM_EXPANSION_SQL[db.provider_name]}
+            LEFT JOIN mpscore s ON s.mp_id = CAST(t.value AS INTEGER)
+            WHERE {where_sql}
+            GROUP BY r.id, r.display_name
+        ) team
+        WHERE rn = 1
+        ON CONFLICT (username) DO UPDATE
+            SET score = excluded.score, updated_at = excluded.updated_at
+            WHERE leaderboardentry.score <> excluded.score"""
+
+def recompute_leaderboard(chunk_size=RECOMPUTE_CHUNK_SIZE):
+    """
+    Recompute every user's weekly score and upsert LeaderboardEntry.
+    Each chunk of registration ids is one statement and one transaction.
+    Returns LEADERBOARD_STATS for this run.
+    """
+    started = time.perf_counter()
+    ensure_mp_scores_current()
+    sql = _upsert_chunk_sql("r.id > $lo AND r.id <= $hi")
+
+    rows_changed = 0
+    chunks = 0
+    with db_session:
+        first_id = pony_min(r.id for r in Registration)
+        last_id = pony_max(r.id for r in Registration)
+
+    if first_id is not None:
+        now = datetime.now()
+        lo = first_id - 1
+        while lo < last_id:
+            hi = lo + chunk_size
+            with db_session:
+                cursor = db.execute(sql)
+                rows_changed += max(cursor.rowcount, 0)
+                commit()
+            chunks += 1
+            lo = hi
+
+    LEADERBOARD_STATS.update(
+        last_run=datetime.now(),
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        rows_changed=rows_changed,
+        chunks=chunks,
+    )
+    print(f"LEADERBOARD: {rows_changed} entries changed in {chunks} chunks ({LEADERBOARD_STATS['duration_ms']} ms)")
+
+    rebuild_rank_index(bump_data_version(LEADERBOARD_VERSION))
+    return dict(LEADERBOARD_STATS)
+
+def add_team_members(registration, mp_ids):
+    """Index a new registration's MPs (call inside the registering db_session)."""
+    for mp_id in mp_ids:
+        TeamMember(registration=registration, mp_id=int(mp_id))
+
+def backfill_team_members():
+    """Index registrations that have no TeamMember rows yet (one statement)."""
+    with db_session:
+        cursor = db.execute(f"""INSERT INTO teammember (registration, mp_id)
+            SELECT r.id, CAST(t.value AS INTEGER)
+            FROM registration r
+            {TEAM_EXPANSION_SQL[db.provider_name]}
+            WHERE t.value IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM teammember tm WHERE tm.registration = r.id)""")
+        added = max(cursor.rowcount, 0)
+    if added:
+        print(f"LEADERBOARD: Backfilled {added} team member rows")
+    return added
+
+def rescore_teams_with(mp_ids):
+    """Upsert leaderboard entries for every team containing one of mp_ids."""
+    mp_ids = sorted({int(i) for i in mp_ids})
+    rows_changed = 0
+    for i in range(0, len(mp_ids), DELTA_CHUNK_SIZE):
+        id_list = ",".join(str(mp_id) for mp_id in mp_ids[i:i + DELTA_CHUNK_SIZE])
+        # Match on display name so a shared name is still decided by its newest registration
+        sql = _upsert_chunk_sql(f"""r.display_name IN (
+                SELECT r2.display_name FROM registration r2
+                JOIN teammember tm ON tm.registration = r2.id
+                WHERE tm.mp_id IN ({id_list}))""")
+        now = datetime.now()
+        with db_session:
+            cursor = db.execute(sql)
+            rows_changed += max(cursor.rowcount, 0)
+            commit()
+    return rows_changed
+
+def apply_mp_deltas(mp_ids):
+    """
+    Propagate score changes for mp_ids: refresh their MPScore rows, then
+    rescore only the teams whose MPs' weekly scores actually moved.
+    """
+    mp_ids = list(mp_ids)
+    if not mp_ids:
+        return 0
+    changed = refresh_mp_scores(mp_ids)
+    rows_changed = rescore_teams_with(changed) if changed else 0
+
+    LEADERBOARD_STATS.update(
+        last_delta=datetime.now(),
+        delta_mps=len(changed),
+        delta_rows_changed=rows_changed,
+    )
+    print(f"LEADERBOARD: Delta for {len(changed)} MPs changed {rows_changed} entries")
+    if rows_changed:
+        rebuild_rank_index(bump_data_version(LEADERBOARD_VERSION))
+    return rows_changed
+
+def encode_cursor(score, entry_id):
+    return base64.urlsafe_b64encode(f"{score}:{entry_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Return (score, id) from a cursor, or raise ValueError."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    score, entry_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+    return int(score), int(entry_id)
+
+def entry_to_dict(username, score, updated_at):
+    return {"username": username, "score": score, "updated_at": updated_at.isoformat()}
+
+@db_session
+def get_leaderboard_page(limit=50, cursor=None):
+    """Return (entries, next_cursor) for one page of the leaderboard."""
+    query = LeaderboardEntry.select()
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        query = query.filter(lambda e: e.score < last_score or (e.score == last_score and e.id > last_id))
+    rows = query.order_by(desc(LeaderboardEntry.score), LeaderboardEntry.id)[:limit]
+
+    entries = [entry_to_dict(e.username, e.score, e.updated_at) for e in rows]
+    next_cursor = encode_cursor(rows[-1].score, rows[-1].id) if len(rows) == limit else None
+    return entries, next_cursor
+
+def rebuild_rank_index(version=None):
+    """
+    Reload the sorted in-memory leaderboard used for rank lookups from the
+    primary. `version` is the leaderboard version read before the reload
+    (default: the current one).
+    """
+    if version is None:
+        version = data_version(LEADERBOARD_VERSION)
+    with route("primary"), db_session:
+        rows = LeaderboardEntry.select().order_by(desc(LeaderboardEntry.score), LeaderboardEntry.id)
+        entries = [(e.username, e.score, e.updated_at) for e in rows]
+
+    with _rank_index_lock:
+        RANK_INDEX["entries"] = entries
+        RANK_INDEX["neg_scores"] = [-score for _, score, _ in entries]
+        RANK_INDEX["positions"] = {username: i for i, (username, _, _) in enumerate(entries)}
+        RANK_INDEX["built_at"] = datetime.now()
+        RANK_INDEX["version"] = version
+    print(f"LEADERBOARD: Rank index rebuilt with {len(entries)} entries")
+    publish("leaderboard", {
+        "total": len(entries),
+        "top": [entry_to_dict(*e) for e in entries[:LIVE_TOP_N]],
+    })
+    return len(entries)
+
+def ensure_rank_index_current():
+    """Rebuild RANK_INDEX if another process changed the leaderboard since it was built."""
+    version = data_version(LEADERBOARD_VERSION)
+    if RANK_INDEX["built_at"] is None or RANK_INDEX["version"] != version:
+        rebuild_rank_index(version)
+
+def get_rank(username, neighbors=2):
+    """
+    Rank (1-based, ties share a rank) and surrounding entries for a username.
+    Returns None if the user has no leaderboard entry yet.
+    """
+    ensure_rank_index_current()
+
+    with _rank_index_lock:
+        entries = RANK_INDEX["entries"]
+        neg_scores = RANK_INDEX["neg_scores"]
+        position = RANK_INDEX["positions"].get(username)
+        if position is None:
+            return None
+        _, score, updated_at = entries[position]
+        rank = bisect_left(neg_scores, -score) + 1
+
+        start = max(0, position - neighbors)
+        around = entries[start:position + neighbors + 1]
+
+    return {
+        "username": username,
+        "score": score,
+        "rank": rank,
+        "total": len(entries),
+        "updated_at": updated_at.isoformat(),
+        "neighbors": [
+            dict(entry_to_dict(*e), rank=bisect_left(neg_scores, -e[1]) + 1)
+            for e in around
+        ],
+    }
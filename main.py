@@ -1,23 +1,56 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Header, Depends, Query, Request, APIRouter
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from pony.orm import db_session, select, desc
-from models import MP, LeaderboardEntry, Registration, Subscriber, DailyScore, init_db, run_migrations, db
+from pony.orm import db_session, select, desc, commit
+from models import (
+    MP, LeaderboardEntry, Registration, Subscriber, DailyScore, MPScore, SpecialTeam,
+    init_db, db, approximate_row_counts, db_connection_counts,
+)
 from scraper import run_sync, run_sync_mps_only
+from migrations import run_migrations, pending_migrations, LATEST_VERSION
+from score_import import LineParser, ScoreImporter, format_for, import_rows, iter_lines
+from leaderboard import (
+    get_leaderboard_page, get_rank, rebuild_rank_index, recompute_leaderboard, LEADERBOARD_STATS,
+    apply_mp_deltas, add_team_members, backfill_team_members, ensure_rank_index_current
+)
+from events import event_stream, broker
+from leader import scheduler_election, leader_only, schedule_missed_jobs
+from db_routing import reads_from, route, replica_status, ROUTING_STATS
+from sync_log import sync_log, log_broker, capture, MAX_TAIL_LIMIT
+from metrics import (
+    TimingMiddleware, instrument_db, request_stats_summary, PROFILER, collapsed,
+    SLOW_QUERIES, N_PLUS_ONE, SLOW_QUERY_MS, N_PLUS_ONE_THRESHOLD,
+    job_timer, prometheus_text, request_metric_families, job_metric_families,
+)
+from scores import (
+    refresh_mp_scores, ensure_mp_scores_current, bump_generation, data_generation, generation_key,
+    generation_poll_due, data_version, bump_data_version, publish_score_changes, current_week_start,
+    WINDOWS, GENERATION_POLL_SECONDS,
+)
+from async_reads import async_reads, fetch_mp, fetch_mps_by_ids, fetch_mp_scores, fetch_leaderboard_page, ASYNC_READS
+from shared_cache import get_or_build as shared_get_or_build, SHARED_CACHE_STATS
+from email_dispatch import (
+    RESEND_API_KEY, RESEND_FROM_EMAIL, MAILERSEND_API_KEY, MAILERSEND_FROM_EMAIL,
+    send_messages_sync, EMAIL_STATS,
+)
+from email_outbox import enqueue_week, drain_outbox, outbox_counts
+from weekly_email import EmailContext, build_email_context, render_score_email
 from committee_tiers import calculate_committee_score, COMMITTEE_TIERS, get_committee_tier, COMMITTEE_BASE_POINTS
 import os
 import asyncio
+import json
 from dotenv import load_dotenv
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime, timedelta, date
 import uuid
 import re
 import random
 import secrets
-from better_profanity import profanity
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import threading
+import time
 from datetime import datetime as dt
 from urllib.parse import quote
 
@@ -29,17 +62,29 @@ app = FastAPI(title="Canadian Politics Fantasy League API")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIST = os.path.join(BASE_DIR, "frontend", "dist")
 
-# Mount static files for the frontend
-app.mount("/assets", StaticFiles(directory=os.path.join(FRONTEND_DIST, "assets")), name="assets")
+# Mount static files for the frontend (the directory is checked on the first request)
+app.mount("/assets", StaticFiles(directory=os.path.join(FRONTEND_DIST, "assets"), check_dir=False), name="assets")
 
 # Global Cache for MPs
 MP_CACHE = {
     "data": [],
+    "by_id": {},
+    "by_slug": {},
+    "rankings": {},  # window -> MP dicts sorted by that window's score
+    "json": b"[]",  # `data` pre-serialized for GET /mps
+    "generation": None,
     "last_updated": None
 }
 CACHE_DURATION = timedelta(minutes=15)
+_mp_cache_lock = threading.Lock()
+MP_CACHE_STATS = {"hits": 0, "misses": 0, "rebuild_seconds_total": 0.0, "last_rebuild_seconds": None}
+
+# Max number of ids accepted by /mps?ids= (a team is 5 MPs)
+MAX_BATCH_IDS = 50
 
 # Special Teams Configuration
+# Default special teams, seeded into the SpecialTeam table when it is empty.
+# Edit them afterwards via /admin/special-teams.
 # Special teams - using valid MP slugs from database
 # Note: Some leaders not in current MP list (e.g., Trudeau, Singh)
 SPECIAL_TEAMS_CONFIG = {
@@ -75,21 +120,131 @@ SPECIAL_TEAMS_CONFIG = {
     }
 }
 
+def _mp_cache_fresh(now):
+    return (
+        MP_CACHE["data"] and MP_CACHE["last_updated"]
+        and (now - MP_CACHE["last_updated"] < CACHE_DURATION)
+        and MP_CACHE["generation"] == data_generation()
+    )
+
+def _dump_json(value):
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _build_mp_snapshot():
+    """Serialize the MP roster and per-window ranking orders from the database."""
+    # Built on the primary: the snapshot is stored under the primary's
+    # generation and a lagging replica would pin stale data to it
+    with route("primary"), db_session:
+        scores = {s.mp_id: s for s in MPScore.select()}
+        mps = MP.select().order_by(desc(MP.total_score))[:]
+        # Convert to dicts inside the session to detach from ORM
+        mp_dicts = []
+        ranking_keys = {}
+        for m in mps:
+            score = scores.get(m.id)
+            d = mp_to_dict(m, weekly_score=score.weekly_points if score else None)
+            mp_dicts.append(d)
+            ranking_keys[m.id] = (
+                score.weekly_score if score else d["weekly_score"],
+                score.season_score if score else d.get("total_score_with_committee", d["total_score"]),
+            )
+    rankings = {
+        window: [m["id"] for m in sorted(mp_dicts, key=lambda m: ranking_keys[m["id"]][i], reverse=True)]
+        for i, window in enumerate(WINDOWS)
+    }
+    return _dump_json({"mps": mp_dicts, "rankings": rankings})
+
 def get_cached_mps():
     now = datetime.now()
-    if MP_CACHE["data"] and MP_CACHE["last_updated"] and (now - MP_CACHE["last_updated"] < CACHE_DURATION):
+    if _mp_cache_fresh(now):
+        MP_CACHE_STATS["hits"] += 1
         return MP_CACHE["data"]
-    
-    print("CACHE: Refreshing MP cache from database...")
-    with db_session:
-        mps = MP.select().order_by(desc(MP.total_score))[:]
-        # Convert to dicts inside the session to detach from ORM
-        mp_dicts = [mp_to_dict(m) for m in mps]
+
+    with _mp_cache_lock:
+        # Another thread may have rebuilt while we waited
+        if _mp_cache_fresh(now):
+            MP_CACHE_STATS["hits"] += 1
+            return MP_CACHE["data"]
+
+        MP_CACHE_STATS["misses"] += 1
+        rebuild_started = time.perf_counter()
+        ensure_mp_scores_current()
+        generation = data_generation()
+        # The snapshot file is shared by all workers on this host: the first
+        # one to miss a generation builds it, the others load its payload.
+        body = shared_get_or_build("mps", generation_key(), _build_mp_snapshot,
+                                   max_age=CACHE_DURATION.total_seconds())
+        snapshot = json.loads(body)
+        mp_dicts = snapshot["mps"]
+        by_id = {m["id"]: m for m in mp_dicts}
         MP_CACHE["data"] = mp_dicts
+        MP_CACHE["json"] = _dump_json(mp_dicts)
+        MP_CACHE["by_id"] = by_id
+        MP_CACHE["by_slug"] = {m["slug"]: m for m in mp_dicts}
+        MP_CACHE["rankings"] = {
+            window: [by_id[mp_id] for mp_id in ids] for window, ids in snapshot["rankings"].items()
+        }
+        MP_CACHE["generation"] = generation
         MP_CACHE["last_updated"] = now
-        print(f"CACHE: Loaded {len(mp_dicts)} MPs.")
+        rebuild_seconds = time.perf_counter() - rebuild_started
+        MP_CACHE_STATS["rebuild_seconds_total"] += rebuild_seconds
+        MP_CACHE_STATS["last_rebuild_seconds"] = rebuild_seconds
+        print(f"CACHE: Loaded {len(mp_dicts)} MPs (generation {generation}).")
         return mp_dicts
 
+def get_ranked_mps(window="week", limit=10):
+    """Top `limit` MPs for a scoring window, served from the cached rankings."""
+    get_cached_mps()
+    return MP_CACHE["rankings"].get(window, [])[:limit]
+
+def invalidate_mp_cache():
+    """Force the next cache read to rebuild (for edits that don't touch scores)."""
+    bump_generation()
+
+def get_cached_mps_by_ids(id_list):
+    """Look up MPs by id from the cached roster, in request order.
+
+    Ids missing from the snapshot (e.g. MPs created since the last refresh)
+    are fetched with a single IN (...) query. Unknown ids are skipped.
+    """
+    get_cached_mps()
+    by_id = MP_CACHE["by_id"]
+
+    missing = [mid for mid in id_list if mid not in by_id]
+    fetched = {}
+    if missing:
+        with db_session:
+            for mp in MP.select(lambda m: m.id in missing):
+                fetched[mp.id] = mp_to_dict(mp)
+
+    results = []
+    for mid in id_list:
+        mp = by_id.get(mid) or fetched.get(mid)
+        if mp:
+            results.append(mp)
+    return results
+
+async def get_cached_mps_async():
+    """get_cached_mps() for async handlers: skip the thread hop while the cache is fresh."""
+    if ASYNC_READS and not generation_poll_due() and _mp_cache_fresh(datetime.now()):
+        MP_CACHE_STATS["hits"] += 1
+        return MP_CACHE["data"]
+    return await run_in_threadpool(get_cached_mps)
+
+async def get_cached_mps_by_ids_async(id_list):
+    """get_cached_mps_by_ids() with missing ids read through async_reads."""
+    await get_cached_mps_async()
+    by_id = MP_CACHE["by_id"]
+
+    missing = [mid for mid in id_list if mid not in by_id]
+    fetched = {}
+    if missing:
+        for mid, (mp, weekly_points) in (await fetch_mps_by_ids(missing)).items():
+            fetched[mid] = mp_to_dict(mp, weekly_score=weekly_points)
+
+    return [by_id.get(mid) or fetched[mid] for mid in id_list if mid in by_id or mid in fetched]
+
 # Configure CORS - must specify exact origins when credentials are allowed
 # In production, set ALLOWED_ORIGINS env var (comma-separated)
 # For development, allow localhost
@@ -114,7 +269,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(TimingMiddleware)
+instrument_db(db)
 
 API_KEY = os.getenv("SYNC_API_KEY")
 
@@ -130,36 +288,21 @@ admin_router = APIRouter(prefix="/admin", tags=["admin"])
 @admin_router.post("/migrate")
 async def manual_migrate(api_key: str = Depends(verify_api_key)):
     print("ADMIN: Triggering manual migration...")
-    db_url = os.getenv('INTERNAL_DATABASE_URL') or os.getenv('DATABASE_URL_INTERNAL') or os.getenv('DATABASE_URL')
-    
-    success = False
-    msg = ""
-
-    if db_url:
-        dsn = db_url
-        if dsn.startswith('postgres://'):
-            dsn = dsn.replace('postgres://', 'postgresql://', 1)
-        success, msg = run_migrations(dsn)
-    else:
-        # Construct kwargs from environment if using separate vars
-        # This matches what we do in startup
-        db_password = os.getenv('DB_PASSWORD')
-        if not db_password:
-             raise HTTPException(status_code=500, detail="DB_PASSWORD missing in environment")
-             
-        kwargs = {
-            'user': os.getenv('DB_USER', 'postgres'),
-            'password': db_password,
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'database': os.getenv('DB_NAME', 'fantasy_politics'),
-        }
-        success, msg = run_migrations(None, **kwargs)
+    success, msg = await asyncio.to_thread(run_migrations)
 
     if success:
         return {"status": "success", "message": msg}
     else:
         raise HTTPException(status_code=500, detail=msg)
 
+@admin_router.get("/schema")
+def schema_status(api_key: str = Depends(verify_api_key)):
+    pending = pending_migrations()
+    return {
+        "latest_version": LATEST_VERSION,
+        "pending": [{"version": m.version, "name": m.name} for m in pending],
+    }
+
 @admin_router.post("/sync")
 async def manual_sync(background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
     print("ADMIN: Triggering manual sync...")
@@ -178,6 +321,7 @@ async def manual_sync_mps(background_tasks: BackgroundTasks, api_key: str = Depe
         try:
             print("BACKGROUND: Starting MP roster sync...")
             await run_sync_mps_only()
+            await asyncio.to_thread(refresh_mp_scores)
             print("BACKGROUND: MP roster sync finished.")
         except Exception as e:
             print(f"BACKGROUND ERROR: {e}")
@@ -186,48 +330,85 @@ async def manual_sync_mps(background_tasks: BackgroundTasks, api_key: str = Depe
     return {"message": "MP Roster sync started in background"}
 
 @admin_router.get("/logs")
-def get_admin_logs(api_key: str = Depends(verify_api_key)):
-    if os.path.exists("sync.log"):
-        with open("sync.log", "r") as f:
-            return {"logs": f.read()}
-    return {"logs": "No log file found"}
+def get_admin_logs(
+    since: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=MAX_TAIL_LIMIT),
+    api_key: str = Depends(verify_api_key)
+):
+    """Sync log records after sequence number `since`. Poll again with `since=next`."""
+    return sync_log.tail(since, limit)
+
+@admin_router.get("/logs/stream")
+async def stream_admin_logs(
+    request: Request,
+    since: int = Query(0, ge=0),
+    api_key: str = Query(None),
+    x_api_key: str = Header(None)
+):
+    """
+    Live-follow the sync log over SSE. EventSource can't send headers, so the
+    key may be passed as ?api_key=. Starts with the records after `since`.
+    """
+    await verify_api_key(api_key or x_api_key)
+    backlog = sync_log.tail(since, MAX_TAIL_LIMIT)["records"]
+    return StreamingResponse(
+        event_stream(request, {"log"}, initial=[("log", r) for r in backlog], source=log_broker),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-async def run_sync_with_logging():
-    import sys
-    
-    # helper to write to both stdout and file
-    class DualWriter:
-        def __init__(self, filename):
-            self.file = open(filename, "a", buffering=1) # line buffered
-            self.stdout = sys.stdout
-        
-        def write(self, message):
-            self.stdout.write(message)
-            self.file.write(message)
-            
-        def flush(self):
-            self.stdout.flush()
-            self.file.flush()
-            
-        def close(self):
-            self.file.close()
+@admin_router.get("/request-stats")
+def get_request_stats(api_key: str = Depends(verify_api_key)):
+    """Per-route latency, DB time and response size since startup, slowest total first."""
+    return request_stats_summary()
 
-    # Backup original stdout
-    old_stdout = sys.stdout
-    writer = DualWriter("sync.log")
-    sys.stdout = writer
-    
+@admin_router.get("/query-log")
+def get_query_log(api_key: str = Depends(verify_api_key)):
+    """Recent slow statements (with plans) and suspected N+1 request patterns."""
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "slow_queries": list(SLOW_QUERIES)[::-1],
+        "n_plus_one": list(N_PLUS_ONE)[::-1],
+    }
+
+@admin_router.post("/profile")
+async def run_profiler(
+    seconds: float = Query(10.0, gt=0, le=120),
+    requests: Optional[int] = Query(None, ge=1, le=10000),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    include_idle: bool = False,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Sample all threads for `seconds` (or until `requests` more requests finish)
+    and return collapsed stacks for flamegraph.pl / speedscope.
+    """
+    if PROFILER.active:
+        raise HTTPException(status_code=409, detail="A profile is already running")
     try:
-        print(f"BACKGROUND: Starting sync at {datetime.now()}...")
-        await run_sync()
-        print(f"BACKGROUND: Sync finished successfully at {datetime.now()}.")
-    except Exception as e:
-        import traceback
-        print(f"BACKGROUND ERROR: Sync failed: {e}")
-        traceback.print_exc()
-    finally:
-        sys.stdout = old_stdout
-        writer.close()
+        stacks, samples = await asyncio.to_thread(
+            PROFILER.run, seconds, requests, interval_ms / 1000, include_idle
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed(stacks), headers={"X-Profile-Samples": str(samples)})
+
+async def run_sync_with_logging():
+    with capture("sync") as run:
+        try:
+            with job_timer("daily_sync"):
+                print(f"BACKGROUND: Starting sync at {datetime.now()}...")
+                if not await run_sync():
+                    # Bailed out before propagating: rebuild every MP's scores,
+                    # then fail the job so /metrics counts it
+                    await asyncio.to_thread(refresh_mp_scores)
+                    raise RuntimeError("run_sync failed before propagating score changes")
+                print(f"BACKGROUND: Sync finished successfully at {datetime.now()}.")
+        except Exception as e:
+            import traceback
+            print(f"BACKGROUND ERROR: Sync failed: {e}")
+            sync_log.write(traceback.format_exc(), level="error", run=run)
 
 app.include_router(admin_router)
 
@@ -236,9 +417,12 @@ async def startup():
     print("STARTUP: Initializing...")
     
     db_url = os.getenv('INTERNAL_DATABASE_URL') or os.getenv('DATABASE_URL_INTERNAL') or os.getenv('DATABASE_URL')
-    if db_url:
+    if db.provider is not None:
+        # Already bound by the embedding process (load tests, scripts)
+        print("STARTUP: Database already bound")
+    elif db_url:
         print(f"STARTUP: Using {'INTERNAL_DATABASE_URL' if os.getenv('INTERNAL_DATABASE_URL') else 'DATABASE_URL_INTERNAL' if os.getenv('DATABASE_URL_INTERNAL') else 'DATABASE_URL'}...")
-        init_db(db_url)
+        init_db(db_url, replica=os.getenv('DATABASE_REPLICA_URL'))
     else:
         db_password = os.getenv('DB_PASSWORD')
         if not db_password:
@@ -252,9 +436,27 @@ async def startup():
             password=db_password,
             host=os.getenv('DB_HOST', 'localhost'),
             database=os.getenv('DB_NAME', 'fantasy_politics'),
-            sslmode='require'
+            sslmode='require',
+            replica=os.getenv('DATABASE_REPLICA_URL'),
         )
     print("STARTUP: Database initialized successfully")
+
+    if ASYNC_READS:
+        await async_reads.start(
+            os.getenv('ASYNC_READ_DATABASE_URL') or db_url or _postgres_dsn_from_env(),
+            replica_dsn=os.getenv('ASYNC_READ_REPLICA_URL') or os.getenv('DATABASE_REPLICA_URL'),
+        )
+    
+    try:
+        backfill_team_members()
+    except Exception as e:
+        print(f"STARTUP WARNING: Team member backfill failed: {e}")
+
+    try:
+        # Once here, so the /special read path never writes
+        seed_special_teams()
+    except Exception as e:
+        print(f"STARTUP WARNING: Special team seeding failed: {e}")
     
     # Start scheduler for weekly emails (only on Render production)
     if os.getenv("RENDER"):
@@ -262,27 +464,94 @@ async def startup():
             schedule_weekly_emails()
             schedule_daily_sync()
             schedule_leaderboard_updates()
-            scheduler.start()
+            get_scheduler().start()
+            # Every process schedules; only the elected leader runs the jobs,
+            # and a new leader catches up on any due during the handover
+            scheduler_election.on_elected(lambda: schedule_missed_jobs(get_scheduler()))
+            scheduler_election.start()
             print("SCHEDULER: Started")
         except Exception as e:
             print(f"SCHEDULER ERROR: {e}")
-    
-def mp_to_dict(mp, include_weekly=True):
+
+    # Keep references so the tasks aren't garbage collected mid-run
+    WARMUP["task"] = asyncio.get_running_loop().create_task(warm_up())
+    EVENT_WATCHER["task"] = asyncio.get_running_loop().create_task(watch_data_changes())
+
+WARMUP_DELAY_SECONDS = float(os.getenv("WARMUP_DELAY_SECONDS", "2"))
+WARMUP = {"task": None, "seconds": None}
+
+async def warm_up():
+    """Build the lazily initialized resources in the background once the server is listening."""
+    await asyncio.sleep(WARMUP_DELAY_SECONDS)
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warm_up)
+        WARMUP["seconds"] = round(time.perf_counter() - started, 3)
+        print(f"STARTUP: Warm-up finished in {WARMUP['seconds']}s")
+    except Exception as e:
+        print(f"STARTUP WARNING: Warm-up failed: {e}")
+
+def _warm_up():
+    get_profanity_filter()
+    import scoring_engine  # NumPy, for /admin/list-registrations
+    get_cached_mps()
+
+EVENT_WATCHER = {"task": None}
+
+async def watch_data_changes():
+    """
+    Publish data changes made by other processes (usually the scheduler
+    leader) to this worker's /events clients. Checks every
+    GENERATION_POLL_SECONDS while anyone is subscribed.
+    """
+    while True:
+        await asyncio.sleep(GENERATION_POLL_SECONDS)
+        if not broker.subscribers:
+            continue
+        try:
+            await asyncio.to_thread(_publish_data_changes)
+        except Exception as e:
+            print(f"EVENTS WARNING: Could not check for data changes: {e}")
+
+def _publish_data_changes():
+    publish_score_changes()  # data_generation() publishes "generation" when it moves
+    ensure_rank_index_current()  # publishes "leaderboard" when it rebuilds
+
+@app.on_event("shutdown")
+async def shutdown():
+    if EVENT_WATCHER["task"] is not None:
+        EVENT_WATCHER["task"].cancel()
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+    # Hand leadership over now instead of when the lease expires
+    await scheduler_election.stop()
+    await async_reads.close()
+
+def _postgres_dsn_from_env():
+    if not os.getenv('DB_PASSWORD'):
+        return None
+    user = quote(os.getenv('DB_USER', 'postgres'), safe='')
+    password = quote(os.getenv('DB_PASSWORD'), safe='')
+    host = os.getenv('DB_HOST', 'localhost')
+    return f"postgresql://{user}:{password}@{host}/{os.getenv('DB_NAME', 'fantasy_politics')}?sslmode=require"
+    
+def mp_to_dict(mp, include_weekly=True, weekly_score=None):
     from datetime import date, timedelta
     
     try:
         committee_score = calculate_committee_score(mp.committees) if mp.committees else {"total": 0, "breakdown": {}}
         penalty = mp.penalty or 0
         
-        # Calculate weekly score (this week's points)
-        weekly_score = 0
-        if include_weekly:
-            today = date.today()
-            week_start = today - timedelta(days=today.weekday())
-            weekly_score = sum(
-                ds.points_today for ds in mp.daily_scores 
-                if ds.date >= week_start
-            )
+        # Calculate weekly score (this week's points) unless the caller precomputed it
+        if weekly_score is None:
+            weekly_score = 0
+            if include_weekly:
+                today = date.today()
+                week_start = today - timedelta(days=today.weekday())
+                weekly_score = sum(
+                    ds.points_today for ds in mp.daily_scores 
+                    if ds.date >= week_start
+                )
         
         # Total score = all-time + committee (once) - penalty
         total_score = mp.total_score + committee_score.get("total", 0) - penalty
@@ -324,22 +593,18 @@ def mp_to_dict(mp, include_weekly=True):
 
 @app.get("/mps/search")
 def search_mps(q: Optional[str] = Query(None)):
-    print(f"DEBUG: Entering /mps/search with q='{q}'")
     try:
         # Use cached data to avoid DB hits on every search
         all_mps = get_cached_mps()
         
         if q:
             search_term = q.strip().lower()
-            print(f"DEBUG: Searching for term: '{search_term}'")
-            
             results = [
                 m for m in all_mps 
                 if search_term in m['name'].lower() or 
                    (m['party'] and search_term in m['party'].lower()) or 
                    (m['constituency'] and search_term in m['constituency'].lower())
             ]
-            print(f"DEBUG: Search found {len(results)} results")
             return results
         
         # If no query, return all (already ordered by score in cache)
@@ -352,20 +617,24 @@ def search_mps(q: Optional[str] = Query(None)):
         raise HTTPException(status_code=500, detail={"error": str(e), "traceback": error_trace})
 
 @app.get("/mps/{mp_id}")
+@reads_from("replica")
+async def get_mp(mp_id: int):
+    if not ASYNC_READS:
+        return await run_in_threadpool(get_mp_orm, mp_id)
+    found = await fetch_mp(mp_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="MP not found")
+    mp, weekly_points = found
+    return mp_to_dict(mp, weekly_score=weekly_points)
+
 @db_session
-def get_mp(mp_id: int):
-    print(f"DEBUG: get_mp called with mp_id={mp_id}, type={type(mp_id)}")
+def get_mp_orm(mp_id: int):
     try:
         # Use select().first() instead of get() to avoid potential Pony ORM edge cases
         mp = MP.select(lambda m: m.id == mp_id).first()
-        print(f"DEBUG: MP query result: {mp}")
         if not mp:
-            print(f"DEBUG: MP not found for id={mp_id}")
             raise HTTPException(status_code=404, detail="MP not found")
-        
-        result = mp_to_dict(mp)
-        print(f"DEBUG: mp_to_dict result: {result}")
-        return result
+        return mp_to_dict(mp)
     except HTTPException:
         raise
     except Exception as e:
@@ -405,22 +674,21 @@ def test_email(email: str = "munky99999@gmail.com"):
         "mp_ids": mp_ids
     }
 @app.get("/admin/list-registrations")
-@db_session
 def list_registrations(api_key: str = Query(None)):
     """Admin endpoint to list all registrations."""
     if api_key != API_KEY:
         raise HTTPException(status_code=403, detail="Invalid API Key")
     
-    regs = Registration.select()[:]
+    from scoring_engine import score_all_registrations
+    regs, totals = score_all_registrations("week")
     result = []
-    for r in regs:
-        score = calculate_team_score(r.team_mp_ids)
+    for (reg_id, display_name, email, mp_ids, captain_id, registered_at), score in zip(regs, totals):
         result.append({
-            "display_name": r.display_name,
-            "email": r.email,
-            "mp_ids": r.team_mp_ids,
-            "score": score,
-            "registered_at": r.registered_at.isoformat()
+            "display_name": display_name,
+            "email": email,
+            "mp_ids": mp_ids,
+            "score": int(score),
+            "registered_at": registered_at.isoformat()
         })
     return result
 
@@ -471,16 +739,21 @@ def diag_db():
         }
 
 @app.get("/mps")
-def get_mps(ids: str = None):
-    print("DEBUG: Entering /mps endpoint")
+@reads_from("replica")
+async def get_mps(ids: str = None):
     try:
         if ids:
-            # Filter by IDs
-            id_list = [int(x.strip()) for x in ids.split(',') if x.strip().isdigit()]
-            with db_session:
-                mps = [MP.get(id=mid) for mid in id_list if MP.get(id=mid)]
-                return [mp_to_dict(mp) for mp in mps if mp]
-        return get_cached_mps()
+            # Filter by IDs (deduplicated, request order preserved)
+            id_list = list(dict.fromkeys(int(x.strip()) for x in ids.split(',') if x.strip().isdigit()))
+            if len(id_list) > MAX_BATCH_IDS:
+                raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})")
+            if not ASYNC_READS:
+                return await run_in_threadpool(get_cached_mps_by_ids, id_list)
+            return await get_cached_mps_by_ids_async(id_list)
+        await get_cached_mps_async()
+        return Response(content=MP_CACHE["json"], media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"ERROR in /mps: {e}")
@@ -488,36 +761,53 @@ def get_mps(ids: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/scoreboard")
-@db_session
-def get_scoreboard():
-    # Get all MPs and sort by weekly score (this week's points + committee once - penalty)
-    from datetime import date, timedelta
-    
-    today = date.today()
-    week_start = today - timedelta(days=today.weekday())
-    
-    all_mps = MP.select()
-    scored_mps = []
-    for mp in all_mps:
-        # Weekly score = this week's points
-        weekly_pts = sum(ds.points_today for ds in mp.daily_scores if ds.date >= week_start)
-        # Committee bonus (counts ONCE)
-        committee_pts = calculate_committee_score(mp.committees).get("total", 0) if mp.committees else 0
-        # Subtract penalty
-        penalty = mp.penalty or 0
-        total = weekly_pts + committee_pts - penalty
-        scored_mps.append((total, mp))
-    
-    # Sort by weekly score descending
-    scored_mps.sort(key=lambda x: x[0], reverse=True)
-    top_mps = [mp for _, mp in scored_mps[:10]]
-    return [mp_to_dict(m) for m in top_mps]
+def get_scoreboard(
+    limit: int = Query(10, ge=1, le=100),
+    window: str = Query("week", pattern="^(week|all)$"),
+):
+    """
+    Top MPs by score. `week` ranks by this week's points + committee once -
+    penalty; `all` uses all-time points instead of weekly ones.
+    Served from the ranked MP cache, rebuilt when score data changes.
+    """
+    return get_ranked_mps(window, limit)
 
 @app.get("/leaderboard")
-@db_session
-def get_leaderboard():
-    entries = LeaderboardEntry.select().order_by(desc(LeaderboardEntry.score))[:50]
-    return [{"username": e.username, "score": e.score, "updated_at": e.updated_at.isoformat()} for e in entries]
+@reads_from("replica")
+async def get_leaderboard(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    User leaderboard, best first. Pass the X-Next-Cursor response header
+    back as `cursor` to fetch the following page.
+    """
+    try:
+        if ASYNC_READS:
+            entries, next_cursor = await fetch_leaderboard_page(limit, cursor)
+        else:
+            entries, next_cursor = await run_in_threadpool(get_leaderboard_page, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+@app.get("/leaderboard/rank/{user_id}")
+@reads_from("replica")
+def get_leaderboard_rank(user_id: str, neighbors: int = Query(2, ge=0, le=25)):
+    """Rank and neighbouring entries for a registered user."""
+    with db_session:
+        reg = Registration.get(user_id=user_id)
+        if not reg:
+            raise HTTPException(status_code=404, detail="User not found")
+        username = reg.display_name
+
+    rank = get_rank(username, neighbors)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User is not ranked yet")
+    return rank
 
 @app.get("/committees")
 def get_committee_tiers_info():
@@ -532,127 +822,177 @@ def get_committee_tiers_info():
         }
     }
 
-@app.get("/leaderboard/party")
-@db_session
-def get_party_leaderboard():
-    """Rank parties by their top 5 MPs' combined scores"""
+# Party leaderboard responses, keyed by (window, top_n) for one data generation
+PARTY_LEADERBOARD_CACHE = {"generation": None, "results": {}}
+
+# MPScore column used for each scoring window (whitelist for the raw SQL below)
+WINDOW_SCORE_COLUMNS = {"week": "weekly_score", "all": "season_score"}
+
+def compute_party_leaderboard(window="week", top_n=5):
+    """Rank parties by the combined score of their top_n MPs, ranked in SQL."""
+    score_col = WINDOW_SCORE_COLUMNS[window]
+    ensure_mp_scores_current()
+    # Cached per generation, so read it from the primary (see _build_mp_snapshot)
+    with route("primary"), db_session:
+        rows = db.select(f"""SELECT party, mp_id, name, score, party_size FROM (
+                SELECT COALESCE(NULLIF(m.party, ''), 'Independent') AS party,
+                       m.id AS mp_id,
+                       m.name AS name,
+                       s.{score_col} AS score,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY COALESCE(NULLIF(m.party, ''), 'Independent')
+                           ORDER BY s.{score_col} DESC, m.id
+                       ) AS rn,
+                       COUNT(*) OVER (
+                           PARTITION BY COALESCE(NULLIF(m.party, ''), 'Independent')
+                       ) AS party_size
+                FROM mp m
+                JOIN mpscore s ON s.mp_id = m.id
+            ) ranked
+            WHERE rn <= $top_n
+            ORDER BY party, rn""")
+
     parties = {}
-    
-    # Get all MPs
-    mps = MP.select()
-    for mp in mps:
-        party = mp.party or "Independent"
-        if party not in parties:
-            parties[party] = []
-        parties[party].append({"name": mp.name, "score": mp.total_score, "id": mp.id})
-    
-    # Calculate top 5 for each party
-    results = []
-    for party, mp_list in parties.items():
-        mp_list.sort(key=lambda x: x["score"], reverse=True)
-        top_5 = mp_list[:5]
-        total_score = sum(m["score"] for m in top_5)
-        results.append({
+    for party, mp_id, name, score, party_size in rows:
+        entry = parties.setdefault(party, {
             "party": party,
-            "score": total_score,
-            "mp_count": len(mp_list),
-            "top_5": top_5
+            "score": 0,
+            "mp_count": party_size,
+            "top_mps": []
         })
-    
-    # Sort by total score
+        entry["score"] += score
+        entry["top_mps"].append({"name": name, "score": score, "id": mp_id})
+
+    results = list(parties.values())
+    for entry in results:
+        entry["top_5"] = entry["top_mps"]  # Kept for existing clients
     results.sort(key=lambda x: x["score"], reverse=True)
     return results
 
-@app.get("/special")
-@db_session
-def get_special_leaderboards():
+@app.get("/leaderboard/party")
+def get_party_leaderboard(
+    top_n: int = Query(5, ge=1, le=50),
+    window: str = Query("week", pattern="^(week|all)$"),
+):
+    """Rank parties by their top N MPs' combined scores (weekly by default)."""
+    generation = data_generation()
+    if PARTY_LEADERBOARD_CACHE["generation"] != generation:
+        PARTY_LEADERBOARD_CACHE["generation"] = generation
+        PARTY_LEADERBOARD_CACHE["results"] = {}
+
+    key = (window, top_n)
+    results = PARTY_LEADERBOARD_CACHE["results"].get(key)
+    if results is None:
+        results = compute_party_leaderboard(window, top_n)
+        PARTY_LEADERBOARD_CACHE["results"][key] = results
+    return results
+
+# Special team responses for one (ISO week, data generation, special teams version)
+SPECIAL_CACHE = {"key": None, "results": None}
+SPECIAL_TEAMS_VERSION = "special_teams"
+
+def seed_special_teams():
+    """Insert the default SPECIAL_TEAMS_CONFIG teams if the table is empty."""
+    with route("primary"), db_session:
+        if SpecialTeam.select().count():
+            return
+        for position, (key, config) in enumerate(SPECIAL_TEAMS_CONFIG.items()):
+            SpecialTeam(key=key, name=config["name"], slugs=config["slugs"], position=position)
+        print(f"SPECIAL: Seeded {len(SPECIAL_TEAMS_CONFIG)} special teams")
+
+def compute_special_leaderboards(today=None):
+    """Build the special teams from the cached roster (no per-MP queries)."""
+    today = today or date.today()
+    all_mps = get_cached_mps()
+    by_slug = MP_CACHE["by_slug"]
+
+    with route("primary"), db_session:
+        teams = [
+            (t.key, t.name, list(t.slugs or []))
+            for t in SpecialTeam.select(lambda t: t.active).order_by(SpecialTeam.position, SpecialTeam.id)
+        ]
+
     results = []
-    
-    # Static special teams - query DB directly
-    for key, config in SPECIAL_TEAMS_CONFIG.items():
-        team_mps = []
-        total_score = 0
-        for slug in config["slugs"]:
-            mp = MP.get(slug=slug)
-            if mp:
-                team_mps.append(mp_to_dict(mp))
-                total_score += mp.total_score
+    for key, name, slugs in teams:
+        team_mps = [by_slug[slug] for slug in slugs if slug in by_slug]
         if team_mps:
             # Sort MPs by score descending within the team
-            team_mps.sort(key=lambda x: x['score'], reverse=True)
+            team_mps = sorted(team_mps, key=lambda x: x['score'], reverse=True)
             results.append({
                 "id": key,
-                "name": config["name"],
-                "score": total_score,
+                "name": name,
+                "score": sum(m["total_score"] for m in team_mps),
                 "mps": team_mps
             })
-    
-    # Random Choice (Weekly)
-    all_mps = list(MP.select())
+
+    # Random Choice (Weekly) - deterministic per ISO week
     if all_mps:
-        today = date.today()
         seed_val = f"{today.year}-{today.isocalendar()[1]}"
         rng = random.Random(seed_val)
-        random_mps = rng.sample(all_mps, min(5, len(all_mps)))
-        random_team_score = sum(mp.total_score for mp in random_mps)
-        
+        pool = sorted(all_mps, key=lambda m: m["id"])
+        random_mps = rng.sample(pool, min(5, len(pool)))
+
         results.append({
             "id": "random_weekly",
             "name": "Random Choice (Weekly)",
-            "score": random_team_score,
-            "mps": [mp_to_dict(mp) for mp in random_mps]
+            "score": sum(m["total_score"] for m in random_mps),
+            "mps": random_mps
         })
-    
+
     return results
 
+@app.get("/special")
+def get_special_leaderboards():
+    today = date.today()
+    get_cached_mps()
+    cache_key = (today.isocalendar()[:2], MP_CACHE["generation"], data_version(SPECIAL_TEAMS_VERSION))
+    if SPECIAL_CACHE["key"] != cache_key:
+        SPECIAL_CACHE["results"] = compute_special_leaderboards(today)
+        SPECIAL_CACHE["key"] = cache_key
+    return SPECIAL_CACHE["results"]
+
+class SpecialTeamRequest(BaseModel):
+    key: str
+    name: str
+    slugs: List[str]
+    position: int = 0
+    active: bool = True
+
+@app.get("/admin/special-teams")
+@db_session
+def list_special_teams(api_key: str = Depends(verify_api_key)):
+    """List configured special teams."""
+    return [
+        {"key": t.key, "name": t.name, "slugs": t.slugs, "position": t.position, "active": t.active}
+        for t in SpecialTeam.select().order_by(SpecialTeam.position, SpecialTeam.id)
+    ]
+
+@app.post("/admin/special-teams")
+@db_session
+def upsert_special_team(request: SpecialTeamRequest, api_key: str = Depends(verify_api_key)):
+    """Create or update a special team by key."""
+    if len(request.slugs) > 10:
+        raise HTTPException(status_code=400, detail="Special teams can have at most 10 MPs")
+
+    seed_special_teams()
+    team = SpecialTeam.get(key=request.key)
+    values = dict(name=request.name, slugs=request.slugs, position=request.position, active=request.active)
+    if team:
+        team.set(**values)
+    else:
+        team = SpecialTeam(key=request.key, **values)
+    commit()
+    # Only the special teams changed: leave the roster and score caches alone
+    bump_data_version(SPECIAL_TEAMS_VERSION)
+
+    return {"status": "success", "key": team.key}
+
 def calculate_leaderboard_background():
     """Background task to calculate user weekly scores from their team MPs."""
-    from datetime import date, timedelta
-    
     print("LEADERBOARD: Starting background calculation...")
     try:
-        with db_session:
-            # Fetch all registrations (users)
-            registrations = Registration.select()
-            
-            # Calculate start of this week (Monday)
-            today = date.today()
-            week_start = today - timedelta(days=today.weekday())
-            
-            # Cache MP weekly scores (weekly points + committee once - penalty)
-            mp_scores = {}
-            for mp in MP.select():
-                # Weekly score = sum of this week's daily scores
-                weekly_pts = sum(
-                    ds.points_today for ds in mp.daily_scores 
-                    if ds.date >= week_start
-                )
-                # Committee bonus (counts ONCE, not every week)
-                committee_bonus = calculate_committee_score(mp.committees).get("total", 0) if mp.committees else 0
-                penalty = mp.penalty or 0
-                mp_scores[mp.id] = weekly_pts + committee_bonus - penalty
-            
-            updated_count = 0
-            for reg in registrations:
-                total_score = 0
-                for mp_id in reg.team_mp_ids:
-                    # mp_id might be string in JSON, ensure int
-                    mp_score = mp_scores.get(int(mp_id), 0)
-                    total_score += mp_score
-                
-                # Update or create LeaderboardEntry
-                # Use display_name as username
-                entry = LeaderboardEntry.get(username=reg.display_name)
-                if entry:
-                    if entry.score != total_score:
-                        entry.score = total_score
-                        entry.updated_at = datetime.now()
-                        updated_count += 1
-                else:
-                    LeaderboardEntry(username=reg.display_name, score=total_score, updated_at=datetime.now())
-                    updated_count += 1
-            
-            print(f"LEADERBOARD: Updated {updated_count} entries.")
+        with job_timer("leaderboard_calc"):
+            recompute_leaderboard()
     except Exception as e:
         print(f"LEADERBOARD ERROR: {e}")
         import traceback
@@ -664,6 +1004,14 @@ async def trigger_leaderboard_recalc(background_tasks: BackgroundTasks, api_key:
     background_tasks.add_task(calculate_leaderboard_background)
     return {"status": "success", "message": "Leaderboard recalculation started in background"}
 
+@app.get("/admin/leaderboard-stats")
+def leaderboard_stats(api_key: str = Depends(verify_api_key)):
+    """Timing and rows-changed count of the last leaderboard recompute."""
+    stats = dict(LEADERBOARD_STATS)
+    if stats["last_run"]:
+        stats["last_run"] = stats["last_run"].isoformat()
+    return stats
+
 class SetPenaltyRequest(BaseModel):
     mp_id: int
     penalty: int
@@ -678,6 +1026,8 @@ def set_mp_penalty(request: SetPenaltyRequest, api_key: str = Depends(verify_api
     
     old_penalty = mp.penalty or 0
     mp.penalty = request.penalty
+    commit()
+    apply_mp_deltas([mp.id])
     
     return {
         "status": "success",
@@ -702,6 +1052,8 @@ def update_mp(request: UpdateMPRequest, api_key: str = Depends(verify_api_key)):
     if request.party:
         old_party = mp.party
         mp.party = request.party
+        commit()
+        invalidate_mp_cache()
     
     return {
         "status": "success",
@@ -791,7 +1143,7 @@ def register_user(registration: RegistrationRequest, request: Request):
 
     # Create registration
     try:
-        Registration(
+        reg = Registration(
             user_id=new_user_id,
             display_name=display_name,
             team_name=team_name or "",
@@ -801,6 +1153,7 @@ def register_user(registration: RegistrationRequest, request: Request):
             ip_address=client_ip or "",
             registered_at=datetime.utcnow()
         )
+        add_team_members(reg, registration.team_mp_ids)
         # Placeholder for mailing list integration
         print(f"MAILING LIST: Added {email} to mailing list.")
         
@@ -819,14 +1172,19 @@ def register_user(registration: RegistrationRequest, request: Request):
 # Email Subscription API
 # ============================================
 
-# Initialize profanity filter
-profanity.load_censor_words()
+_profanity = None
+_profanity_lock = threading.Lock()
 
-# Email configuration (Resend primary, MailerSend fallback)
-RESEND_API_KEY = os.getenv("RESEND_API_KEY")
-RESEND_FROM_EMAIL = os.getenv("RESEND_FROM_EMAIL", "onboarding@resend.dev")
-MAILERSEND_API_KEY = os.getenv("MAILERSEND_API_KEY")
-MAILERSEND_FROM_EMAIL = "test@test-pzkmgq7yj0yl059v.mlsender.net"  # Verified test domain
+def get_profanity_filter():
+    """better_profanity with its censor wordlist, loaded on first use (or by warm_up)."""
+    global _profanity
+    if _profanity is None:
+        with _profanity_lock:
+            if _profanity is None:
+                from better_profanity import profanity
+                profanity.load_censor_words()
+                _profanity = profanity
+    return _profanity
 
 class SubscribeRequest(BaseModel):
     name: str
@@ -842,250 +1200,28 @@ def sanitize_name(name: str) -> str:
         raise HTTPException(status_code=400, detail="Display name too long (max 30 characters)")
     
     # Profanity filter
-    if profanity.contains_profanity(name):
+    if get_profanity_filter().contains_profanity(name):
         raise HTTPException(status_code=400, detail="Display name contains inappropriate content")
     
     # HTML escape to prevent XSS
     return html.escape(name.strip())
 
-def calculate_team_score(mp_ids: List[int]) -> int:
-    """Calculate weekly score for a list of MP IDs (weekly points + committee once + penalties)."""
-    from datetime import date, timedelta
-    
-    with db_session:
-        mps = MP.select(lambda m: m.id in mp_ids)
-        total = 0
-        # Get today's date and calculate start of week (Monday)
-        today = date.today()
-        week_start = today - timedelta(days=today.weekday())  # Monday
-        
-        for mp in mps:
-            # Weekly score = sum of this week's daily scores
-            weekly_pts = sum(
-                ds.points_today for ds in mp.daily_scores 
-                if ds.date >= week_start
-            )
-            # Committee bonus (counts ONCE, not every week)
-            committee_bonus = calculate_committee_score(mp.committees).get("total", 0) if mp.committees else 0
-            # Subtract penalty
-            penalty = mp.penalty or 0
-            
-            total += weekly_pts + committee_bonus - penalty
-        return total
-
-def send_score_email(email: str, name: str, mp_ids: List[int]) -> bool:
-    """Send weekly score email via Resend (primary) or MailerSend (fallback)."""
-    # Try Resend first, then fall back to MailerSend
-    api_key = RESEND_API_KEY or MAILERSEND_API_KEY
-    if not api_key:
-        print(f"EMAIL: No API key configured (Resend or MailerSend), skipping email to {email}")
-        return False
-    
-    use_resend = bool(RESEND_API_KEY)
-    provider = "Resend" if use_resend else "MailerSend"
-    
+def build_score_email(email: str, name: str, mp_ids: List[int], context: Optional[EmailContext] = None) -> Optional[dict]:
+    """Render the weekly score email for one subscriber. Returns None on error."""
     try:
-        # Get user's current team from Registration (not from subscription)
-        with db_session:
-            reg = Registration.get(email=email)
-            if reg:
-                mp_ids = reg.team_mp_ids
-                team_name = reg.team_name or "Your Team"
-            else:
-                team_name = "Your Team"
-        
-        # Calculate team score
-        team_score = calculate_team_score(mp_ids)
-        
-        # Get MP details for the email (show weekly scores)
-        from datetime import date, timedelta
-        today = date.today()
-        week_start = today - timedelta(days=today.weekday())
-        
-        with db_session:
-            mps = MP.select(lambda m: m.id in mp_ids)[:] if mp_ids else []
-            mp_details = []
-            for m in mps:
-                # Weekly score
-                weekly_pts = sum(ds.points_today for ds in m.daily_scores if ds.date >= week_start)
-                # Committee bonus (counts once)
-                committee_bonus = calculate_committee_score(m.committees).get("total", 0) if m.committees else 0
-                penalty = m.penalty or 0
-                display_score = weekly_pts + committee_bonus - penalty
-                mp_details.append((m.name, m.party, display_score))
-            mp_details.sort(key=lambda x: x[2], reverse=True)
-            
-            # Also calculate weekly for leaderboard
-            leader = LeaderboardEntry.select().order_by(desc(LeaderboardEntry.score)).first()
-            leader_score = leader.score if leader else 0
-            
-            top_mps = MP.select().order_by(desc(MP.total_score))[:3]
-            top_details = [(m.name, m.party, m.total_score) for m in top_mps]
-        
-        # Build HTML email
-        mp_rows = ""
-        for mp_name, mp_party, m_score in mp_details:
-            mp_rows += f"""
-            <tr>
-                <td style="padding: 10px; border-bottom: 1px solid #eee;">{mp_name}</td>
-                <td style="padding: 10px; border-bottom: 1px solid #eee;">{mp_party}</td>
-                <td style="padding: 10px; border-bottom: 1px solid #eee; text-align: right; font-weight: bold;">{m_score}</td>
-            </tr>"""
-        
-        top_rows = ""
-        for mp_name, mp_party, m_score in top_details:
-            top_rows += f"""
-            <tr>
-                <td style="padding: 8px;">{mp_name}</td>
-                <td style="padding: 8px;">{mp_party}</td>
-                <td style="padding: 8px; text-align: right;">{m_score}</td>
-            </tr>"""
-        
-        subject = f"Your Fantasy Parliament Score: {team_score} points"
-        
-        # Use simple strings for comparisons to avoid f-string quote nesting issues
-        is_ahead = team_score > leader_score
-        benchmark_msg = "You are ahead of the Party Leaders!" if is_ahead else "Keep picking wisely to beat them!"
-        text_is_ahead = "You are ahead!" if is_ahead else "Keep picking wisely!"
-
-        html_body = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Fantasy Parliament Weekly Update</title>
-</head>
-<body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-    <div style="background: linear-gradient(135deg, #c41e3a 0%, #8b0000 100%); padding: 30px; border-radius: 12px 12px 0 0;">
-        <h1 style="color: #fff; margin: 0; font-size: 28px;">Fantasy Parliament</h1>
-        <p style="color: #fff; margin: 5px 0 0 0; opacity: 0.9;">Weekly Score Update</p>
-    </div>
-    
-    <div style="background: #fff; padding: 30px; border: 1px solid #e1e1e1; border-top: none; border-radius: 0 0 12px 12px;">
-        <p style="margin-top: 0;">Hi {name},</p>
-        
-        <div style="background: linear-gradient(135deg, #c41e3a 0%, #8b0000 100%); color: white; padding: 25px; border-radius: 12px; text-align: center; margin: 20px 0;">
-            <p style="margin: 0; font-size: 16px; opacity: 0.9;">Your Total Score</p>
-            <p style="margin: 10px 0 0 0; font-size: 48px; font-weight: bold;">{team_score}</p>
-            <p style="margin: 10px 0 0 0; font-size: 14px; opacity: 0.8;">points this week</p>
-        </div>
-        
-        <h3 style="color: #1a1a2e; margin-bottom: 15px;">Your Team</h3>
-        <table style="width: 100%; border-collapse: collapse; margin-bottom: 25px; background: #f9f9f9; border-radius: 8px; overflow: hidden;">
-            <thead>
-                <tr style="background: #f0f0f0;">
-                    <th style="padding: 12px; text-align: left; font-size: 14px;">MP Name</th>
-                    <th style="padding: 12px; text-align: left; font-size: 14px;">Party</th>
-                    <th style="padding: 12px; text-align: right; font-size: 14px;">Score</th>
-                </tr>
-            </thead>
-            <tbody>
-                {mp_rows}
-            </tbody>
-        </table>
-        
-        <h3 style="color: #1a1a2e; margin-bottom: 15px;">Top MPs This Week</h3>
-        <table style="width: 100%; border-collapse: collapse; margin-bottom: 25px; background: #f9f9f9; border-radius: 8px; overflow: hidden;">
-            <thead>
-                <tr style="background: #f0f0f0;">
-                    <th style="padding: 12px; text-align: left; font-size: 14px;">MP Name</th>
-                    <th style="padding: 12px; text-align: left; font-size: 14px;">Party</th>
-                    <th style="padding: 12px; text-align: right; font-size: 14px;">Score</th>
-                </tr>
-            </thead>
-            <tbody>
-                {top_rows}
-            </tbody>
-        </table>
-        
-        <div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin-bottom: 20px;">
-            <p style="margin: 0; font-size: 14px;">
-                <strong>Party Leaders Benchmark:</strong> {leader_score} points
-                {benchmark_msg}
-            </p>
-        </div>
-        
-        <p style="margin-bottom: 0; font-size: 14px; color: #666;">
-            Visit <a href="https://fantasy-parliament.onrender.com" style="color: #667eea;">fantasy-parliament.onrender.com</a> to manage your team and check the full leaderboard.
-        </p>
-    </div>
-    
-    <div style="text-align: center; padding: 20px; color: #999; font-size: 12px;">
-        <p style="margin: 0;">You're receiving this because you subscribed to Fantasy Parliament updates.</p>
-        <p style="margin: 5px 0;"><a href="#" style="color: #999;">Unsubscribe</a></p>
-    </div>
-</body>
-</html>"""
-        
-        text_body = f"""Fantasy Parliament Weekly Score
-
-Hi {name},
-
-Your Total Score: {team_score} points
-
-Your Team:
-""" + "\n".join([f"  - {m[0]} ({m[1]}): {m[2]}" for m in mp_details]) + f"""
-
-Top MPs This Week:
-""" + "\n".join([f"  - {m[0]} ({m[1]}): {m[2]}" for m in top_details]) + f"""
-
-Party Leaders Benchmark: {leader_score} points
-{text_is_ahead}
-
-Visit https://fantasy-parliament.onrender.com to manage your team.
-"""
-        
-        # Send email using Resend or MailerSend
-        import httpx
-        
-        if use_resend:
-            url = "https://api.resend.com/emails"
-            headers = {
-                "Authorization": f"Bearer {RESEND_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "from": RESEND_FROM_EMAIL,
-                "to": [email],
-                "subject": subject,
-                "html": html_body,
-                "text": text_body
-            }
-        else:
-            url = "https://api.mailersend.com/v1/email"
-            headers = {
-                "Authorization": f"Bearer {MAILERSEND_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "from": {"email": MAILERSEND_FROM_EMAIL, "name": "Fantasy Parliament"},
-                "to": [{"email": email}],
-                "subject": subject,
-                "html": html_body,
-                "text": text_body
-            }
-        
-        try:
-            response = httpx.post(url, json=payload, headers=headers)
-            print(f"{provider}: Response status={response.status_code}")
-            
-            if response.status_code in (200, 202):
-                print(f"{provider}: Email sent successfully to {email}")
-                return True
-            else:
-                print(f"{provider}: Failed to send email to {email}: {response.status_code} - {response.text}")
-                return False
-        except Exception as e:
-            print(f"{provider} ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
-            
+        return render_score_email(context or build_email_context(), email, name, mp_ids)
     except Exception as e:
         print(f"EMAIL ERROR: {e}")
         import traceback
         traceback.print_exc()
+        return None
+
+def send_score_email(email: str, name: str, mp_ids: List[int]) -> bool:
+    """Send a single weekly score email (blocking; for admin tests)."""
+    message = build_score_email(email, name, mp_ids)
+    if message is None:
         return False
+    return send_messages_sync([message])["sent"] == 1
 
 @app.post("/subscribe")
 @db_session
@@ -1178,46 +1314,54 @@ def delete_subscriber(email: str, api_key: str = Header(None)):
 # Cron Endpoint for Weekly Score Emails
 # ============================================
 
-@app.post("/cron/weekly-score-emails")
-@db_session
-def trigger_weekly_emails(api_key: str = Header(None)):
-    """Trigger weekly score emails to all subscribers."""
-    # Skip API key check if called internally (scheduler passes None)
-    if api_key is not None and api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid API Key")
-    
-    subscribers = Subscriber.select()
-    count = 0
-    failed = 0
-    
-    for sub in subscribers:
-        print(f"EMAIL LOOP: Processing {sub.email} with MPs {sub.selected_mps}")
-        try:
-            success = send_score_email(sub.email, sub.name, sub.selected_mps)
-            print(f"EMAIL LOOP: Result for {sub.email}: {success}")
-        except Exception as e:
-            print(f"EMAIL LOOP: Exception for {sub.email}: {e}")
-            success = False
-        if success:
-            count += 1
-        else:
-            failed += 1
-    
+async def run_weekly_emails():
+    """
+    Queue this week's score emails and send everything due. Called by the
+    scheduler and the cron endpoint; re-running only sends what is left.
+    """
+    week_start = current_week_start()
+    with job_timer("weekly_emails"):
+        queued = await asyncio.to_thread(enqueue_week, week_start)
+        totals = await drain_outbox(week_start)
     return {
         "status": "completed",
-        "sent": count,
-        "failed": failed,
-        "total": subscribers.count()
+        "queued": queued,
+        **totals,
+        "outbox": await asyncio.to_thread(outbox_counts, week_start),
     }
 
-# Initialize scheduler for weekly emails
-scheduler = AsyncIOScheduler()
+async def drain_email_outbox():
+    with job_timer("email_outbox"):
+        return await drain_outbox()
+
+@app.post("/cron/weekly-score-emails")
+async def trigger_weekly_emails(api_key: str = Header(None)):
+    """Trigger weekly score emails to all subscribers."""
+    if api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    return await run_weekly_emails()
+
+@app.get("/admin/email-outbox")
+def email_outbox_status(api_key: str = Depends(verify_api_key)):
+    """Per-state outbox counts for this week's score emails."""
+    return {**outbox_counts(), "totals": {k: v for k, v in EMAIL_STATS.items() if k != "last_run"}}
+
+_scheduler = None
+
+def get_scheduler():
+    """The process's APScheduler, created on first use (web-only instances never need it)."""
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        _scheduler = AsyncIOScheduler()
+    return _scheduler
 
 def schedule_weekly_emails():
     """Schedule weekly emails (runs on Render)."""
+    scheduler = get_scheduler()
     # Schedule to run every Saturday at 10:00
     scheduler.add_job(
-        trigger_weekly_emails, 
+        leader_only(run_weekly_emails), 
         'cron', 
         day_of_week='sat', 
         hour=10, 
@@ -1225,11 +1369,18 @@ def schedule_weekly_emails():
         id='weekly_emails'
     )
     print("SCHEDULER: Weekly email job scheduled for Sundays at 18:00")
+    # Retries (backoff, rate limits) and runs interrupted by a restart
+    scheduler.add_job(
+        leader_only(drain_email_outbox),
+        'interval',
+        minutes=5,
+        id='email_outbox'
+    )
 
 def schedule_daily_sync():
     """Schedule daily sync job."""
-    scheduler.add_job(
-        run_sync_with_logging, 
+    get_scheduler().add_job(
+        leader_only(run_sync_with_logging), 
         'cron', 
         hour=3, 
         minute=0,
@@ -1239,33 +1390,56 @@ def schedule_daily_sync():
 
 def schedule_leaderboard_updates():
     """Schedule leaderboard calculation every hour."""
-    scheduler.add_job(
-        calculate_leaderboard_background,
+    get_scheduler().add_job(
+        leader_only(calculate_leaderboard_background),
         'interval',
         minutes=60,
         id='leaderboard_calc'
     )
     print("SCHEDULER: Leaderboard calculation scheduled every 60 minutes")
 
+@app.get("/admin/scheduler")
+def scheduler_status(api_key: str = Depends(verify_api_key)):
+    """Current scheduler leader and each job's next fire time in this process."""
+    return {
+        "running": bool(_scheduler and _scheduler.running),
+        "leader": scheduler_election.status(),
+        "jobs": [
+            {
+                "id": job.id,
+                "trigger": str(job.trigger),
+                # Unset until the scheduler has started
+                "next_run_time": getattr(job, "next_run_time", None),
+            }
+            for job in (_scheduler.get_jobs() if _scheduler else [])
+        ],
+    }
+
+@app.get("/admin/db-routing")
+def db_routing_status(api_key: str = Depends(verify_api_key)):
+    """Read-replica routing: enabled, last measured lag, sessions per target."""
+    return replica_status(db)
+
 @app.post("/admin/sync-now")
 async def sync_now(api_key: str = Depends(verify_api_key)):
-    """Run sync synchronously and return result immediately."""
-    import io
-    import sys
-    
-    old_stdout = sys.stdout
-    sys.stdout = mystdout = io.StringIO()
-    
-    try:
-        await run_sync()
-        output = mystdout.getvalue()
-        return {"status": "success", "logs": output}
-    except Exception as e:
-        import traceback
-        output = mystdout.getvalue() + "\n" + traceback.format_exc()
-        return {"status": "error", "logs": output}
-    finally:
-        sys.stdout = old_stdout
+    """
+    Run sync synchronously. Output goes to the sync log; the response has the
+    run id and the sequence range to fetch from /admin/logs.
+    """
+    since = sync_log.seq
+    with capture("sync-now") as run:
+        try:
+            if await run_sync():
+                status = "success"
+            else:
+                await asyncio.to_thread(refresh_mp_scores)
+                status = "error"
+        except Exception as e:
+            import traceback
+            print(f"SYNC-NOW ERROR: {e}")
+            sync_log.write(traceback.format_exc(), level="error", run=run)
+            status = "error"
+    return {"status": status, "run": run, "since": since, "latest": sync_log.seq}
 
 @app.post("/admin/update-committees")
 async def update_committees(request: Request, api_key: str = Depends(verify_api_key)):
@@ -1281,13 +1455,18 @@ async def update_committees(request: Request, api_key: str = Depends(verify_api_
         return {"status": "error", "message": "Expected array of {slug, committees}"}
     
     updated = 0
+    updated_ids = []
     with db_session:
         for item in committee_data:
             mp = MP.get(slug=item.get("slug"))
             if mp:
                 mp.committees = item.get("committees", [])
+                updated_ids.append(mp.id)
                 updated += 1
     
+    if updated_ids:
+        await asyncio.to_thread(apply_mp_deltas, updated_ids)
+    
     return {"status": "success", "updated": updated}
 
 @app.post("/admin/test-sync")
@@ -1335,6 +1514,76 @@ async def test_sync(api_key: str = Depends(verify_api_key)):
 def health():
     return {"status": "ok"}
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics")
+def prometheus_metrics(authorization: str = Header(None)):
+    """Prometheus text exposition. Set METRICS_TOKEN to require a bearer token."""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=403, detail="Invalid metrics token")
+
+    lookups = MP_CACHE_STATS["hits"] + MP_CACHE_STATS["misses"]
+    families = request_metric_families() + job_metric_families() + [
+        ("fp_mp_cache_lookups_total", "counter", "MP cache lookups by result.", [
+            ("", {"result": "hit"}, MP_CACHE_STATS["hits"]),
+            ("", {"result": "miss"}, MP_CACHE_STATS["misses"]),
+        ]),
+        ("fp_mp_cache_hit_ratio", "gauge", "MP cache hits / lookups since startup.",
+         [("", {}, MP_CACHE_STATS["hits"] / lookups if lookups else None)]),
+        ("fp_mp_cache_rebuild_seconds_total", "counter", "Time spent rebuilding the MP cache.",
+         [("", {}, MP_CACHE_STATS["rebuild_seconds_total"])]),
+        ("fp_mp_cache_last_rebuild_seconds", "gauge", "Duration of the latest MP cache rebuild.",
+         [("", {}, MP_CACHE_STATS["last_rebuild_seconds"])]),
+        ("fp_data_generation", "gauge", "Score data generation counter.",
+         [("", {}, data_generation())]),
+        ("fp_shared_cache_lookups_total", "counter", "Shared snapshot lookups on MP cache misses by result.", [
+            ("", {"result": "hit"}, SHARED_CACHE_STATS["hits"]),
+            ("", {"result": "build"}, SHARED_CACHE_STATS["builds"]),
+            ("", {"result": "waited_build"}, SHARED_CACHE_STATS["waited_builds"]),
+            ("", {"result": "error"}, SHARED_CACHE_STATS["errors"]),
+        ]),
+        ("fp_db_session_connections_total", "counter", "Database connections handed to sessions by target.", [
+            ("", {"target": "primary"}, ROUTING_STATS["primary"]),
+            ("", {"target": "replica"}, ROUTING_STATS["replica"]),
+        ]),
+        ("fp_db_replica_fallbacks_total", "counter", "Replica-routed sessions served by the primary.",
+         [("", {}, ROUTING_STATS["fallbacks"])]),
+        ("fp_db_replica_lag_seconds", "gauge", "Last measured replication lag.",
+         [("", {}, ROUTING_STATS["lag_seconds"])]),
+        ("fp_emails_total", "counter", "Emails handed to the provider by result.", [
+            ("", {"result": "sent"}, EMAIL_STATS["sent"]),
+            ("", {"result": "failed"}, EMAIL_STATS["failed"]),
+        ]),
+        ("fp_email_provider_requests_total", "counter", "HTTP requests made to the email provider.",
+         [("", {}, EMAIL_STATS["requests"])]),
+    ]
+    # Database-backed gauges; a DB problem shouldn't break the whole scrape
+    try:
+        outbox = outbox_counts()
+        families.append(("fp_email_outbox", "gauge", "This week's email outbox rows by state.",
+                         [("", {"state": state}, n) for state, n in outbox["states"].items()]))
+        families.append(("fp_db_table_rows_estimate", "gauge", "Approximate rows per table from catalog statistics.",
+                         [("", {"table": t}, n) for t, n in sorted(approximate_row_counts().items())]))
+        families.append(("fp_db_connections", "gauge", "Server connections to this database by state.",
+                         [("", {"state": st}, n) for st, n in sorted(db_connection_counts().items())]))
+    except Exception as e:
+        print(f"METRICS ERROR: {e}")
+    return PlainTextResponse(prometheus_text(families), media_type="text/plain; version=0.0.4")
+
+@app.get("/events")
+async def live_events(request: Request, events: Optional[str] = Query(None)):
+    """
+    Server-Sent Events stream of data changes: `generation` (data changed),
+    `scores` (changed MP weekly scores) and `leaderboard` (new top entries).
+    Optionally filter with ?events=generation,leaderboard.
+    """
+    wanted = {e.strip() for e in events.split(",") if e.strip()} if events else None
+    return StreamingResponse(
+        event_stream(request, wanted, initial=[("generation", {"generation": data_generation()})]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Also serve root
 @app.get("/")
 async def serve_root():
@@ -1352,6 +1601,8 @@ def seed_scores(api_key: str = Depends(verify_api_key)):
     for mp in mps:
         mp.total_score = random.randint(0, 100)
         count += 1
+    commit()
+    refresh_mp_scores()
     return {"status": "ok", "updated": count}
 
 # ============================================
@@ -1362,9 +1613,18 @@ import os
 
 
 @app.get("/mps/{mp_id}/scores")
-@db_session
-def get_mp_scores(mp_id: int):
+@reads_from("replica")
+async def get_mp_scores(mp_id: int):
     """Get daily score history for an MP"""
+    if not ASYNC_READS:
+        return await run_in_threadpool(get_mp_scores_orm, mp_id)
+    history = await fetch_mp_scores(mp_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="MP not found")
+    return history
+
+@db_session
+def get_mp_scores_orm(mp_id: int):
     try:
         mp = MP.select(lambda m: m.id == mp_id).first()
         if not mp:
@@ -1403,40 +1663,34 @@ async def serve_spa(path: str):
 
 @app.post("/admin/bulk-import-scores")
 async def bulk_import_scores(scores: List[dict], api_key: str = Depends(verify_api_key)):
-    """Bulk import daily scores"""
-    from pony.orm import db_session, commit
-    from datetime import datetime
-    
-    imported = 0
-    with db_session():
-        for s in scores:
-            mp = MP.get(slug=s.get('mp_slug'))
-            if not mp:
-                continue
-            
-            score_date = datetime.strptime(s['date'], '%Y-%m-%d').date()
-            
-            existing = DailyScore.get(mp=mp, date=score_date)
-            if not existing:
-                DailyScore(
-                    mp=mp,
-                    mp_name=s.get('mp_name', mp.name),
-                    party=s.get('party', mp.party),
-                    riding=s.get('riding', mp.riding),
-                    points_today=s.get('points', 0),
-                    date=score_date
-                )
-            else:
-                existing.points_today = s.get('points', 0)
-            
-            # Recalculate total
-            total = sum(ds.points_today for ds in mp.daily_scores)
-            mp.total_score = total
-            
-            imported += 1
-        commit()
-    
-    return {"imported": imported}
+    """Bulk import daily scores from a JSON list (see /admin/import-scores for large files)"""
+    return await asyncio.to_thread(import_rows, scores)
+
+@app.post("/admin/import-scores")
+async def stream_import_scores(request: Request, format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+                               api_key: str = Depends(verify_api_key)):
+    """
+    Import daily scores from a streamed NDJSON or CSV body (format from
+    `format` or the Content-Type), upserting in batches as lines arrive.
+    """
+    parser = LineParser(format or format_for(request.headers.get("content-type")))
+    importer = ScoreImporter()
+    await asyncio.to_thread(importer.load_mps)
+    line_no = 0
+    try:
+        async for line in iter_lines(request.stream()):
+            line_no += 1
+            try:
+                row = parser.parse(line)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"line {line_no}: {e}")
+            if row is not None and importer.add(row, line_no):
+                await asyncio.to_thread(importer.flush)
+    finally:
+        # Totals and MPScore cover whatever was committed, even after an error
+        summary = await asyncio.to_thread(importer.finish)
+        print(f"ADMIN: Score import {summary}")
+    return summary
 
 @app.post("/admin/recalculate-scores")
 async def recalculate_scores(api_key: str = Depends(verify_api_key)):
@@ -1453,6 +1707,7 @@ async def recalculate_scores(api_key: str = Depends(verify_api_key)):
             updated += 1
         commit()
     
+    await asyncio.to_thread(refresh_mp_scores)
     return {"updated": updated}
 
 @app.post("/admin/populate-breakdowns")
@@ -1472,5 +1727,6 @@ async def populate_breakdowns(api_key: str = Depends(verify_api_key)):
             updated += 1
         commit()
     
+    invalidate_mp_cache()
     return {"updated": updated}
 
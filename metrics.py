@@ -0,0 +1,444 @@
+"""
+Request timing, SQL instrumentation and on-demand profiling.
+
+TimingMiddleware (pure ASGI, so streaming responses are not buffered) records
+per-route latency histograms, DB time and response bytes into REQUEST_STATS.
+DB time comes from instrument_db(), which wraps Pony's Database._exec_sql and
+charges each statement to the current request's QueryStats. The same wrapper
+keeps these:
+- SLOW_QUERIES: statements slower than SLOW_QUERY_MS, with their plans
+- N_PLUS_ONE: requests that ran one statement shape more than
+  N_PLUS_ONE_THRESHOLD times, the usual sign of per-row relationship loads
+  in a loop
+
+track_queries() / assert_max_queries() count statements for a block of code;
+tests use them to hold endpoints to a query budget.
+
+SamplingProfiler samples every thread's stack on an interval for a number of
+seconds or until N requests have finished. It returns collapsed stacks
+("frame;frame;frame count" lines), which flamegraph.pl and speedscope read
+directly. Nothing runs while no profile is active.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+EXPLAIN_INTERVAL = 300  # seconds between EXPLAINs of the same statement shape
+
+class QueryStats:
+    """SQL statements, time and repeated shapes for one request or block."""
+    __slots__ = ("time", "statements", "shapes")
+
+    def __init__(self):
+        self.time = 0.0
+        self.statements = 0
+        self.shapes = Counter()
+
+    def add(self, shape, seconds):
+        self.time += seconds
+        self.statements += 1
+        self.shapes[shape] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Statement shapes run more than `threshold` times, most repeated first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+    def report(self):
+        return "\n".join(f"{n:5d}x {shape}" for shape, n in self.shapes.most_common())
+
+# Per-request accounting (set by TimingMiddleware)
+_request_db = ContextVar("request_db", default=None)
+# Active track_queries() blocks; process-wide so they see every thread
+_trackers = []
+
+SLOW_QUERIES = deque(maxlen=100)
+N_PLUS_ONE = deque(maxlen=100)
+_last_explained = {}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+def statement_shape(sql):
+    """SQL with literals and IN-list lengths normalised, for grouping repeats."""
+    shape = _LITERALS.sub("?", sql)
+    shape = _PLACEHOLDER_LISTS.sub("(...)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+class RouteStats:
+    __slots__ = ("count", "latency_sum", "buckets", "db_time_sum", "db_statements", "bytes_sum", "statuses")
+
+    def __init__(self):
+        self.count = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.db_time_sum = 0.0
+        self.db_statements = 0
+        self.bytes_sum = 0
+        self.statuses = Counter()
+
+    def observe(self, latency, db_time, db_statements, size, status):
+        self.count += 1
+        self.latency_sum += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.db_time_sum += db_time
+        self.db_statements += db_statements
+        self.bytes_sum += size
+        self.statuses[status] += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-quantile (None if no data)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        n = self.count or 1
+        return {
+            "count": self.count,
+            "avg_ms": round(self.latency_sum / n * 1000, 2),
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "p99_ms": _ms(self.quantile(0.99)),
+            "avg_db_ms": round(self.db_time_sum / n * 1000, 2),
+            "avg_db_statements": round(self.db_statements / n, 2),
+            "avg_bytes": round(self.bytes_sum / n),
+            "statuses": dict(self.statuses),
+        }
+
+def _ms(seconds):
+    if seconds is None or seconds == float("inf"):
+        return seconds
+    return round(seconds * 1000, 2)
+
+# (method, route path template) -> RouteStats
+REQUEST_STATS = {}
+_stats_lock = threading.Lock()
+
+def record_request(method, route, latency, db_time, db_statements, size, status):
+    with _stats_lock:
+        stats = REQUEST_STATS.get((method, route))
+        if stats is None:
+            stats = REQUEST_STATS[(method, route)] = RouteStats()
+        stats.observe(latency, db_time, db_statements, size, status)
+    if PROFILER.active:
+        PROFILER.request_finished()
+
+def request_stats_summary():
+    with _stats_lock:
+        items = sorted(REQUEST_STATS.items(), key=lambda kv: kv[1].latency_sum, reverse=True)
+        return [{"method": m, "route": r, **s.summary()} for (m, r), s in items]
+
+def record_statement(sql, elapsed):
+    """Charge one SQL statement to the current request and active trackers."""
+    acc = _request_db.get()
+    if acc is not None or _trackers:
+        shape = statement_shape(sql)
+        if acc is not None:
+            acc.add(shape, elapsed)
+        for tracker in list(_trackers):
+            tracker.add(shape, elapsed)
+
+def instrument_db(database):
+    """
+    Time every SQL statement Pony executes: charge it to the current request
+    and active trackers, and log slow statements with their plan.
+    """
+    if getattr(database, "_timed", False):
+        return
+    original = database._exec_sql
+
+    def timed_exec_sql(sql, arguments=None, *args, **kwargs):
+        started = time.perf_counter()
+        result = original(sql, arguments, *args, **kwargs)
+        elapsed = time.perf_counter() - started
+        record_statement(sql, elapsed)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _log_slow_query(database, original, sql, arguments, elapsed)
+        return result
+
+    database._exec_sql = timed_exec_sql
+    database._timed = True
+
+def _explain(database, original, sql, arguments):
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if database.provider_name == "sqlite" else "EXPLAIN "
+    try:
+        rows = original(prefix + sql, arguments).fetchall()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    if database.provider_name == "sqlite":
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(row[0] for row in rows)
+
+def _log_slow_query(database, original, sql, arguments, elapsed):
+    shape = statement_shape(sql)
+    now = time.monotonic()
+    plan = None
+    # EXPLAIN each shape at most once per EXPLAIN_INTERVAL
+    if now - _last_explained.get(shape, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL:
+        _last_explained[shape] = now
+        plan = _explain(database, original, sql, arguments)
+    SLOW_QUERIES.append({
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "ms": round(elapsed * 1000, 1),
+        "sql": shape,
+        "plan": plan,
+    })
+    print(f"SLOW QUERY: {elapsed * 1000:.0f}ms {shape[:300]}" + (f"\n{plan}" if plan else ""))
+
+def current_db_usage():
+    """(seconds, statements) spent in SQL so far by the current request."""
+    acc = _request_db.get()
+    return (acc.time, acc.statements) if acc else (0.0, 0)
+
+@contextmanager
+def track_queries():
+    """Count SQL statements run (from any thread) inside the block."""
+    stats = QueryStats()
+    _trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _trackers.remove(stats)
+
+@contextmanager
+def assert_max_queries(budget, max_repeats=None, label="block"):
+    """
+    Fail if the block runs more than `budget` statements, or (with
+    max_repeats) any one statement shape more than max_repeats times.
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.statements > budget:
+        raise AssertionError(f"{label} ran {stats.statements} SQL statements (budget {budget}):\n{stats.report()}")
+    if max_repeats is not None and stats.repeated(max_repeats):
+        raise AssertionError(f"{label} repeated a statement more than {max_repeats} times:\n{stats.report()}")
+
+def check_n_plus_one(method, route, stats):
+    repeated = stats.repeated()
+    if not repeated:
+        return
+    shape, n = repeated[0]
+    N_PLUS_ONE.append({
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "route": f"{method} {route}",
+        "count": n,
+        "statements": stats.statements,
+        "sql": shape,
+    })
+    print(f"QUERY WARNING: possible N+1 in {method} {route}: {n}x {shape[:200]}")
+
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        acc = QueryStats()
+        token = _request_db.set(acc)
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_db.reset(token)
+            route = scope.get("route")
+            # Unmatched paths are grouped so arbitrary URLs can't grow the table
+            path = getattr(route, "path", None) or "<unmatched>"
+            record_request(scope["method"], path, time.perf_counter() - started,
+                           acc.time, acc.statements, response["bytes"], response["status"])
+            check_n_plus_one(scope["method"], path, acc)
+
+class SamplingProfiler:
+    """Statistical profiler over all threads, one run at a time."""
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._requests_left = None
+        self._done = threading.Event()
+
+    def request_finished(self):
+        if self._requests_left is not None:
+            self._requests_left -= 1
+            if self._requests_left <= 0:
+                self._done.set()
+
+    def run(self, seconds=10.0, requests=None, interval=0.005, include_idle=False):
+        """
+        Sample for `seconds`, or until `requests` requests have finished
+        (bounded by `seconds`). Returns (Counter of collapsed stacks, samples).
+        """
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profile is already running")
+            self.active = True
+        self._requests_left = requests
+        self._done.clear()
+        own = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline and not self._done.is_set():
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if not include_idle and _is_idle(frame):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._requests_left = None
+            self.active = False
+        return stacks, samples
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (code.co_filename.rsplit("/", 1)[-1], code.co_name) in IDLE_FRAMES
+
+PROFILER = SamplingProfiler()
+
+# Innermost frames of threads that are just waiting for work
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+def collapsed(stacks):
+    """Render stacks in flamegraph collapsed format, heaviest first."""
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+# Scheduler/background job bookkeeping: name -> stats
+JOB_STATS = {}
+
+@contextmanager
+def job_timer(name):
+    """Record duration and success/failure of one job run."""
+    stats = JOB_STATS.setdefault(name, {
+        "runs": 0, "failures": 0, "duration_sum": 0.0,
+        "last_duration": None, "last_success": None, "last_failure": None,
+    })
+    started = time.perf_counter()
+    try:
+        yield stats
+    except BaseException:
+        stats["failures"] += 1
+        stats["last_failure"] = time.time()
+        raise
+    else:
+        stats["last_success"] = time.time()
+    finally:
+        duration = time.perf_counter() - started
+        stats["runs"] += 1
+        stats["duration_sum"] += duration
+        stats["last_duration"] = duration
+
+# Prometheus text exposition. A family is (name, type, help, samples) with
+# samples as (name suffix, labels dict, value).
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def prometheus_text(families):
+    lines = []
+    for name, mtype, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {mtype}")
+        for suffix, labels, value in samples:
+            if value is None:
+                continue
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{suffix}{{{label_str}}} {_format_value(value)}" if label_str
+                         else f"{name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def request_metric_families():
+    latency, db_time, sizes, statuses = [], [], [], []
+    with _stats_lock:
+        items = list(REQUEST_STATS.items())
+        for (method, route), stats in items:
+            labels = {"method": method, "route": route}
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += n
+                latency.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            latency.append(("_bucket", {**labels, "le": "+Inf"}, stats.count))
+            latency.append(("_sum", labels, stats.latency_sum))
+            latency.append(("_count", labels, stats.count))
+            db_time.append(("", labels, stats.db_time_sum))
+            sizes.append(("", labels, stats.bytes_sum))
+            for status, n in stats.statuses.items():
+                statuses.append(("", {**labels, "status": status}, n))
+    return [
+        ("fp_http_request_duration_seconds", "histogram", "HTTP request latency by route.", latency),
+        ("fp_http_request_db_seconds_total", "counter", "Time spent in SQL by route.", db_time),
+        ("fp_http_response_bytes_total", "counter", "Response body bytes by route.", sizes),
+        ("fp_http_requests_total", "counter", "HTTP requests by route and status.", statuses),
+    ]
+
+def job_metric_families():
+    runs, failures, durations, last_duration, last_success = [], [], [], [], []
+    for name, stats in JOB_STATS.items():
+        labels = {"job": name}
+        runs.append(("", labels, stats["runs"]))
+        failures.append(("", labels, stats["failures"]))
+        durations.append(("", labels, stats["duration_sum"]))
+        last_duration.append(("", labels, stats["last_duration"]))
+        last_success.append(("", labels, stats["last_success"]))
+    return [
+        ("fp_job_runs_total", "counter", "Background job runs.", runs),
+        ("fp_job_failures_total", "counter", "Background job runs that raised.", failures),
+        ("fp_job_duration_seconds_total", "counter", "Total background job run time.", durations),
+        ("fp_job_last_duration_seconds", "gauge", "Duration of the latest run.", last_duration),
+        ("fp_job_last_success_timestamp_seconds", "gauge", "Unix time of the latest successful run.", last_success),
+    ]
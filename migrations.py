@@ -0,0 +1,212 @@
+"""
+Numbered schema migrations, applied once each and recorded in schema_version.
+
+generate_mapping(create_tables=True) creates missing tables but never alters
+existing ones, so column additions and indexes live here. To change the
+schema, append a @migration with the next version number; a new entity
+(table) also needs one, even an empty one, because startup only lets Pony
+create tables while a migration is pending.
+
+At startup init_db() reads the applied versions with one query. When none
+are pending it maps the entities without any DDL or per-table checks;
+otherwise it creates missing tables and calls run_migrations(). Migrations
+hold a Postgres advisory lock while they run, so workers booting together
+apply each one once. SQLite databases are created from the current entities
+and only record the Postgres-only migrations as applied.
+"""
+from collections import namedtuple
+from pony.orm import db_session
+from models import db, SchemaVersion
+
+# Fixed application-wide key for pg_advisory_xact_lock ("fpmg")
+MIGRATION_LOCK_KEY = 0x66706d67
+
+Migration = namedtuple("Migration", "version name apply postgres_only")
+MIGRATIONS = []
+
+def migration(version, name, postgres_only=True):
+    def register(fn):
+        assert all(m.version != version for m in MIGRATIONS), f"duplicate migration {version}"
+        MIGRATIONS.append(Migration(version, name, fn, postgres_only))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+def _spellings(tables, name):
+    # Very old databases were created with capitalized table names
+    return [t for t in (name.lower(), name) if t in tables]
+
+@migration(1, "mp.total_score")
+def _mp_total_score(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "total_score" INTEGER NOT NULL DEFAULT 0')
+
+@migration(2, "mp.image_url")
+def _mp_image_url(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "image_url" TEXT')
+
+# 3 (bill.date_passed) was dropped along with the Bill table
+
+@migration(4, "registration.ip_address")
+def _registration_ip_address(cur, tables):
+    for table in _spellings(tables, "Registration"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "ip_address" TEXT')
+        cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "ip_address" DROP NOT NULL')
+
+@migration(5, "mp.committees")
+def _mp_committees(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "committees" JSONB')
+
+@migration(6, "mp.score_breakdown")
+def _mp_score_breakdown(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "score_breakdown" JSONB')
+
+@migration(7, "subscriber table")
+def _subscriber_table(cur, tables):
+    if _spellings(tables, "Subscriber"):
+        return
+    cur.execute('''
+        CREATE TABLE "subscriber" (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            "selected_mps" JSONB NOT NULL,
+            "unsubscribe_token" TEXT UNIQUE NOT NULL,
+            "created_at" TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    ''')
+
+@migration(8, "subscriber.unsubscribe_token")
+def _subscriber_unsubscribe_token(cur, tables):
+    for table in _spellings(tables, "Subscriber"):
+        # Add as nullable, give existing rows a random token, then tighten
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "unsubscribe_token" TEXT')
+        cur.execute(f'''
+            UPDATE "{table}"
+            SET "unsubscribe_token" = md5(random()::text || clock_timestamp()::text)
+            WHERE "unsubscribe_token" IS NULL
+        ''')
+        cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "unsubscribe_token" SET NOT NULL')
+        cur.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", (f"{table}_unsubscribe_token_key",))
+        if cur.fetchone() is None:
+            cur.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_unsubscribe_token_key" UNIQUE ("unsubscribe_token")')
+
+@migration(9, "mp.active")
+def _mp_active(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "active" BOOLEAN NOT NULL DEFAULT TRUE')
+
+@migration(10, "registration.team_name nullable")
+def _registration_team_name(cur, tables):
+    for table in _spellings(tables, "Registration"):
+        cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "team_name" DROP NOT NULL')
+
+@migration(11, "mp.penalty")
+def _mp_penalty(cur, tables):
+    for table in _spellings(tables, "MP"):
+        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "penalty" INTEGER NOT NULL DEFAULT 0')
+
+@migration(12, "leaderboardentry score index")
+def _leaderboard_score_index(cur, tables):
+    # Keyset pagination on the leaderboard
+    for table in _spellings(tables, "LeaderboardEntry"):
+        cur.execute(f'CREATE INDEX IF NOT EXISTS "idx_leaderboardentry__score" ON "{table}" ("score" DESC, "id")')
+
+@migration(13, "tables created by generate_mapping", postgres_only=False)
+def _mapped_tables(cur, tables):
+    # teammember, mpscore, specialteam, cachegeneration, schedulerlease,
+    # emailoutbox and schema_version: Pony creates them while this is pending
+    pass
+
+def _has_unique_index(cur, table, columns):
+    """Whether `table` already has a unique index on exactly `columns`."""
+    if db.provider_name == "postgres":
+        cur.execute("""SELECT 1 FROM pg_index i JOIN pg_class t ON t.oid = i.indrelid
+            WHERE t.relname = %s AND t.relnamespace = current_schema()::regnamespace AND i.indisunique
+              AND (SELECT array_agg(a.attname::text ORDER BY a.attname) FROM pg_attribute a
+                   WHERE a.attrelid = t.oid AND a.attnum = ANY(i.indkey)) = %s""", (table, sorted(columns)))
+        return cur.fetchone() is not None
+    cur.execute(f'PRAGMA index_list("{table}")')
+    for index in [row[1] for row in cur.fetchall() if row[2]]:
+        cur.execute(f'PRAGMA index_info("{index}")')
+        if sorted(row[2] for row in cur.fetchall()) == sorted(columns):
+            return True
+    return False
+
+@migration(14, "dailyscore unique (mp, date)", postgres_only=False)
+def _dailyscore_unique_mp_date(cur, tables):
+    # Upsert target for score_import; keep the newest row of any duplicates
+    if "dailyscore" not in tables:
+        return
+    cur.execute('SELECT DISTINCT "mp" FROM "dailyscore" GROUP BY "mp", "date" HAVING COUNT(*) > 1')
+    affected = [int(row[0]) for row in cur.fetchall()]
+    if affected:
+        id_list = ", ".join(str(mp_id) for mp_id in affected)
+        cur.execute('DELETE FROM "dailyscore" WHERE "id" NOT IN (SELECT MAX("id") FROM "dailyscore" GROUP BY "mp", "date")')
+        for table in _spellings(tables, "MP"):
+            cur.execute(f"""UPDATE "{table}" SET "total_score" = COALESCE(
+                (SELECT SUM(d."points_today") FROM "dailyscore" d WHERE d."mp" = "{table}"."id"), 0)
+                WHERE "id" IN ({id_list})""")
+        for table in _spellings(tables, "MPScore"):
+            # ensure_mp_scores_current() rebuilds MPScore when rows are missing
+            cur.execute(f'DELETE FROM "{table}" WHERE "mp_id" IN ({id_list})')
+    # Tables created with DailyScore's composite_key already have one
+    if not _has_unique_index(cur, "dailyscore", ["mp", "date"]):
+        cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS "unq_dailyscore__mp_date" ON "dailyscore" ("mp", "date")')
+
+@migration(15, "schedulerjobrun table", postgres_only=False)
+def _scheduler_job_run_table(cur, tables):
+    # Pony creates the table while this is pending
+    pass
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def applied_versions():
+    """Versions recorded in schema_version (empty if the table doesn't exist yet)."""
+    try:
+        with db_session:
+            return set(db.select("SELECT version FROM schema_version"))
+    except Exception:
+        return set()
+
+def pending_migrations(applied=None):
+    applied = applied_versions() if applied is None else applied
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+def _existing_tables(cur):
+    if db.provider_name == "postgres":
+        cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()")
+    else:
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in cur.fetchall()}
+
+def run_migrations():
+    """
+    Apply pending migrations in version order, each in its own transaction.
+    Stops at the first failure (retried on the next run). Returns (success, message).
+    """
+    postgres = db.provider_name == "postgres"
+    applied = []
+    for m in pending_migrations():
+        try:
+            with db_session:
+                cur = db.get_connection().cursor()
+                if postgres:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                # Another worker may have applied it while we waited for the lock
+                if SchemaVersion.get(version=m.version) is not None:
+                    continue
+                ran = postgres or not m.postgres_only
+                if ran:
+                    m.apply(cur, _existing_tables(cur))
+                SchemaVersion(version=m.version, name=m.name)
+            applied.append(m.version)
+            print(f"MIGRATIONS: {'Applied' if ran else 'Recorded'} {m.version} ({m.name})")
+        except Exception as e:
+            error_msg = f"Migration {m.version} ({m.name}) failed: {e}"
+            print(f"MIGRATIONS ERROR: {error_msg}")
+            return False, error_msg
+    return True, f"Applied migrations {applied}; schema at version {LATEST_VERSION}"
@@ -1,4 +1,4 @@
-from pony.orm import Database, Required, Optional, Set, PrimaryKey, db_session, Json
+from pony.orm import Database, Required, Optional, Set, PrimaryKey, db_session, Json, composite_key
 from datetime import date, datetime
 
 db = Database()
@@ -13,6 +13,13 @@ class Registration(db.Entity):
     team_mp_ids = Required(Json)
     ip_address = Optional(str)
     registered_at = Required(datetime, default=datetime.utcnow)
+    team_members = Set('TeamMember')
+
+# Reverse index of team_mp_ids: which registrations contain a given MP
+class TeamMember(db.Entity):
+    _table_ = 'teammember'
+    registration = Required(Registration)
+    mp_id = Required(int, index=True)
 
 class MP(db.Entity):
     _table_ = 'mp'
@@ -39,13 +46,65 @@ class DailyScore(db.Entity):
     riding = Optional(str)
     points_today = Required(int)
     date = Required(date)
+    composite_key(mp, date)  # one row per MP per day; upsert target for score_import
+
+# Materialized per-MP scores, rebuilt by scores.refresh_mp_scores() on data change
+class MPScore(db.Entity):
+    _table_ = 'mpscore'
+    mp_id = PrimaryKey(int)
+    week_start = Required(date)
+    weekly_points = Required(int, default=0)
+    committee_points = Required(int, default=0)
+    penalty = Required(int, default=0)
+    weekly_score = Required(int, default=0) # weekly points + committee once - penalty
+    season_score = Required(int, default=0) # all-time points + committee once - penalty
+    updated_at = Required(datetime, default=datetime.utcnow)
+
+class SpecialTeam(db.Entity):
+    _table_ = 'specialteam'
+    key = Required(str, unique=True)
+    name = Required(str)
+    slugs = Required(Json)  # JSON array of MP slugs
+    position = Required(int, default=0)
+    active = Required(bool, default=True)
 
 class LeaderboardEntry(db.Entity):
     _table_ = 'leaderboardentry'
     username = Required(str, unique=True)
-    score = Required(int)
+    score = Required(int, index=True)
     updated_at = Required(datetime)
 
+# Cross-worker data generation, bumped by scores.bump_generation() and polled
+# by every worker to know when its caches are stale
+class CacheGeneration(db.Entity):
+    _table_ = 'cachegeneration'
+    name = PrimaryKey(str)
+    generation = Required(int, default=0)
+    token = Required(str)  # random per row, so snapshots of a recreated database never match
+    updated_at = Required(datetime, default=datetime.utcnow)
+
+# Current holder of a leader lease, maintained by leader.LeaderElection
+class SchedulerLease(db.Entity):
+    _table_ = 'schedulerlease'
+    name = PrimaryKey(str)
+    holder = Required(str)
+    acquired_at = Required(datetime)
+    renewed_at = Required(datetime)
+    expires_at = Required(datetime)
+
+# Last completed run of each leader-only job, so a new leader can catch up
+class SchedulerJobRun(db.Entity):
+    _table_ = 'schedulerjobrun'
+    job = PrimaryKey(str)
+    last_run_at = Required(datetime)
+
+# One row per applied migration (see migrations.py)
+class SchemaVersion(db.Entity):
+    _table_ = 'schema_version'
+    version = PrimaryKey(int)
+    name = Required(str)
+    applied_at = Required(datetime, default=datetime.utcnow)
+
 # class Speech(db.Entity):
 #     _table_ = 'speech'
 #     mp = Required(MP)
@@ -76,177 +135,25 @@ class Subscriber(db.Entity):
     unsubscribe_token = Required(str, unique=True)
     created_at = Required(datetime, default=datetime.utcnow)
 
-@db_session
-def run_migrations(dsn=None, **kwargs):
+# One weekly score email per subscriber per week, drained by email_outbox.drain_outbox()
+class EmailOutbox(db.Entity):
+    _table_ = 'emailoutbox'
+    email = Required(str)
+    week_start = Required(date)
+    state = Required(str, default='pending', index=True)  # pending / sending / sent / failed
+    attempts = Required(int, default=0)
+    next_attempt_at = Required(datetime, default=datetime.utcnow)
+    last_error = Optional(str, nullable=True)
+    created_at = Required(datetime, default=datetime.utcnow)
+    sent_at = Optional(datetime)
+    composite_key(email, week_start)
+
+def init_db(provider_or_url='postgres', safe_mode=True, replica=None, **kwargs):
     """
-    Run manual migrations using psycopg2 directly.
-    This can be called at startup (safe mode) or via API.
+    Bind and map the database, applying pending migrations (see migrations.py).
+    `replica` ("sqlite:<path>" or a postgres URL) enables routing of
+    replica-marked sessions, see db_routing.
     """
-    import psycopg2
-    import os
-    
-    print("Starting manual migrations...")
-    try:
-        # Construct DSN if not provided
-        if not dsn:
-            db_url = os.getenv('INTERNAL_DATABASE_URL') or os.getenv('DATABASE_URL_INTERNAL') or os.getenv('DATABASE_URL')
-            if db_url:
-                dsn = db_url
-                if dsn.startswith('postgres://'):
-                    dsn = dsn.replace('postgres://', 'postgresql://', 1)
-        
-        if dsn:
-            if 'sslmode=' not in dsn:
-                separator = '&' if '?' in dsn else '?'
-                dsn += f"{separator}sslmode=require"
-            conn = psycopg2.connect(dsn, connect_timeout=10)
-        else:
-            conn = psycopg2.connect(
-                user=kwargs.get('user') or os.getenv('DB_USER'),
-                password=kwargs.get('password') or os.getenv('DB_PASSWORD'),
-                host=kwargs.get('host') or os.getenv('DB_HOST'),
-                database=kwargs.get('database') or os.getenv('DB_NAME'),
-                sslmode='require',
-                connect_timeout=10
-            )
-        
-        conn.autocommit = True
-        with conn.cursor() as cur:
-            # Audit tables first to debug
-            print("Auditing tables in public schema...")
-            cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
-            tables = [t[0] for t in cur.fetchall()]
-            print(f"Found tables: {tables}")
-
-            # Migration 1: MP.total_score
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "total_score" INTEGER NOT NULL DEFAULT 0')
-                        print(f"Applied/Checked: {table}.total_score")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.total_score): {e}")
-            
-            # Migration 2: MP.image_url
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "image_url" TEXT')
-                        print(f"Applied/Checked: {table}.image_url")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.image_url): {e}")
-
-            # Migration 3: Bill.date_passed - REMOVED (Table deprecated)
-            # for table in ['bill', 'Bill']:
-            #     if table in tables:
-            #         try:
-            #             cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "date_passed" DATE')
-            #             print(f"Applied/Checked: {table}.date_passed")
-            #         except Exception as e:
-            #             print(f"Migration warning ({table}.date_passed): {e}")
-
-            # Migration 4: Registration.ip_address
-            for table in ['registration', 'Registration']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "ip_address" TEXT')
-                        # Ensure it's nullable
-                        cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "ip_address" DROP NOT NULL')
-                        print(f"Applied/Checked: {table}.ip_address")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.ip_address): {e}")
-
-            # Migration 10: Registration nullability
-            for table in ['registration', 'Registration']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "team_name" DROP NOT NULL')
-                        print(f"Applied/Checked: {table}.team_name nullable")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.team_name nullability): {e}")
-
-            # Migration 5: MP.committees
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "committees" JSONB')
-                        print(f"Applied/Checked: {table}.committees")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.committees): {e}")
-
-            # Migration 6: MP.score_breakdown
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "score_breakdown" JSONB')
-                        print(f"Applied/Checked: {table}.score_breakdown")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.score_breakdown): {e}")
-
-            # Migration 9: MP.active
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "active" BOOLEAN NOT NULL DEFAULT TRUE')
-                        print(f"Applied/Checked: {table}.active")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.active): {e}")
-
-            # Migration 11: MP.penalty
-            print("DEBUG: Checking for penalty migration...")
-            for table in ['mp', 'MP']:
-                if table in tables:
-                    try:
-                        cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "penalty" INTEGER NOT NULL DEFAULT 0')
-                        print(f"Applied/Checked: {table}.penalty")
-                    except Exception as e:
-                        print(f"Migration warning ({table}.penalty): {e}")
-
-            # Migration 7: Subscriber table
-            if 'subscriber' not in tables and 'Subscriber' not in tables:
-                try:
-                    cur.execute('''
-                        CREATE TABLE "subscriber" (
-                            id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            email TEXT UNIQUE NOT NULL,
-                            "selected_mps" JSONB NOT NULL,
-                            "unsubscribe_token" TEXT UNIQUE NOT NULL,
-                            "created_at" TIMESTAMP NOT NULL DEFAULT NOW()
-                        )
-                    ''')
-                    print("Created table: subscriber")
-                except Exception as e:
-                    print(f"Migration warning (subscriber table): {e}")
-            else:
-                 # Migration 8: Subscriber.unsubscribe_token
-                for table in ['subscriber', 'Subscriber']:
-                    if table in tables:
-                        try:
-                            # Add column as nullable first
-                            cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "unsubscribe_token" TEXT')
-                            # Populate with random tokens for existing rows
-                            cur.execute(f'''
-                                UPDATE "{table}" 
-                                SET "unsubscribe_token" = md5(random()::text || clock_timestamp()::text) 
-                                WHERE "unsubscribe_token" IS NULL
-                            ''')
-                            # Make not null and unique
-                            cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "unsubscribe_token" SET NOT NULL')
-                            cur.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_unsubscribe_token_key" UNIQUE ("unsubscribe_token")')
-                            print(f"Applied/Checked: {table}.unsubscribe_token")
-                        except Exception as e:
-                            print(f"Migration warning ({table}.unsubscribe_token): {e}")
-                
-        conn.close()
-        print("Direct Postgres migration successful")
-        return True, f"Migrations completed. Tables found: {tables}"
-    except Exception as e:
-        error_msg = f"Direct migration failed: {e}"
-        print(error_msg)
-        return False, error_msg
-
-def init_db(provider_or_url='postgres', safe_mode=True, **kwargs):
     dsn = None
     provider = provider_or_url
 
@@ -257,7 +164,9 @@ def init_db(provider_or_url='postgres', safe_mode=True, **kwargs):
         if dsn.startswith('postgres://'):
             dsn = dsn.replace('postgres://', 'postgresql://', 1)
 
-    # Bind Pony first so run_migrations can use the provider
+    from migrations import pending_migrations, run_migrations, LATEST_VERSION
+
+    pending = None
     try:
         if dsn:
             print(f"init_db: Binding with URL (len={len(dsn)})...")
@@ -270,18 +179,57 @@ def init_db(provider_or_url='postgres', safe_mode=True, **kwargs):
             # Pass through the original provider string (e.g. 'sqlite') if not a URL
             db.bind(provider=provider, **kwargs)
 
-        db.generate_mapping(create_tables=True)
+        # One query decides whether this boot needs any DDL
+        pending = pending_migrations()
+        if pending:
+            db.generate_mapping(create_tables=True)
+        else:
+            db.generate_mapping(create_tables=False, check_tables=False)
+            print(f"Schema at version {LATEST_VERSION}, skipping DDL")
         print("PonyORM binding and mapping successful")
     except Exception as e:
         print(f"PonyORM binding failed: {e}")
         if not safe_mode:
             raise
 
-    # Run manual migrations using psycopg2 directly via Pony connection
-    if provider == 'postgres':
-        success, msg = run_migrations(dsn, **kwargs)
+    if replica and db.provider is not None:
+        from db_routing import enable_replica
+        enable_replica(db, replica)
+
+    if pending and db.schema is not None:
+        success, msg = run_migrations()
         if not success:
             if safe_mode:
                 print(f"WARNING: {msg} - Continuing startup in safe mode.")
             else:
                 raise Exception(msg)
+
+def approximate_row_counts():
+    """
+    Per-table row estimates without COUNT(*) scans: planner statistics
+    (pg_class.reltuples) on Postgres, max(rowid) on SQLite.
+    """
+    with db_session:
+        if db.provider_name == 'postgres':
+            rows = db.select("""SELECT c.relname, c.reltuples::bigint
+                FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind = 'r' AND n.nspname = current_schema()""")
+            return {name: max(int(estimate), 0) for name, estimate in rows}
+        counts = {}
+        for entity in db.entities.values():
+            table = entity._table_
+            if isinstance(table, str) and entity._root_ is entity:
+                try:
+                    counts[table] = db.select(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"')[0]
+                except Exception:
+                    continue
+        return counts
+
+def db_connection_counts():
+    """Server-side connections to this database by state (Postgres only)."""
+    if db.provider_name != 'postgres':
+        return {}
+    with db_session:
+        rows = db.select("""SELECT COALESCE(state, 'unknown'), count(*)
+            FROM pg_stat_activity WHERE datname = current_database() GROUP BY 1""")
+    return {state: int(n) for state, n in rows}
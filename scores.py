@@ -0,0 +1,268 @@
+"""
+Materialized MP scores.
+
+MPScore holds one row per MP with the weekly and season scores used by the
+scoreboards and the leaderboard job. It is rebuilt from DailyScore with a
+single aggregate query whenever the underlying data changes (sync, penalty,
+committee or import edits) and at the start of each week.
+
+Every refresh bumps the data generation, which in-process caches compare
+against to know when to rebuild. The counter lives in the CacheGeneration
+table so that every worker process sees a bump made by any of them: bumps
+increment it in the database, and data_generation() re-reads it at most
+every GENERATION_POLL_SECONDS. Generation reads and score writes always go
+to the primary, also inside replica-routed requests (see db_routing).
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pony.orm import db_session, select, sum as pony_sum, commit
+from models import MP, DailyScore, MPScore, db
+from db_routing import route
+from committee_tiers import calculate_committee_score
+from events import publish
+
+SCORE_STATE = {
+    "generation": 0,
+    "generation_token": None,  # CacheGeneration.token; changes if the database is recreated
+    "generation_checked": 0.0,  # monotonic time of the last database read
+    "week_start": None,
+    "last_refresh": None,
+}
+_refresh_lock = threading.Lock()
+
+WINDOWS = ("week", "all")
+
+def current_week_start(today=None):
+    """Monday of the current week."""
+    today = today or date.today()
+    return today - timedelta(days=today.weekday())
+
+GENERATION_NAME = "scores"
+GENERATION_POLL_SECONDS = float(os.getenv("GENERATION_POLL_SECONDS", "2"))
+_generation_lock = threading.Lock()
+
+def _store_generation(generation, token):
+    """Adopt a generation read from the database; publish it if it is new here."""
+    with _generation_lock:
+        SCORE_STATE["generation_checked"] = time.monotonic()
+        changed = (generation, token) != (SCORE_STATE["generation"], SCORE_STATE["generation_token"])
+        SCORE_STATE["generation"] = generation
+        SCORE_STATE["generation_token"] = token
+    if changed:
+        publish("generation", {"generation": generation})
+    return generation
+
+def data_generation():
+    """Current data generation, re-read from the database every GENERATION_POLL_SECONDS."""
+    if not generation_poll_due():
+        return SCORE_STATE["generation"]
+    try:
+        with route("primary"), db_session:
+            rows = db.select("SELECT generation, token FROM cachegeneration WHERE name = $GENERATION_NAME")
+    except Exception as e:
+        print(f"SCORES WARNING: Could not read data generation: {e}")
+        SCORE_STATE["generation_checked"] = time.monotonic()
+        return SCORE_STATE["generation"]
+    if not rows:
+        SCORE_STATE["generation_checked"] = time.monotonic()
+        return SCORE_STATE["generation"]
+    return _store_generation(*rows[0])
+
+def generation_poll_due():
+    """Whether the next data_generation() call will query the database."""
+    return db.provider is not None and time.monotonic() - SCORE_STATE["generation_checked"] >= GENERATION_POLL_SECONDS
+
+def generation_key():
+    """Identifies the current data across processes (e.g. for shared snapshots)."""
+    generation = data_generation()
+    return f"{SCORE_STATE['generation_token'] or 'local'}:{generation}"
+
+def _bump_row(name):
+    """Increment a CacheGeneration row, creating it if needed. Returns (generation, token)."""
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    with route("primary"), db_session:
+        cursor = db.execute("""INSERT INTO cachegeneration (name, generation, token, updated_at)
+            VALUES ($name, 1, $token, $now)
+            ON CONFLICT (name) DO UPDATE SET generation = cachegeneration.generation + 1,
+                updated_at = excluded.updated_at
+            RETURNING generation, token""")
+        row = cursor.fetchone()
+        commit()
+    return row
+
+def bump_generation():
+    """Signal that MP/score data changed so caches in every worker rebuild on next read."""
+    if db.provider is not None:
+        try:
+            return _store_generation(*_bump_row(GENERATION_NAME))
+        except Exception as e:
+            print(f"SCORES WARNING: Could not bump data generation in the database: {e}")
+    with _generation_lock:
+        SCORE_STATE["generation"] += 1
+    publish("generation", {"generation": SCORE_STATE["generation"]})
+    return SCORE_STATE["generation"]
+
+# Versions of data outside the scores (e.g. "special_teams"): name -> [version, monotonic check time]
+_VERSIONS = {}
+
+def data_version(name):
+    """
+    Version of a separately invalidated dataset, re-read every
+    GENERATION_POLL_SECONDS. Unlike the data generation, a change here only
+    concerns that dataset's caches and is not published as an event.
+    """
+    state = _VERSIONS.setdefault(name, [None, float("-inf")])
+    if db.provider is None or time.monotonic() - state[1] < GENERATION_POLL_SECONDS:
+        return state[0]
+    try:
+        with route("primary"), db_session:
+            rows = db.select("SELECT generation, token FROM cachegeneration WHERE name = $name")
+        state[0] = tuple(rows[0]) if rows else None
+    except Exception as e:
+        print(f"SCORES WARNING: Could not read {name} version: {e}")
+    state[1] = time.monotonic()
+    return state[0]
+
+def bump_data_version(name):
+    """Invalidate `name`'s caches in every worker."""
+    state = _VERSIONS.setdefault(name, [None, float("-inf")])
+    try:
+        state[0] = tuple(_bump_row(name))
+        state[1] = time.monotonic()
+    except Exception as e:
+        print(f"SCORES WARNING: Could not bump {name} version: {e}")
+        # Still invalidate this worker's caches
+        state[0], state[1] = ("local", uuid.uuid4().hex), time.monotonic()
+    return state[0]
+
+def weekly_points_by_mp(week_start, mp_ids=None):
+    """Sum this week's DailyScore points per MP in one GROUP BY query."""
+    if mp_ids is not None:
+        rows = select(
+            (ds.mp.id, pony_sum(ds.points_today))
+            for ds in DailyScore if ds.date >= week_start and ds.mp.id in mp_ids
+        )[:]
+    else:
+        rows = select(
+            (ds.mp.id, pony_sum(ds.points_today))
+            for ds in DailyScore if ds.date >= week_start
+        )[:]
+    return {mp_id: pts or 0 for mp_id, pts in rows}
+
+def refresh_mp_scores(mp_ids=None):
+    """
+    Rebuild MPScore rows (all MPs, or only mp_ids) and bump the generation.
+    Returns the ids of MPs whose weekly score changed (including new rows).
+    """
+    week_start = current_week_start()
+    if SCORE_STATE["week_start"] != week_start:
+        # New week (or first refresh in this process): every row is stale
+        mp_ids = None
+    with _refresh_lock, route("primary"):
+        with db_session:
+            if mp_ids is not None:
+                mp_ids = list(mp_ids)
+                mps = MP.select(lambda m: m.id in mp_ids)[:]
+            else:
+                mps = MP.select()[:]
+            weekly = weekly_points_by_mp(week_start, mp_ids)
+
+            existing = {s.mp_id: s for s in (
+                MPScore.select(lambda s: s.mp_id in mp_ids)[:] if mp_ids is not None else MPScore.select()[:]
+            )}
+            now = datetime.utcnow()
+            written = 0
+            changed = {}  # mp_id -> new weekly score (None if removed)
+            for mp in mps:
+                # Tier/role weights make this a float; MPScore stores whole points
+                committee_pts = round(calculate_committee_score(mp.committees).get("total", 0)) if mp.committees else 0
+                penalty = mp.penalty or 0
+                weekly_pts = weekly.get(mp.id, 0)
+                values = dict(
+                    week_start=week_start,
+                    weekly_points=weekly_pts,
+                    committee_points=committee_pts,
+                    penalty=penalty,
+                    weekly_score=weekly_pts + committee_pts - penalty,
+                    season_score=mp.total_score + committee_pts - penalty,
+                    updated_at=now,
+                )
+                row = existing.pop(mp.id, None)
+                if row:
+                    if row.weekly_score != values["weekly_score"]:
+                        changed[mp.id] = values["weekly_score"]
+                    row.set(**values)
+                else:
+                    MPScore(mp_id=mp.id, **values)
+                    changed[mp.id] = values["weekly_score"]
+                written += 1
+
+            # Drop rows for MPs that no longer exist
+            if mp_ids is None:
+                for row in existing.values():
+                    changed[row.mp_id] = None
+                    row.delete()
+            commit()
+
+        SCORE_STATE["week_start"] = week_start
+        SCORE_STATE["last_refresh"] = datetime.now()
+    generation = bump_generation()
+    if changed:
+        publish("scores", {"generation": generation, "weekly_scores": changed})
+    _record_published(generation, changed)
+    print(f"SCORES: Refreshed {written} MP scores, {len(changed)} changed (generation {generation})")
+    return set(changed)
+
+# Weekly scores as of the last "scores" event this worker published
+_PUBLISHED = {"generation": None, "weekly": None}
+_publish_lock = threading.Lock()
+
+def _record_published(generation, changed):
+    with _publish_lock:
+        _PUBLISHED["generation"] = generation
+        if _PUBLISHED["weekly"] is not None:
+            for mp_id, score in changed.items():
+                if score is None:
+                    _PUBLISHED["weekly"].pop(mp_id, None)
+                else:
+                    _PUBLISHED["weekly"][mp_id] = score
+
+def publish_score_changes():
+    """
+    Publish a "scores" event for refreshes made by other workers. When the
+    data generation moved since this worker last published, diff MPScore
+    against the weekly scores it last saw (the first call only records them).
+    Returns the changed {mp_id: weekly_score}.
+    """
+    generation = data_generation()
+    with _publish_lock:
+        previous = _PUBLISHED["weekly"]
+        if previous is not None and generation == _PUBLISHED["generation"]:
+            return {}
+        with route("primary"), db_session:
+            weekly = dict(db.select("SELECT mp_id, weekly_score FROM mpscore"))
+        _PUBLISHED.update(generation=generation, weekly=weekly)
+    if previous is None:
+        return {}
+    changed = {mp_id: score for mp_id, score in weekly.items() if previous.get(mp_id) != score}
+    changed.update((mp_id, None) for mp_id in previous.keys() - weekly.keys())
+    if changed:
+        publish("scores", {"generation": generation, "weekly_scores": changed})
+    return changed
+
+def ensure_mp_scores_current():
+    """Refresh MPScore if this process hasn't built it for the current week."""
+    week_start = current_week_start()
+    if SCORE_STATE["week_start"] == week_start:
+        return
+    with route("primary"), db_session:
+        stale = MPScore.exists(lambda s: s.week_start != week_start) \
+            or MPScore.select().count() != MP.select().count()
+    if stale:
+        refresh_mp_scores()
+    else:
+        SCORE_STATE["week_start"] = week_start
@@ -0,0 +1,109 @@
+"""
+NumPy batch scoring for teams.
+
+MP scores for a window are loaded from MPScore into a dense vector and teams
+into an int32 matrix of positions in that vector, so every team total is a
+single gather-and-sum:
+
+    totals = scores[team_matrix].sum(axis=1)
+
+Position 0 of the score vector is a zero slot used for padding (teams with
+fewer than TEAM_SIZE MPs) and for MP ids that no longer exist.
+"""
+import threading
+from itertools import chain
+import numpy as np
+from pony.orm import db_session, select
+from models import MPScore, Registration
+from scores import data_generation, ensure_mp_scores_current
+
+TEAM_SIZE = 5  # 1 captain + 4 members
+
+_ENGINE_CACHE = {}
+_engine_lock = threading.Lock()
+
+class ScoringEngine:
+    def __init__(self, mp_ids, scores):
+        order = np.argsort(mp_ids)
+        self.mp_ids = np.asarray(mp_ids, dtype=np.int64)[order]
+        # Slot 0 is the zero/padding slot, MP i lives at position i + 1
+        self.scores = np.concatenate(([0], np.asarray(scores, dtype=np.int64)[order]))
+
+    @classmethod
+    def from_db(cls, window="week"):
+        """Load one window's MP scores with a single query."""
+        ensure_mp_scores_current()
+        with db_session:
+            if window == "week":
+                rows = select((s.mp_id, s.weekly_score) for s in MPScore)[:]
+            elif window == "all":
+                rows = select((s.mp_id, s.season_score) for s in MPScore)[:]
+            else:
+                raise ValueError(f"Unknown scoring window: {window}")
+        mp_ids = [r[0] for r in rows]
+        scores = [r[1] for r in rows]
+        return cls(mp_ids, scores)
+
+    def positions(self, mp_ids):
+        """Vector positions for MP ids (0 for unknown ids)."""
+        mp_ids = np.asarray(mp_ids, dtype=np.int64)
+        if not len(self.mp_ids):
+            return np.zeros(mp_ids.shape, dtype=np.int32)
+        idx = np.searchsorted(self.mp_ids, mp_ids)
+        idx = np.minimum(idx, len(self.mp_ids) - 1)
+        found = self.mp_ids[idx] == mp_ids
+        return np.where(found, idx + 1, 0).astype(np.int32)
+
+    def team_matrix(self, teams):
+        """int32 (n_teams, TEAM_SIZE) matrix of positions from lists of MP ids."""
+        n = len(teams)
+        lengths = np.fromiter((min(len(t), TEAM_SIZE) for t in teams), dtype=np.int64, count=n)
+        flat = np.fromiter(chain.from_iterable(t[:TEAM_SIZE] for t in teams), dtype=np.int64,
+                           count=int(lengths.sum()))
+        # Scatter the flattened ids into (row, column) slots
+        rows = np.repeat(np.arange(n), lengths)
+        starts = np.cumsum(lengths) - lengths
+        cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+        matrix = np.zeros((n, TEAM_SIZE), dtype=np.int32)
+        matrix[rows, cols] = self.positions(flat)
+        return matrix
+
+    def score_matrix(self, team_matrix, captains=None, captain_weight=1.0):
+        """
+        Team totals for a position matrix. With captain_weight != 1 the
+        captain's score (captains: one MP id per team) is weighted.
+        """
+        totals = self.scores[team_matrix].sum(axis=1)
+        if captains is not None and captain_weight != 1.0:
+            captain_scores = self.scores[self.positions(captains)]
+            totals = totals + np.rint((captain_weight - 1.0) * captain_scores).astype(np.int64)
+        return totals
+
+    def score_teams(self, teams, captains=None, captain_weight=1.0):
+        return self.score_matrix(self.team_matrix(teams), captains, captain_weight)
+
+def get_engine(window="week"):
+    """Engine for a window, rebuilt when the data generation changes."""
+    generation = data_generation()
+    cached = _ENGINE_CACHE.get(window)
+    if cached and cached[0] == generation:
+        return cached[1]
+    with _engine_lock:
+        cached = _ENGINE_CACHE.get(window)
+        if cached and cached[0] == data_generation():
+            return cached[1]
+        engine = ScoringEngine.from_db(window)
+        # from_db may itself refresh scores and bump the generation
+        _ENGINE_CACHE[window] = (data_generation(), engine)
+        return engine
+
+def score_all_registrations(window="week", captain_weight=1.0):
+    """Score every registration. Returns (registration rows, totals)."""
+    engine = get_engine(window)
+    with db_session:
+        regs = select((r.id, r.display_name, r.email, r.team_mp_ids, r.captain_mp_id, r.registered_at)
+                      for r in Registration).order_by(1)[:]
+    teams = [r[3] or [] for r in regs]
+    captains = [r[4] for r in regs]
+    totals = engine.score_teams(teams, captains, captain_weight) if regs else np.zeros(0, dtype=np.int64)
+    return regs, totals
@@ -4,6 +4,7 @@ from datetime import datetime, date, timedelta
 from urllib.parse import quote
 from pony.orm import db_session, select, desc, commit
 from models import MP, DailyScore, db
+from leaderboard import apply_mp_deltas
 import os
 from dotenv import load_dotenv
 
@@ -37,6 +38,10 @@ def construct_image_url(name, party_name):
     party_code = PARTY_MAPPING.get(party_name, "Ind")
     return f"https://www.ourcommons.ca/Content/Parliamentarians/Images/OfficialMPPhotos/45/{last}{first}_{party_code}.jpg"
 
+# httpx transport for the OpenParliament client (None: the network). The
+# load test installs a replay transport here; see benchmarks/replay.py.
+SYNC_TRANSPORT = None
+
 async def fetch_json(client, url):
     if '?' not in url and not url.endswith('/') and '&' not in url:
         url += '/'
@@ -45,7 +50,10 @@ async def fetch_json(client, url):
             "Accept": "application/json",
             "User-Agent": "FantasyParliament/1.0 (contact@example.com)"
         }
-        response = await client.get(url, params={"format": "json"}, headers=headers)
+        # Merge rather than pass params=: httpx replaces the URL's own query
+        # string (limit, date, ...) with params
+        url = httpx.URL(url).copy_merge_params({"format": "json"})
+        response = await client.get(url, headers=headers)
         if response.status_code == 404:
             return None
         response.raise_for_status()
@@ -58,6 +66,7 @@ def save_mps_sync(objects):
     total_created = 0
     total_synced = 0
     page_slugs = set()
+    created = []
     with db_session:
         for mp_data in objects:
             party_info = mp_data.get('current_party')
@@ -75,6 +84,7 @@ def save_mps_sync(objects):
             mp = MP.get(slug=slug)
             if not mp:
                 mp = MP(name=name, slug=slug)
+                created.append(mp)
                 total_created += 1
             
             mp.party = party_name
@@ -88,7 +98,9 @@ def save_mps_sync(objects):
                 mp.image_url = construct_image_url(name, party_name)
             
             total_synced += 1
-    return total_synced, total_created, page_slugs
+        commit()
+        created_ids = [mp.id for mp in created]
+    return total_synced, created_ids, page_slugs
 
 def mark_inactive_mps(seen_slugs):
     with db_session:
@@ -102,7 +114,7 @@ def mark_inactive_mps(seen_slugs):
                 print(f"MP Sync: Marked {mp.name} ({mp.slug}) as inactive")
     return count
 
-async def sync_mps(client):
+async def sync_mps(client, changed_mp_ids=None):
     url = f"{BASE_URL}/politicians/?limit=500"
     total_synced = 0
     total_created = 0
@@ -118,9 +130,12 @@ async def sync_mps(client):
         objects = data.get('objects', [])
         if not objects: break
         
-        synced, created, page_slugs = await asyncio.to_thread(save_mps_sync, objects)
+        synced, created_ids, page_slugs = await asyncio.to_thread(save_mps_sync, objects)
         total_synced += synced
-        total_created += created
+        total_created += len(created_ids)
+        if changed_mp_ids is not None:
+            # New MPs need their MPScore rows
+            changed_mp_ids.update(created_ids)
         all_seen_slugs.update(page_slugs)
             
         next_path = data.get('pagination', {}).get('next_url')
@@ -132,11 +147,12 @@ async def sync_mps(client):
     inactive_count = await asyncio.to_thread(mark_inactive_mps, all_seen_slugs)
     print(f"Marked {inactive_count} MPs as inactive")
 
-def update_scores_sync(target_date, mp_points, mp_breakdown):
+def update_scores_sync(target_date, mp_points, mp_breakdown, changed_mp_ids=None):
     """
     Update DailyScore, total_score, and score_breakdown for MPs.
     mp_points: dict { slug: points }
     mp_breakdown: dict { slug: {speeches: n, votes: n, bills: n} }
+    changed_mp_ids: optional set, receives ids of MPs whose points changed
     """
     updated_count = 0
     with db_session:
@@ -156,7 +172,11 @@ def update_scores_sync(target_date, mp_points, mp_breakdown):
                     points_today=pts,
                     date=target_date
                 )
+                if changed_mp_ids is not None:
+                    changed_mp_ids.add(mp.id)
             else:
+                if changed_mp_ids is not None and score_record.points_today != pts:
+                    changed_mp_ids.add(mp.id)
                 score_record.points_today = pts
             updated_count += 1
             
@@ -175,7 +195,7 @@ def update_scores_sync(target_date, mp_points, mp_breakdown):
 
     return updated_count
 
-async def sync_daily_activity(client, target_date):
+async def sync_daily_activity(client, target_date, changed_mp_ids=None):
     date_str = target_date.isoformat()
     print(f"Syncing activity for {date_str}...")
     
@@ -262,35 +282,52 @@ async def sync_daily_activity(client, target_date):
         break
 
     print(f"Saving scores for {len(mp_points)} MPs...")
-    updated = await asyncio.to_thread(update_scores_sync, target_date, mp_points, mp_breakdown)
+    updated = await asyncio.to_thread(update_scores_sync, target_date, mp_points, mp_breakdown, changed_mp_ids)
     print(f"Updated {updated} records.")
 
-async def run_sync():
-    client = httpx.AsyncClient(timeout=60.0)
+async def run_sync(client=None):
+    """
+    Sync the roster, committees and the past week's activity, then propagate
+    the changed MPs' scores. Returns False if it failed before propagating.
+    Uses `client` if given (left open), else its own client on SYNC_TRANSPORT.
+    """
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=60.0, transport=SYNC_TRANSPORT)
     
+    changed_mp_ids = set()
     try:
         # Sync MPs roster
-        await sync_mps(client)
+        await sync_mps(client, changed_mp_ids)
         
         # Sync committee memberships
-        await sync_committee_memberships(client, client)
+        await sync_committee_memberships(client, client, changed_mp_ids)
         
         # Sync past 7 days for initial data backfill
         today = date.today()
         for days_ago in range(7):
             target_date = today - timedelta(days=days_ago)
             print(f"Syncing {target_date}...")
-            await sync_daily_activity(client, target_date)
+            await sync_daily_activity(client, target_date, changed_mp_ids)
+        
+        # Push score changes to the teams that contain the affected MPs
+        print(f"Propagating score changes for {len(changed_mp_ids)} MPs...")
+        await asyncio.to_thread(apply_mp_deltas, changed_mp_ids)
+        return True
 
     except Exception as e:
         print(f"CRITICAL ERROR in run_sync: {e}")
         import traceback
         traceback.print_exc()
+        return False
     finally:
-        await client.aclose()
+        if own_client:
+            await client.aclose()
 
-async def run_sync_mps_only():
-    client = httpx.AsyncClient(timeout=60.0)
+async def run_sync_mps_only(client=None):
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=60.0, transport=SYNC_TRANSPORT)
     try:
         await sync_mps(client)
     except Exception as e:
@@ -298,7 +335,8 @@ async def run_sync_mps_only():
         import traceback
         traceback.print_exc()
     finally:
-        await client.aclose()
+        if own_client:
+            await client.aclose()
 
 
 if __name__ == "__main__":
@@ -357,7 +395,7 @@ async def fetch_committee_memberships(client, session):
     return committee_map
 
 
-async def sync_committee_memberships(client, session):
+async def sync_committee_memberships(client, session, changed_mp_ids=None):
     """Update MP records with committee memberships."""
     committee_map = await fetch_committee_memberships(client, session)
     
@@ -365,6 +403,8 @@ async def sync_committee_memberships(client, session):
         for slug, committees in committee_map.items():
             mp = MP.get(slug=slug)
             if mp:
+                if changed_mp_ids is not None and set(map(str, mp.committees or [])) != set(committees):
+                    changed_mp_ids.add(mp.id)
                 mp.committees = list(committees)
                 print(f"Updated {mp.name}: {mp.committees}")
     
@@ -0,0 +1,104 @@
+"""
+Host-local snapshot cache shared by every worker process.
+
+Each uvicorn/gunicorn worker keeps its own in-memory caches, but they all
+read pre-serialized payloads from one SQLite file on local disk:
+
+    snapshot(key, version, built_at, body)
+
+`version` is the data generation the payload was built for (see
+scores.generation_key()), so a worker only accepts a snapshot built from
+the same data it would read itself. When no worker has built the current
+version yet, get_or_build() takes the file's write lock (BEGIN IMMEDIATE)
+before building, so other workers wait and then read the result instead of
+all running the same database queries.
+
+Set SHARED_CACHE_PATH to an empty string to turn the tier off; callers then
+build every payload themselves.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "fp_shared_cache.sqlite"))
+SHARED_CACHE_STATS = {"hits": 0, "builds": 0, "waited_builds": 0, "errors": 0}
+
+# Long enough to wait out another worker's roster rebuild
+LOCK_TIMEOUT_SECONDS = 30
+
+class SnapshotCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS snapshot (
+                key TEXT PRIMARY KEY, version TEXT NOT NULL, built_at REAL NOT NULL, body BLOB NOT NULL)""")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn, key, version, max_age):
+        row = conn.execute("SELECT body, built_at FROM snapshot WHERE key = ? AND version = ?",
+                           (key, version)).fetchone()
+        if row and (max_age is None or time.time() - row[1] < max_age):
+            return row[0]
+        return None
+
+    def get(self, key, version, max_age=None):
+        return self._read(self._connection(), key, version, max_age)
+
+    def get_or_build(self, key, version, build, max_age=None):
+        """
+        Return the stored body for (key, version), or call build() -> bytes
+        while holding the write lock and store its result.
+        """
+        conn = self._connection()
+        body = self._read(conn, key, version, max_age)
+        if body is not None:
+            SHARED_CACHE_STATS["hits"] += 1
+            return body
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have built it while we waited for the lock
+            body = self._read(conn, key, version, max_age)
+            if body is not None:
+                SHARED_CACHE_STATS["waited_builds"] += 1
+            else:
+                body = build()
+                conn.execute("""INSERT INTO snapshot (key, version, built_at, body) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET version = excluded.version,
+                        built_at = excluded.built_at, body = excluded.body""",
+                             (key, version, time.time(), body))
+                SHARED_CACHE_STATS["builds"] += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if time.perf_counter() - started > 1:
+            print(f"SHARED CACHE: {key} took {time.perf_counter() - started:.1f}s to build or wait for")
+        return body
+
+class _Disabled:
+    def get(self, key, version, max_age=None):
+        return None
+
+    def get_or_build(self, key, version, build, max_age=None):
+        return build()
+
+def get_or_build(key, version, build, max_age=None):
+    """Module-level entry point; falls back to build() if the file is unusable."""
+    try:
+        return shared_cache.get_or_build(key, version, build, max_age)
+    except sqlite3.Error as e:
+        SHARED_CACHE_STATS["errors"] += 1
+        print(f"SHARED CACHE ERROR: {e}")
+        return build()
+
+shared_cache = SnapshotCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else _Disabled()
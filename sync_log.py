@@ -0,0 +1,248 @@
+"""
+Structured, size-rotated sync log.
+
+Every record is a JSON line with an increasing sequence number:
+
+    {"seq": 42, "ts": "...", "level": "info", "run": "sync-1a2b3c", "msg": "..."}
+
+Clients tail the log with tail(since=<last seq seen>) instead of downloading
+the whole file. Recent records are kept in memory; older ones are read
+line by line from the current file and its rotated backups (sync.log.1..N).
+New records are also published on `log_broker` for live SSE follow.
+
+All worker processes append to the same file. Each write takes an
+exclusive lock on sync.log.lock, continues from the newest seq on disk
+(re-read from the end of the file only when another process wrote since)
+and rotates if needed, so numbering stays unique and rotation happens once.
+
+Sync code keeps using print(): capture() tees stdout lines written from the
+capturing task (and threads it starts via asyncio.to_thread) into the log,
+without picking up output from unrelated requests.
+"""
+import json
+import os
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no file lock
+    fcntl = None
+import sys
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from events import EventBroker
+
+SYNC_LOG_PATH = os.getenv("SYNC_LOG_PATH", "sync.log")
+SYNC_LOG_MAX_BYTES = int(os.getenv("SYNC_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SYNC_LOG_BACKUPS = 3
+RECENT_RECORDS = 2000
+MAX_TAIL_LIMIT = 1000
+TAIL_READ_BYTES = 8192
+
+log_broker = EventBroker()
+
+_current_run = ContextVar("sync_log_run", default=None)
+
+def _level_for(message):
+    upper = message.upper()
+    if "ERROR" in upper or "TRACEBACK" in upper:
+        return "error"
+    if "WARNING" in upper:
+        return "warning"
+    return "info"
+
+class SyncLog:
+    def __init__(self, path=SYNC_LOG_PATH, max_bytes=SYNC_LOG_MAX_BYTES, backups=SYNC_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.recent = deque(maxlen=RECENT_RECORDS)  # this process's newest records, contiguous in seq
+        self._lock = threading.Lock()
+        self._lock_file = None
+        # Newest seq and the log file's (inode, size) when it was read; loaded on first use
+        self._seq = None
+        self._stat = None
+
+    @property
+    def seq(self):
+        """Newest sequence number written by any process."""
+        with self._lock:
+            return self._current_seq()
+
+    def _files(self):
+        """Log files oldest first."""
+        rotated = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [p for p in rotated + [self.path] if os.path.exists(p)]
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def _current_seq(self):
+        """self._seq, re-read from disk if the file changed since we last wrote or read it."""
+        stat = self._file_stat()
+        if self._seq is None or stat != self._stat:
+            seq = self._last_seq()
+            if self._seq is not None and seq != self._seq:
+                # Another process wrote: our in-memory records are no longer contiguous
+                self.recent.clear()
+            self._seq, self._stat = seq, stat
+        return self._seq
+
+    def _last_seq(self):
+        """Newest seq on disk, read from the end of the newest non-empty file."""
+        for path in reversed(self._files()):
+            seq = _last_seq_in(path)
+            if seq is not None:
+                return seq
+        return 0
+
+    @contextmanager
+    def _locked(self):
+        """This process's lock, then the cross-process lock on the log file."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_file is None:
+                self._lock_file = open(f"{self.path}.lock", "a")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def write(self, message, level=None, run=None):
+        message = message.rstrip()
+        if not message:
+            return None
+        with self._locked():
+            seq = self._current_seq() + 1
+            record = {
+                "seq": seq,
+                "ts": datetime.now().isoformat(timespec="milliseconds"),
+                "level": level or _level_for(message),
+                "run": run,
+                "msg": message,
+            }
+            line = json.dumps(record) + "\n"
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._seq, self._stat = seq, self._file_stat()
+            self.recent.append(record)
+        log_broker.publish("log", record)
+        return record
+
+    def tail(self, since=0, limit=200):
+        """Records with seq > since (oldest first), at most `limit`."""
+        limit = max(1, min(limit, MAX_TAIL_LIMIT))
+        with self._lock:
+            latest = self._current_seq()
+            recent = list(self.recent)
+        if recent and recent[0]["seq"] <= since + 1 and recent[-1]["seq"] == latest:
+            records = [r for r in recent if r["seq"] > since][:limit]
+        else:
+            records = self._read_files(since, limit)
+        return {
+            "records": records,
+            "next": records[-1]["seq"] if records else max(since, 0),
+            "latest": latest,
+        }
+
+    def _read_files(self, since, limit):
+        records = []
+        for path in self._files():
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("seq", 0) > since:
+                        records.append(record)
+                        if len(records) >= limit:
+                            return records
+        return records
+
+def _last_seq_in(path):
+    """seq of the last complete record in one file, or None."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        block = TAIL_READ_BYTES
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            lines = f.read().splitlines()
+            if start > 0:
+                lines = lines[1:]  # probably cut mid-record
+            for line in reversed(lines):
+                try:
+                    return int(json.loads(line)["seq"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+            if start == 0:
+                return None
+            block *= 4
+
+sync_log = SyncLog()
+
+class _RunCapture:
+    def __init__(self, run):
+        self.run = run
+        self.partial = ""
+
+    def feed(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            sync_log.write(line, run=self.run)
+
+    def close(self):
+        if self.partial:
+            sync_log.write(self.partial, run=self.run)
+            self.partial = ""
+
+class _StdoutTee:
+    """Passes writes through and copies them to the capturing run, if any."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        capture = _current_run.get()
+        if capture is not None:
+            capture.feed(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+@contextmanager
+def capture(name="sync"):
+    """Log everything printed in this context. Yields the run id."""
+    if not isinstance(sys.stdout, _StdoutTee):
+        sys.stdout = _StdoutTee(sys.stdout)
+    run = f"{name}-{uuid.uuid4().hex[:6]}"
+    run_capture = _RunCapture(run)
+    token = _current_run.set(run_capture)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        run_capture.close()
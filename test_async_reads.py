@@ -0,0 +1,220 @@
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP, DailyScore, LeaderboardEntry
+from pony.orm import db_session
+from datetime import date, datetime, timedelta
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+from async_reads import AsyncpgBackend, MPS_BY_IDS_SQL, async_reads, fetch_mp, fetch_mps_by_ids, fetch_mp_scores, fetch_leaderboard_page
+from db_routing import route, ROUTING_STATS
+from metrics import track_queries
+from leaderboard import encode_cursor
+from scores import current_week_start
+
+client = TestClient(main.app)
+
+def setup_module():
+    week_start = current_week_start()
+    with db_session:
+        mp = MP(id=801, name="Async Reader", slug="mp-async-801", party="NDP", riding="Nowhere",
+                total_score=12, penalty=2, committees=["Finance"], score_breakdown={"speeches": 3})
+        for offset, points in ((-3, 4), (0, 5), (1, 2)):
+            day = week_start + timedelta(days=offset)
+            DailyScore(mp=mp, mp_name=mp.name, points_today=points, date=day)
+        for i in range(5):
+            LeaderboardEntry(username=f"async-{i}", score=1000 + i % 2, updated_at=datetime(2026, 1, 1, 12, i))
+
+def teardown_module():
+    with db_session:
+        DailyScore.select(lambda d: d.mp.id == 801).delete(bulk=True)
+        MP.select(lambda m: m.id in (801, 802, 803)).delete(bulk=True)
+        LeaderboardEntry.select(lambda e: e.username.startswith("async-")).delete(bulk=True)
+    main.invalidate_mp_cache()
+
+def get_both(monkeypatch, url):
+    monkeypatch.setattr(main, "ASYNC_READS", False)
+    orm = client.get(url)
+    monkeypatch.setattr(main, "ASYNC_READS", True)
+    return orm, client.get(url)
+
+@pytest.mark.parametrize("url", ["/mps/801", "/mps/801/scores", "/mps/9999", "/mps/9999/scores"])
+def test_mp_endpoints_match_orm(monkeypatch, url):
+    orm, fast = get_both(monkeypatch, url)
+    assert fast.status_code == orm.status_code
+    assert fast.json() == orm.json()
+
+def test_mp_weekly_score_and_history():
+    body = client.get("/mps/801").json()
+    assert body["weekly_score"] == 7
+    assert body["committees"] == ["Finance"]
+    assert [s["points"] for s in client.get("/mps/801/scores").json()["scores"]] == [4, 5, 2]
+
+def test_leaderboard_pages_match_orm(monkeypatch):
+    orm, fast = get_both(monkeypatch, "/leaderboard?limit=2")
+    assert fast.json() == orm.json()
+    cursor = fast.headers["X-Next-Cursor"]
+    assert cursor == orm.headers["X-Next-Cursor"]
+    orm, fast = get_both(monkeypatch, f"/leaderboard?limit=2&cursor={cursor}")
+    assert fast.json() == orm.json()
+    assert client.get("/leaderboard?cursor=bogus").status_code == 400
+
+def test_uncached_ids_are_fetched(monkeypatch):
+    main.get_cached_mps()
+    with db_session:
+        MP(id=802, name="Late Arrival", slug="mp-async-802")
+        MP(id=803, name="Later Arrival", slug="mp-async-803")
+    calls = []
+    fetch = async_reads.fetch
+
+    async def counting_fetch(sql, *args):
+        calls.append(sql)
+        return await fetch(sql, *args)
+    monkeypatch.setattr(async_reads, "fetch", counting_fetch)
+    orm, fast = get_both(monkeypatch, "/mps?ids=803,802,801,9999")
+    assert [m["id"] for m in fast.json()] == [803, 802, 801]
+    assert fast.json() == orm.json()
+    # All uncached ids in one IN (...) query
+    assert calls == [MPS_BY_IDS_SQL]
+
+class StubConnection:
+    """Answers like asyncpg: Record-like rows, jsonb as text, native dates."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, sql, *args):
+        # asyncpg binds by position: $1 may appear twice, but every $n needs an argument
+        assert max(int(n) for n in re.findall(r"\$(\d+)", sql)) == len(args)
+        if self.pool.query_error:
+            raise self.pool.query_error
+        self.pool.calls.append((sql, args))
+        return self.pool.rows
+
+class StubPool:
+    def __init__(self, rows=(), lag=0.0, fail=None):
+        self.rows = list(rows)
+        self.lag = lag
+        self.fail = fail  # raised by acquire() and the lag probe
+        self.query_error = None  # raised by fetch()
+        self.calls = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.fail:
+            raise self.fail
+        yield StubConnection(self)
+
+    async def fetchval(self, sql):
+        if self.fail:
+            raise self.fail
+        return self.lag
+
+    async def close(self):
+        pass
+
+MP_ROW = {"id": 801, "name": "Async Reader", "slug": "mp-async-801", "party": "NDP", "riding": "Nowhere",
+          "image_url": None, "committees": '["Finance"]', "total_score": 12,
+          "score_breakdown": '{"speeches": 3}', "penalty": 2, "weekly_points": 7}
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    def install(primary, replica=None):
+        backend = AsyncpgBackend(primary, replica)
+        monkeypatch.setattr(async_reads, "backend", backend)
+        return backend
+    return install
+
+def test_asyncpg_row_mapping(stub_backend):
+    primary = StubPool([MP_ROW])
+    stub_backend(primary)
+    mp, weekly = asyncio.run(fetch_mp(801))
+    assert (mp.committees, mp.score_breakdown, weekly) == (["Finance"], {"speeches": 3}, 7)
+    assert primary.calls[0][1] == (801, current_week_start())
+    # asyncpg binds the id list as one array parameter
+    assert list(asyncio.run(fetch_mps_by_ids([801, 9999]))) == [801]
+    assert primary.calls[-1] == (MPS_BY_IDS_SQL, ([801, 9999], current_week_start()))
+
+    primary.rows = [{"name": "Async Reader", "total_score": 12, "date": date(2026, 1, 5), "points_today": 4},
+                    {"name": "Async Reader", "total_score": 12, "date": None, "points_today": None}]
+    assert asyncio.run(fetch_mp_scores(801))["scores"] == [{"date": "2026-01-05", "points": 4}]
+
+    # The keyset condition reuses $1 for the score
+    primary.rows = [{"id": 3, "username": "u", "score": 5, "updated_at": datetime(2026, 1, 1, 12)}]
+    entries, next_cursor = asyncio.run(fetch_leaderboard_page(1, encode_cursor(9, 2)))
+    assert primary.calls[-1][1] == (9, 2, 1)
+    assert entries == [{"username": "u", "score": 5, "updated_at": "2026-01-01T12:00:00"}]
+    assert next_cursor == encode_cursor(5, 3)
+
+def read_as(target, mp_id=801):
+    async def read():
+        with route(target):
+            return await fetch_mp(mp_id)
+    return asyncio.run(read())
+
+def test_asyncpg_replica_choice_and_stats(stub_backend):
+    primary, replica = StubPool([MP_ROW]), StubPool([MP_ROW], lag=1.5)
+    stub_backend(primary, replica)
+    before = dict(ROUTING_STATS)
+    with track_queries() as queries:
+        read_as("primary")
+        read_as("replica")
+    assert (len(primary.calls), len(replica.calls)) == (1, 1)
+    assert ROUTING_STATS["primary"] == before["primary"] + 1
+    assert ROUTING_STATS["replica"] == before["replica"] + 1
+    assert ROUTING_STATS["lag_seconds"] == 1.5
+    # Both statements were charged through metrics.record_statement
+    assert queries.statements == 2
+
+def test_asyncpg_lag_threshold(stub_backend):
+    primary, replica = StubPool([MP_ROW]), StubPool([MP_ROW])
+    backend = stub_backend(primary, replica)
+    replica.lag = backend.max_lag_seconds
+    read_as("replica")
+    assert len(replica.calls) == 1
+
+    # Re-measured after LAG_CHECK_SECONDS; over the limit -> primary
+    replica.lag = backend.max_lag_seconds + 0.5
+    fallbacks = ROUTING_STATS["fallbacks"]
+    read_as("replica")
+    assert len(replica.calls) == 2  # last reading still applies
+    backend._lag_checked = 0
+    read_as("replica")
+    assert (len(primary.calls), len(replica.calls)) == (1, 2)
+    assert ROUTING_STATS["fallbacks"] == fallbacks + 1
+
+def test_asyncpg_falls_back_after_connection_error(stub_backend):
+    primary, replica = StubPool([MP_ROW]), StubPool([MP_ROW])
+    backend = stub_backend(primary, replica)
+    read_as("replica")  # lag measured: usable
+
+    replica.fail = OSError("connection refused")
+    fallbacks = ROUTING_STATS["fallbacks"]
+    mp, _ = read_as("replica")
+    assert mp.id == 801 and len(primary.calls) == 1
+    assert ROUTING_STATS["fallbacks"] == fallbacks + 1
+    assert "connection refused" in ROUTING_STATS["replica_error"]
+    # Skipped without another attempt until REPLICA_RETRY_SECONDS pass
+    assert backend._replica_down()
+    replica.fail = None
+    read_as("replica")
+    assert (len(primary.calls), len(replica.calls)) == (2, 1)
+
+def test_asyncpg_query_errors_are_not_failovers(stub_backend):
+    primary, replica = StubPool([MP_ROW]), StubPool([MP_ROW])
+    backend = stub_backend(primary, replica)
+    replica.query_error = ValueError("bad query")
+    with pytest.raises(ValueError):
+        read_as("replica")
+    assert primary.calls == [] and not backend._replica_down()
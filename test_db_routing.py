@@ -0,0 +1,72 @@
+import os
+import sqlite3
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+import db_routing
+from db_routing import enable_replica, disable_replica, ROUTING_STATS
+
+client = TestClient(main.app)
+
+def setup_function():
+    with db_session:
+        MP(id=701, name="Before Replication", slug="mp-replica-701")
+
+def teardown_function():
+    disable_replica(db)
+    with db_session:
+        MP.select(lambda m: m.id == 701).delete(bulk=True)
+
+def snapshot_replica(path):
+    """Copy the primary into a SQLite file that then stops receiving changes."""
+    source = sqlite3.connect(db.provider.pool.filename, uri=True)
+    target = sqlite3.connect(path)
+    source.backup(target)
+    target.close()
+    source.close()
+    with db_session:
+        MP[701].name = "After Replication"
+
+@pytest.fixture
+def replica(tmp_path):
+    path = str(tmp_path / "replica.sqlite")
+    snapshot_replica(path)
+    return enable_replica(db, f"sqlite:{path}")
+
+def test_marked_routes_read_from_replica(replica):
+    before = ROUTING_STATS["replica"]
+    assert client.get("/mps/701").json()["name"] == "Before Replication"
+    assert ROUTING_STATS["replica"] > before
+    # Unmarked sessions still see the primary
+    with db_session:
+        assert MP[701].name == "After Replication"
+
+def test_lagging_replica_falls_back_to_primary(replica):
+    replica.lag_probe = lambda con: replica.max_lag_seconds + 1
+    replica._lag_checked = 0
+    fallbacks = ROUTING_STATS["fallbacks"]
+    assert client.get("/mps/701").json()["name"] == "After Replication"
+    assert ROUTING_STATS["fallbacks"] > fallbacks
+    assert ROUTING_STATS["lag_seconds"] > replica.max_lag_seconds
+
+def test_route_override_pins_primary(replica, monkeypatch):
+    monkeypatch.setitem(db_routing.ROUTE_OVERRIDES, "get_mp", "primary")
+    assert client.get("/mps/701").json()["name"] == "After Replication"
+
+def test_unreachable_replica_falls_back(tmp_path):
+    enable_replica(db, f"sqlite:{tmp_path / 'missing' / 'replica.sqlite'}")
+    assert client.get("/mps/701").json()["name"] == "Before Replication"
+    status = client.get("/admin/db-routing", headers={"x-api-key": "test-key"}).json()
+    assert status["enabled"] is True
+    assert status["replica_error"]
@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+import httpx
+from pony.orm import db_session
+
+from models import db, MP, DailyScore, MPScore, Registration, TeamMember
+from email_dispatch import EmailDispatcher, send_messages
+
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+def make_messages(n):
+    return [{"to": f"user{i}@example.com", "subject": "Score", "html": "<p>hi</p>", "text": "hi"}
+            for i in range(n)]
+
+class StubProvider:
+    """Local stand-in for the Resend/MailerSend APIs that tracks concurrency."""
+
+    def __init__(self, fail_for=()):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_for = set(fail_for)
+
+    async def handler(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            body = json.loads(request.content)
+            self.requests.append((request.url.path, body))
+            recipients = [r["email"] if isinstance(r, dict) else r
+                          for item in (body if isinstance(body, list) else [body]) for r in item["to"]]
+            if self.fail_for & set(recipients):
+                return httpx.Response(500, text="stub failure")
+            return httpx.Response(200, json={"id": "stub"})
+        finally:
+            self.in_flight -= 1
+
+    def transport(self):
+        return httpx.MockTransport(self.handler)
+
+def test_resend_uses_batch_endpoint():
+    stub = StubProvider()
+    summary = asyncio.run(send_messages(make_messages(250), provider="resend", transport=stub.transport()))
+    assert summary["sent"] == 250
+    assert summary["failed"] == 0
+    assert [len(body) for _, body in stub.requests] == [100, 100, 50]
+    assert {path for path, _ in stub.requests} == {"/emails/batch"}
+    assert summary["emails_per_second"] > 0
+
+def test_mailersend_respects_concurrency_cap():
+    stub = StubProvider(fail_for={"user3@example.com"})
+
+    async def run():
+        async with EmailDispatcher(provider="mailersend", concurrency=4, transport=stub.transport()) as d:
+            return await d.send_all(make_messages(20))
+
+    summary = asyncio.run(run())
+    assert len(stub.requests) == 20
+    assert {path for path, _ in stub.requests} == {"/v1/email"}
+    assert stub.max_in_flight == 4
+    assert (summary["sent"], summary["failed"]) == (19, 1)
+    failed = [m["to"] for m, ok, _ in summary["results"] if not ok]
+    assert failed == ["user3@example.com"]
+
+def test_no_provider_skips_sending():
+    stub = StubProvider()
+    dispatcher = EmailDispatcher(transport=stub.transport())
+    dispatcher.provider = None
+
+    async def run():
+        async with dispatcher as d:
+            return await d.send_all(make_messages(3))
+
+    summary = asyncio.run(run())
+    assert (summary["sent"], summary["failed"]) == (0, 3)
+    assert stub.requests == []
+
+def test_weekly_email_context_renders_from_shared_rows():
+    from scores import current_week_start, refresh_mp_scores
+    from weekly_email import build_email_context, render_score_email
+    week_start = current_week_start()
+    with db_session:
+        for mp_id, pts in [(301, 12), (302, 7), (303, 30)]:
+            mp = MP(id=mp_id, name=f"MP {mp_id}", slug=f"mp-{mp_id}", party="Green", total_score=pts)
+            DailyScore(mp=mp, mp_name=mp.name, points_today=pts, date=week_start)
+        Registration(user_id="mail-1", display_name="mailer", email="reg@example.com",
+                     team_name="Team $1", captain_mp_id=301, team_mp_ids=[301, 302])
+    refresh_mp_scores()
+    try:
+        context = build_email_context()
+        # Registered email: team comes from the registration, not the subscription
+        message = render_score_email(context, "reg@example.com", "Reg", [303])
+        assert message["subject"] == "Your Fantasy Parliament Score: 19 points"
+        assert message["text"].index("MP 301 (Green): 12") < message["text"].index("MP 302 (Green): 7")
+        assert "Hi Reg," in message["html"]
+
+        # Unregistered subscriber: selected MPs, unknown ids ignored
+        message = render_score_email(context, "sub@example.com", "Sub", [303, 999])
+        assert message["subject"] == "Your Fantasy Parliament Score: 30 points"
+        assert "Top MPs This Week:\n  - MP 303 (Green): 30" in message["text"]
+    finally:
+        with db_session:
+            TeamMember.select().delete(bulk=True)
+            Registration.select(lambda r: r.user_id == "mail-1").delete(bulk=True)
+            DailyScore.select(lambda d: d.mp.id in (301, 302, 303)).delete(bulk=True)
+            MP.select(lambda m: m.id in (301, 302, 303)).delete(bulk=True)
+            MPScore.select(lambda s: s.mp_id in (301, 302, 303)).delete(bulk=True)
+
+def test_resend_sends_keyed_messages_under_their_own_key():
+    stub = StubProvider()
+    headers = []
+
+    async def handler(request):
+        headers.append((request.url.path, request.headers.get("idempotency-key")))
+        return await stub.handler(request)
+
+    messages = make_messages(4)
+    for i, m in enumerate(messages[:2]):
+        m["idempotency_key"] = f"weekly/2026-01-05/user{i}@example.com"
+    summary = asyncio.run(send_messages(messages, provider="resend", transport=httpx.MockTransport(handler)))
+    assert summary["sent"] == 4
+    # Keyed messages one by one under their stable key; the rest batched without one
+    assert sorted(headers, key=str) == [("/emails", "weekly/2026-01-05/user0@example.com"),
+                                        ("/emails", "weekly/2026-01-05/user1@example.com"),
+                                        ("/emails/batch", None)]
+    assert [len(body) for path, body in stub.requests if path == "/emails/batch"] == [2]
+
+def setup_subscribers(emails):
+    from models import Subscriber, EmailOutbox
+    with db_session:
+        EmailOutbox.select().delete(bulk=True)
+        Subscriber.select().delete(bulk=True)
+        for i, email in enumerate(emails):
+            Subscriber(name=f"Sub {i}", email=email, selected_mps=[], unsubscribe_token=f"tok-{i}")
+
+def test_outbox_retries_failures_and_never_resends():
+    from datetime import datetime, timedelta
+    from models import EmailOutbox, Subscriber
+    from email_outbox import enqueue_week, drain_outbox, outbox_counts
+    from scores import current_week_start
+    week = current_week_start()
+    setup_subscribers(["a@example.com", "b@example.com", "c@example.com"])
+    try:
+        assert enqueue_week(week) == 3
+        assert enqueue_week(week) == 0
+
+        stub = StubProvider(fail_for={"b@example.com"})
+        totals = asyncio.run(drain_outbox(week, batch_size=1, provider="mailersend", transport=stub.transport()))
+        assert (totals["sent"], totals["retrying"], totals["batches"]) == (2, 1, 3)
+        counts = outbox_counts(week)
+        assert counts["states"]["sent"] == 2
+        assert (counts["pending"], counts["due"]) == (1, 0)
+        assert stub.requests[0][1]["to"] == [{"email": "a@example.com"}]
+
+        # Backoff elapsed and the provider recovered: only b is sent
+        with db_session:
+            EmailOutbox.get(email="b@example.com").next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        stub = StubProvider()
+        totals = asyncio.run(drain_outbox(week, provider="mailersend", transport=stub.transport()))
+        assert totals["sent"] == 1
+        assert [body["to"] for _, body in stub.requests] == [[{"email": "b@example.com"}]]
+
+        # Re-triggering the whole run sends nothing new
+        enqueue_week(week)
+        totals = asyncio.run(drain_outbox(week, provider="mailersend", transport=stub.transport()))
+        assert totals["sent"] == 0
+        assert outbox_counts(week)["states"]["sent"] == 3
+    finally:
+        with db_session:
+            EmailOutbox.select().delete(bulk=True)
+            Subscriber.select().delete(bulk=True)
+
+def test_outbox_resumes_rows_from_crashed_run():
+    from datetime import datetime, timedelta
+    from models import EmailOutbox, Subscriber
+    from email_outbox import enqueue_week, claim_due, drain_outbox, SENDING_LEASE
+    from scores import current_week_start
+    week = current_week_start()
+    setup_subscribers(["x@example.com", "y@example.com"])
+    try:
+        enqueue_week(week)
+        # A run claims x and dies before recording the result
+        assert [email for _, email in claim_due(week, limit=1)] == ["x@example.com"]
+
+        stub = StubProvider()
+        totals = asyncio.run(drain_outbox(week, provider="resend", transport=stub.transport()))
+        assert totals["sent"] == 1  # x is still leased
+
+        later = datetime.utcnow() + SENDING_LEASE + timedelta(seconds=1)
+        assert [email for _, email in claim_due(week, now=later)] == ["x@example.com"]
+        with db_session:
+            row = EmailOutbox.get(email="x@example.com")
+            assert (row.state, row.attempts) == ("sending", 2)
+    finally:
+        with db_session:
+            EmailOutbox.select().delete(bulk=True)
+            Subscriber.select().delete(bulk=True)
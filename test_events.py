@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from events import EventBroker, QUEUE_SIZE
+
+def test_publish_from_worker_thread():
+    broker = EventBroker()
+
+    async def run():
+        queue = broker.subscribe()
+        thread = threading.Thread(target=broker.publish, args=("generation", {"generation": 7}))
+        thread.start()
+        thread.join()
+        return await asyncio.wait_for(queue.get(), timeout=1)
+
+    _, event, data = asyncio.run(run())
+    assert event == "generation"
+    assert data == {"generation": 7}
+
+def test_slow_subscriber_gets_resync():
+    broker = EventBroker()
+
+    async def run():
+        queue = broker.subscribe()
+        for i in range(QUEUE_SIZE + 1):
+            broker.publish("scores", {"i": i})
+        return [queue.get_nowait()[1] for _ in range(queue.qsize())]
+
+    assert asyncio.run(run()) == ["resync"]
+
+def test_event_stream_starts_with_initial_state():
+    from events import event_stream
+
+    class FakeRequest:
+        async def is_disconnected(self):
+            return True
+
+    async def run():
+        stream = event_stream(FakeRequest(), initial=[("generation", {"generation": 3})])
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == 'id: 0\nevent: generation\ndata: {"generation": 3}\n\n'
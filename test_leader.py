@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+from datetime import datetime, timedelta, timezone
+from leader import LeaderElection, leader_only, last_job_runs, schedule_missed_jobs
+from models import SchedulerJobRun
+
+client = TestClient(main.app)
+
+def test_single_leader_and_takeover_after_expiry():
+    first = LeaderElection("test-expiry", lease_seconds=1)
+    second = LeaderElection("test-expiry", lease_seconds=1)
+    assert first.renew()
+    assert not second.renew()
+    assert first.renew()  # renewing keeps the lease
+
+    time.sleep(1.1)
+    # first stopped renewing (e.g. the process hung): second takes over
+    assert not first.is_leader
+    assert second.renew()
+    assert not first.renew()
+    assert first.leader_since is None
+
+def test_step_down_hands_over_immediately():
+    first = LeaderElection("test-step-down")
+    second = LeaderElection("test-step-down")
+    assert first.renew()
+    assert not second.renew()
+    first.step_down()
+    assert second.renew()
+    assert second.status()["lease"]["holder"] == second.identity
+
+def test_leader_only_skips_jobs_on_followers():
+    leader = LeaderElection("test-jobs")
+    follower = LeaderElection("test-jobs")
+    leader.renew()
+    follower.renew()
+    calls = []
+
+    def job():
+        calls.append("sync")
+
+    async def async_job():
+        calls.append("async")
+
+    leader_only(job, leader)()
+    leader_only(job, follower)()
+    asyncio.run(leader_only(async_job, leader)())
+    asyncio.run(leader_only(async_job, follower)())
+    assert calls == ["sync", "async"]
+
+def test_new_leader_runs_jobs_missed_during_handover():
+    leader = LeaderElection("test-missed")
+    leader.renew()
+
+    def weekly_job():
+        pass
+
+    def daily_job():
+        pass
+
+    def never_run_job():
+        pass
+
+    leader_only(weekly_job, leader)()
+    assert "weekly_job" in last_job_runs()
+    with db_session:
+        # The weekly job last ran 8 days ago; the daily one after its last due time
+        SchedulerJobRun["weekly_job"].last_run_at = datetime.utcnow() - timedelta(days=8)
+        SchedulerJobRun(job="daily_job", last_run_at=datetime.utcnow())
+
+    async def catch_up():
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        scheduler = AsyncIOScheduler(timezone="UTC")
+        scheduler.add_job(leader_only(weekly_job, leader), "cron", day_of_week="sat", hour=10, id="weekly_job")
+        for fn in (daily_job, never_run_job):
+            scheduler.add_job(leader_only(fn, leader), "interval", days=1, id=fn.__name__)
+        scheduler.start(paused=True)
+        missed = schedule_missed_jobs(scheduler)
+        due = {job.id: job.next_run_time for job in scheduler.get_jobs()}
+        scheduler.shutdown(wait=False)
+        return missed, due
+
+    missed, due = asyncio.run(catch_up())
+    assert missed == ["weekly_job"]
+    assert due["weekly_job"] <= datetime.now(timezone.utc) < due["daily_job"]
+
+def test_scheduler_status_endpoint():
+    resp = client.get("/admin/scheduler", headers={"x-api-key": "test-key"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["leader"]["name"] == "scheduler"
+    assert body["leader"]["mechanism"] == "lease"
+    assert body["running"] is False
+    assert client.get("/admin/scheduler").status_code == 403
@@ -0,0 +1,147 @@
+import os
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, LeaderboardEntry, Registration, MP, DailyScore, MPScore, TeamMember
+from pony.orm import db_session
+from datetime import datetime
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+import scoring_engine
+
+client = TestClient(main.app)
+
+SCORES = [("alice", 50), ("bob", 40), ("carol", 40), ("dave", 30), ("erin", 10)]
+
+def setup_data():
+    with db_session:
+        LeaderboardEntry.select().delete(bulk=True)
+        TeamMember.select().delete(bulk=True)
+        Registration.select().delete(bulk=True)
+        for name, score in SCORES:
+            LeaderboardEntry(username=name, score=score, updated_at=datetime.now())
+            Registration(user_id=f"uid-{name}", display_name=name, captain_mp_id=1, team_mp_ids=[1])
+    main.rebuild_rank_index()
+
+def teardown_module():
+    with db_session:
+        LeaderboardEntry.select().delete(bulk=True)
+        TeamMember.select().delete(bulk=True)
+        Registration.select().delete(bulk=True)
+        DailyScore.select().delete(bulk=True)
+        MP.select().delete(bulk=True)
+        MPScore.select().delete(bulk=True)
+
+def test_leaderboard_keyset_pages():
+    setup_data()
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/leaderboard", params=params)
+        assert resp.status_code == 200
+        seen.extend(e["username"] for e in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [name for name, _ in SCORES]
+
+def test_leaderboard_invalid_cursor():
+    assert client.get("/leaderboard?cursor=not-a-cursor").status_code == 400
+
+def test_leaderboard_rank_with_ties():
+    setup_data()
+    resp = client.get("/leaderboard/rank/uid-carol?neighbors=1")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["rank"] == 2
+    assert body["total"] == 5
+    assert [(n["username"], n["rank"]) for n in body["neighbors"]] == [("bob", 2), ("carol", 2), ("dave", 4)]
+
+    assert client.get("/leaderboard/rank/uid-nobody").status_code == 404
+
+def test_rank_index_follows_other_workers():
+    import scores, leaderboard
+    setup_data()
+    assert client.get("/leaderboard/rank/uid-erin").json()["rank"] == 5
+    # Another worker rescores erin and bumps the leaderboard version
+    with db_session:
+        LeaderboardEntry.get(username="erin").score = 60
+    scores._bump_row(leaderboard.LEADERBOARD_VERSION)
+    scores._VERSIONS[leaderboard.LEADERBOARD_VERSION][1] = float("-inf")
+    assert client.get("/leaderboard/rank/uid-erin").json()["rank"] == 1
+
+def setup_teams():
+    from scores import current_week_start
+    week_start = current_week_start()
+    with db_session:
+        LeaderboardEntry.select().delete(bulk=True)
+        TeamMember.select().delete(bulk=True)
+        Registration.select().delete(bulk=True)
+        DailyScore.select().delete(bulk=True)
+        MP.select().delete(bulk=True)
+        for mp_id, pts, penalty in [(201, 10, 0), (202, 20, 5), (203, 30, 0)]:
+            mp = MP(id=mp_id, name=f"MP {mp_id}", slug=f"mp-{mp_id}", penalty=penalty)
+            DailyScore(mp=mp, mp_name=mp.name, points_today=pts, date=week_start)
+        Registration(user_id="u1", display_name="alice", captain_mp_id=201, team_mp_ids=[201, 202])
+        Registration(user_id="u2", display_name="bob", captain_mp_id=203, team_mp_ids=[203])
+        Registration(user_id="u3", display_name="empty", captain_mp_id=201, team_mp_ids=[])
+        Registration(user_id="u4", display_name="bob", captain_mp_id=201, team_mp_ids=[201, 203])
+    main.refresh_mp_scores()
+
+def test_recompute_leaderboard_set_based():
+    setup_teams()
+    stats = main.recompute_leaderboard()
+    assert stats["chunks"] == 1
+    assert stats["rows_changed"] == 3
+
+    with db_session:
+        scores = {e.username: e.score for e in LeaderboardEntry.select()}
+    # Weekly points - penalty; the newest "bob" registration wins
+    assert scores == {"alice": 25, "bob": 40, "empty": 0}
+
+    # Chunked runs reach the same result
+    with db_session:
+        LeaderboardEntry.select().delete(bulk=True)
+    assert main.recompute_leaderboard(chunk_size=2)["chunks"] == 2
+    with db_session:
+        assert {e.username: e.score for e in LeaderboardEntry.select()} == scores
+
+    # Nothing changed -> nothing rewritten
+    assert main.recompute_leaderboard()["rows_changed"] == 0
+    assert main.get_rank("bob")["rank"] == 1
+
+def test_penalty_delta_rescores_affected_teams_only():
+    setup_teams()
+    main.backfill_team_members()
+    main.recompute_leaderboard()
+
+    resp = client.post("/admin/set-penalty", json={"mp_id": 202, "penalty": 15},
+                       headers={"x-api-key": "test-key"})
+    assert resp.status_code == 200
+    assert main.LEADERBOARD_STATS["delta_mps"] == 1
+    # Only alice's team contains MP 202
+    assert main.LEADERBOARD_STATS["delta_rows_changed"] == 1
+    with db_session:
+        assert LeaderboardEntry.get(username="alice").score == 15
+        assert LeaderboardEntry.get(username="bob").score == 40
+
+def test_scoring_engine_matches_sql_recompute():
+    setup_teams()
+    main.recompute_leaderboard()
+    regs, totals = scoring_engine.score_all_registrations("week")
+    engine_scores = {name: int(total) for (_, name, *_), total in zip(regs, totals)}
+    with db_session:
+        assert engine_scores["alice"] == LeaderboardEntry.get(username="alice").score
+    assert engine_scores["empty"] == 0
+
+    resp = client.get("/admin/list-registrations?api_key=test-key")
+    assert [r["score"] for r in resp.json()] == [25, 30, 0, 40]
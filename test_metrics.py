@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+from metrics import SamplingProfiler, collapsed
+
+client = TestClient(main.app)
+
+def test_request_stats_use_route_templates_and_count_db_time():
+    with db_session:
+        MP(id=401, name="MP Timed", slug="mp-timed")
+    try:
+        for _ in range(3):
+            assert client.get("/mps/401").status_code == 200
+        resp = client.get("/admin/request-stats", headers={"x-api-key": "test-key"})
+        stats = {(s["method"], s["route"]): s for s in resp.json()}
+        mp_stats = stats[("GET", "/mps/{mp_id}")]
+        assert mp_stats["count"] >= 3
+        assert mp_stats["avg_db_statements"] > 0
+        assert mp_stats["avg_bytes"] > 0
+        assert mp_stats["statuses"]["200"] >= 3
+        assert mp_stats["p95_ms"] is not None
+    finally:
+        with db_session:
+            MP.select(lambda m: m.id == 401).delete(bulk=True)
+
+def test_sampling_profiler_collapsed_stacks():
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop)
+    thread.start()
+    try:
+        stacks, samples = profiler.run(seconds=0.2, interval=0.002)
+    finally:
+        stop.set()
+        thread.join()
+    assert samples > 0
+    assert not profiler.active
+    output = collapsed(stacks)
+    assert any("test_metrics.py:busy_loop" in line for line in output.splitlines())
+    stack, count = output.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+def test_profiler_stops_after_n_requests():
+    profiler = SamplingProfiler()
+
+    def finish_requests():
+        time.sleep(0.05)
+        profiler.request_finished()
+        profiler.request_finished()
+
+    threading.Thread(target=finish_requests).start()
+    started = time.monotonic()
+    profiler.run(seconds=5, requests=2)
+    assert time.monotonic() - started < 2
+
+def test_slow_queries_logged_with_plan(monkeypatch):
+    import metrics
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(metrics, "_last_explained", {})
+    with db_session:
+        MP.select(lambda m: m.id == 12345).first()
+    entry = metrics.SLOW_QUERIES[-1]
+    assert entry["sql"].startswith("SELECT")
+    assert "primary key" in entry["plan"].lower()
+
+def test_prometheus_metrics_endpoint():
+    main.invalidate_mp_cache()
+    client.get("/mps")
+    client.get("/mps")
+    main.calculate_leaderboard_background()
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'fp_http_request_duration_seconds_bucket{method="GET",route="/mps",le="+Inf"}' in body
+    assert 'fp_mp_cache_lookups_total{result="miss"}' in body
+    assert "fp_mp_cache_hit_ratio " in body
+    assert 'fp_job_last_success_timestamp_seconds{job="leaderboard_calc"}' in body
+    assert 'fp_db_table_rows_estimate{table="mp"}' in body
+    assert 'fp_email_outbox{state="pending"}' in body
+
+def test_failed_sync_counts_as_job_failure(monkeypatch):
+    import asyncio
+    from metrics import JOB_STATS
+
+    async def failed_sync():
+        return False
+    refreshed = []
+    monkeypatch.setattr(main, "run_sync", failed_sync)
+    monkeypatch.setattr(main, "refresh_mp_scores", lambda: refreshed.append(1))
+    before = dict(JOB_STATS.get("daily_sync", {"failures": 0, "last_success": None}))
+
+    asyncio.run(main.run_sync_with_logging())
+    stats = JOB_STATS["daily_sync"]
+    assert refreshed == [1]
+    assert stats["failures"] == before["failures"] + 1
+    assert stats["last_success"] == before["last_success"]
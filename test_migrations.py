@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, SchemaVersion
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+import migrations
+from migrations import Migration, pending_migrations, run_migrations, LATEST_VERSION
+
+client = TestClient(main.app)
+
+def test_migrations_are_ordered_and_unique():
+    versions = [m.version for m in migrations.MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert LATEST_VERSION == versions[-1]
+
+def test_run_migrations_applies_each_once(monkeypatch):
+    calls = []
+    extra = Migration(LATEST_VERSION + 1, "test migration", lambda cur, tables: calls.append(tables), False)
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [extra])
+    try:
+        assert run_migrations()[0]
+        assert pending_migrations() == []
+        # Postgres-only migrations are recorded on SQLite without running
+        assert len(calls) == 1 and "schema_version" in calls[0]
+
+        assert run_migrations()[0]
+        assert len(calls) == 1
+        status = client.get("/admin/schema", headers={"x-api-key": "test-key"}).json()
+        assert status["pending"] == []
+    finally:
+        with db_session:
+            SchemaVersion.select(lambda v: v.version == extra.version).delete(bulk=True)
+
+def test_failed_migration_stays_pending(monkeypatch):
+    def broken(cur, tables):
+        raise RuntimeError("boom")
+    extra = Migration(LATEST_VERSION + 2, "broken migration", broken, False)
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [extra])
+    success, msg = run_migrations()
+    assert not success and "boom" in msg
+    assert [m.version for m in pending_migrations()] == [extra.version]
+
+def old_dailyscore_db(mp_table="mp"):
+    con = sqlite3.connect(":memory:")
+    con.executescript(f"""
+        CREATE TABLE "{mp_table}" (id INTEGER PRIMARY KEY, total_score INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE dailyscore (id INTEGER PRIMARY KEY, mp INTEGER, points_today INTEGER, date DATE);
+        CREATE TABLE mpscore (mp_id INTEGER PRIMARY KEY, weekly_score INTEGER);
+        INSERT INTO "{mp_table}" VALUES (1, 10), (2, 4);
+        INSERT INTO dailyscore (mp, points_today, date) VALUES
+            (1, 3, '2026-01-05'), (1, 5, '2026-01-05'), (1, 2, '2026-01-06'), (2, 4, '2026-01-05');
+        INSERT INTO mpscore VALUES (1, 10), (2, 4);
+    """)
+    return con
+
+def test_dailyscore_unique_migration_dedupes_and_recomputes():
+    con = old_dailyscore_db()
+    cur = con.cursor()
+    migrations._dailyscore_unique_mp_date(cur, {"mp", "dailyscore", "mpscore"})
+    # The newest duplicate wins and MP 1's total follows it; its MPScore row is rebuilt later
+    assert cur.execute("SELECT mp, points_today FROM dailyscore ORDER BY id").fetchall() == [(1, 5), (1, 2), (2, 4)]
+    assert cur.execute("SELECT id, total_score FROM mp ORDER BY id").fetchall() == [(1, 7), (2, 4)]
+    assert cur.execute("SELECT mp_id FROM mpscore").fetchall() == [(2,)]
+    assert migrations._has_unique_index(cur, "dailyscore", ["mp", "date"])
+
+def test_dailyscore_unique_migration_on_capitalized_mp_table():
+    # Very old databases were created with capitalized table names
+    cur = old_dailyscore_db("MP").cursor()
+    migrations._dailyscore_unique_mp_date(cur, {"MP", "dailyscore", "mpscore"})
+    assert cur.execute('SELECT id, total_score FROM "MP" ORDER BY id').fetchall() == [(1, 7), (2, 4)]
+
+def test_dailyscore_unique_migration_reuses_composite_key_index():
+    with db_session:
+        cur = db.get_connection().cursor()
+        migrations._dailyscore_unique_mp_date(cur, {"dailyscore"})
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'dailyscore'")
+        assert "unq_dailyscore__mp_date" not in {row[0] for row in cur.fetchall()}
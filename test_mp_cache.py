@@ -0,0 +1,139 @@
+import os
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP, DailyScore, MPScore, SpecialTeam
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+
+client = TestClient(main.app)
+
+def setup_data():
+    with db_session:
+        DailyScore.select().delete(bulk=True)
+        MP.select().delete(bulk=True)
+        MP(id=101, name="MP One", party="Liberal", riding="Riding 1", slug="mp-1", total_score=10)
+        MP(id=102, name="MP Two", party="Conservative", riding="Riding 2", slug="mp-2", total_score=20)
+        MP(id=103, name="MP Three", party="NDP", riding="Riding 3", slug="mp-3", total_score=30)
+    main.refresh_mp_scores()
+
+def teardown_module():
+    with db_session:
+        DailyScore.select().delete(bulk=True)
+        MP.select().delete(bulk=True)
+        MPScore.select().delete(bulk=True)
+    main.invalidate_mp_cache()
+
+def test_mps_by_ids_request_order():
+    setup_data()
+    resp = client.get("/mps?ids=103,101,999,103,102")
+    assert resp.status_code == 200
+    assert [m["id"] for m in resp.json()] == [103, 101, 102]
+
+def test_mps_by_ids_falls_back_for_uncached():
+    setup_data()
+    main.get_cached_mps()
+    with db_session:
+        MP(id=104, name="MP Four", party="Green", riding="Riding 4", slug="mp-4", total_score=40)
+    resp = client.get("/mps?ids=104,101")
+    assert [m["id"] for m in resp.json()] == [104, 101]
+
+def test_mps_by_ids_batch_cap():
+    setup_data()
+    ids = ",".join(str(i) for i in range(main.MAX_BATCH_IDS + 1))
+    resp = client.get(f"/mps?ids={ids}")
+    assert resp.status_code == 400
+
+def test_scoreboard_windows_and_limit():
+    setup_data()
+    from scores import current_week_start
+    week_start = current_week_start()
+    with db_session:
+        DailyScore(mp=MP[101], mp_name="MP One", points_today=50, date=week_start)
+        DailyScore(mp=MP[102], mp_name="MP Two", points_today=5, date=week_start)
+    main.refresh_mp_scores()
+
+    weekly = client.get("/scoreboard?limit=2").json()
+    assert [m["id"] for m in weekly] == [101, 102]
+    assert weekly[0]["weekly_score"] == 50
+
+    season = client.get("/scoreboard?window=all").json()
+    assert [m["id"] for m in season] == [103, 102, 101]
+
+    assert client.get("/scoreboard?window=month").status_code == 422
+
+def test_scoreboard_refreshes_after_penalty():
+    setup_data()
+    assert client.get("/scoreboard?window=all&limit=1").json()[0]["id"] == 103
+    resp = client.post("/admin/set-penalty", json={"mp_id": 103, "penalty": 100},
+                       headers={"x-api-key": "test-key"})
+    assert resp.status_code == 200
+    assert client.get("/scoreboard?window=all&limit=1").json()[0]["id"] == 102
+
+def test_party_leaderboard_top_n():
+    setup_data()
+    with db_session:
+        MP(id=104, name="MP Four", party="NDP", riding="Riding 4", slug="mp-4", total_score=5)
+    main.refresh_mp_scores()
+
+    parties = client.get("/leaderboard/party?window=all&top_n=1").json()
+    assert [p["party"] for p in parties] == ["NDP", "Conservative", "Liberal"]
+    ndp = parties[0]
+    assert ndp["mp_count"] == 2
+    assert [m["id"] for m in ndp["top_mps"]] == [103]
+    assert ndp["score"] == 30
+
+    parties = client.get("/leaderboard/party?window=all&top_n=5").json()
+    assert parties[0]["score"] == 35
+
+def test_special_teams_from_table():
+    setup_data()
+    headers = {"x-api-key": "test-key"}
+    resp = client.post("/admin/special-teams", headers=headers,
+                       json={"key": "test_team", "name": "Test Team", "slugs": ["mp-1", "mp-3", "missing"], "position": -1})
+    assert resp.status_code == 200
+
+    teams = client.get("/special").json()
+    assert teams[0]["id"] == "test_team"
+    assert [m["id"] for m in teams[0]["mps"]] == [101, 103]
+    assert teams[0]["score"] == 40
+    assert teams[-1]["id"] == "random_weekly"
+    assert len(teams[-1]["mps"]) == 3
+
+    # Same week and data generation -> same cached response
+    assert client.get("/special").json() == teams
+
+    # An edit only invalidates the special teams, not the roster
+    generation = main.MP_CACHE["generation"]
+    resp = client.post("/admin/special-teams", headers=headers,
+                       json={"key": "test_team", "name": "Renamed", "slugs": ["mp-1"], "position": -1})
+    assert resp.status_code == 200
+    assert client.get("/special").json()[0]["name"] == "Renamed"
+    assert main.MP_CACHE["generation"] == generation
+
+def test_special_reads_never_seed():
+    with db_session:
+        SpecialTeam.select().delete(bulk=True)
+    main.bump_data_version(main.SPECIAL_TEAMS_VERSION)
+    assert [t["id"] for t in client.get("/special").json()] == ["random_weekly"]
+    assert client.get("/admin/special-teams", headers={"x-api-key": "test-key"}).json() == []
+    with db_session:
+        assert SpecialTeam.select().count() == 0
+
+def test_refresh_rounds_weighted_committee_points():
+    with db_session:
+        DailyScore.select().delete(bulk=True)
+        MP.select().delete(bulk=True)
+        MP(id=111, name="MP Chair", slug="mp-chair", committees=[{"name": "Finance", "role": "Chair"}, "Youth"])
+    main.refresh_mp_scores()
+    with db_session:
+        score = MPScore[111]
+        assert isinstance(score.committee_points, int)
+        assert score.weekly_score == score.committee_points > 0
@@ -0,0 +1,78 @@
+import os
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP, DailyScore, MPScore, LeaderboardEntry
+from pony.orm import db_session
+from datetime import datetime
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+from metrics import assert_max_queries, track_queries, check_n_plus_one, N_PLUS_ONE
+
+client = TestClient(main.app)
+
+MP_IDS = range(501, 521)
+
+def setup_module():
+    from scores import current_week_start
+    with db_session:
+        for mp_id in MP_IDS:
+            mp = MP(id=mp_id, name=f"MP {mp_id}", slug=f"mp-{mp_id}",
+                    party=["Liberal", "NDP", "Conservative"][mp_id % 3], total_score=mp_id % 7)
+            DailyScore(mp=mp, mp_name=mp.name, points_today=mp_id % 5, date=current_week_start())
+        for i in range(10):
+            LeaderboardEntry(username=f"budget-{i}", score=i, updated_at=datetime.now())
+    main.refresh_mp_scores()
+    main.seed_special_teams()
+
+def teardown_module():
+    with db_session:
+        DailyScore.select(lambda d: d.mp.id in MP_IDS).delete(bulk=True)
+        MP.select(lambda m: m.id in MP_IDS).delete(bulk=True)
+        MPScore.select(lambda s: s.mp_id in MP_IDS).delete(bulk=True)
+        LeaderboardEntry.select(lambda e: e.username.startswith("budget-")).delete(bulk=True)
+    main.invalidate_mp_cache()
+
+# (url, statement budget with a cold MP cache)
+BUDGETS = [
+    ("/mps", 3),
+    ("/mps?ids=501,502,503", 3),
+    ("/mps/505", 3),
+    ("/mps/505/scores", 3),
+    ("/scoreboard?limit=20", 3),
+    ("/scoreboard?window=all", 3),
+    ("/leaderboard/party", 3),
+    ("/leaderboard?limit=5", 2),
+    ("/special", 5),  # + the special-teams version poll
+]
+
+@pytest.mark.parametrize("url,budget", BUDGETS)
+def test_endpoint_query_budget(url, budget):
+    main.invalidate_mp_cache()
+    with assert_max_queries(budget, max_repeats=2, label=url):
+        assert client.get(url).status_code == 200
+
+def test_assert_max_queries_reports_repeated_statements():
+    with pytest.raises(AssertionError, match="repeated a statement"):
+        with assert_max_queries(100, max_repeats=3):
+            with db_session:
+                for mp_id in MP_IDS:
+                    MP.get(id=mp_id)
+
+def test_n_plus_one_is_recorded_per_route():
+    with track_queries() as stats:
+        with db_session:
+            for mp in MP.select(lambda m: m.id in MP_IDS)[:]:
+                mp.daily_scores.count()
+    check_n_plus_one("GET", "/example", stats)
+    entry = N_PLUS_ONE[-1]
+    assert entry["route"] == "GET /example"
+    assert entry["count"] == len(MP_IDS)
+    assert "dailyscore" in entry["sql"].lower()
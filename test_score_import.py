@@ -0,0 +1,81 @@
+import os
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP, DailyScore, MPScore
+from pony.orm import db_session
+from datetime import date
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+import json
+from fastapi.testclient import TestClient
+import main
+from score_import import import_file
+
+client = TestClient(main.app)
+HEADERS = {"x-api-key": "test-key"}
+
+def setup_function():
+    with db_session:
+        mp = MP(id=901, name="Import One", slug="mp-import-901", party="Green")
+        MP(id=902, name="Import Two", slug="mp-import-902")
+        DailyScore(mp=mp, mp_name=mp.name, points_today=1, date=date(2026, 1, 5))
+
+def teardown_function():
+    with db_session:
+        DailyScore.select(lambda d: d.mp.id in (901, 902)).delete(bulk=True)
+        MPScore.select(lambda s: s.mp_id in (901, 902)).delete(bulk=True)
+        MP.select(lambda m: m.id in (901, 902)).delete(bulk=True)
+
+def points(mp_id):
+    with db_session:
+        return sorted((str(d.date), d.points_today) for d in DailyScore.select(lambda d: d.mp.id == mp_id))
+
+def total(mp_id):
+    with db_session:
+        return MP[mp_id].total_score
+
+def test_ndjson_stream_upserts_and_recomputes_totals():
+    lines = [
+        {"mp_slug": "mp-import-901", "date": "2026-01-05", "points": 4},  # updates the existing row
+        {"mp_slug": "mp-import-901", "date": "2026-01-06", "points": 2},
+        {"mp_slug": "mp-import-902", "date": "2026-01-06", "points": 7},
+        {"mp_slug": "mp-import-902", "date": "2026-01-06", "points": 8},  # last row for a day wins
+        {"mp_slug": "no-such-mp", "date": "2026-01-06", "points": 1},
+        {"mp_slug": "mp-import-902", "date": "not a date"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    resp = client.post("/admin/import-scores", content=body, headers={**HEADERS, "content-type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    summary = resp.json()
+    assert summary["rows"] == 6 and summary["imported"] == 3
+    assert summary["unknown_mps"] == 1 and summary["invalid"] == 1
+    assert points(901) == [("2026-01-05", 4), ("2026-01-06", 2)]
+    assert points(902) == [("2026-01-06", 8)]
+    assert (total(901), total(902)) == (6, 8)
+    with db_session:
+        assert MPScore.get(mp_id=902).season_score == 8
+
+def test_csv_file_import_in_small_batches(tmp_path):
+    path = tmp_path / "scores.csv"
+    rows = [f"mp-import-902,2026-02-{day:02d},{day}" for day in range(1, 11)]
+    path.write_text("mp_slug,date,points\n" + "\n".join(rows) + "\n")
+    summary = import_file(str(path), batch_size=3)
+    assert summary["imported"] == 10 and summary["batches"] == 4
+    assert total(902) == sum(range(1, 11))
+
+def test_json_list_endpoint_uses_importer():
+    resp = client.post("/admin/bulk-import-scores", headers=HEADERS,
+                       json=[{"mp_slug": "mp-import-901", "date": "2026-01-05", "points": 9}])
+    assert resp.json()["imported"] == 1
+    assert points(901) == [("2026-01-05", 9)]
+    assert total(901) == 9
+
+def test_malformed_ndjson_is_rejected():
+    resp = client.post("/admin/import-scores?format=ndjson", content=b'{"mp_slug": ', headers=HEADERS)
+    assert resp.status_code == 400
+    assert client.post("/admin/import-scores", content=b"").status_code == 403
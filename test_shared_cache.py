@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+from models import db, MP, MPScore
+from pony.orm import db_session
+
+# Bind to a private in-memory SQLite DB (shared across threads for TestClient)
+if db.provider is None:
+    db.bind(provider='sqlite', filename=':sharedmemory:')
+    db.generate_mapping(create_tables=True)
+
+from fastapi.testclient import TestClient
+import main
+import scores
+import shared_cache
+from shared_cache import SnapshotCache
+
+client = TestClient(main.app)
+
+MP_IDS = range(601, 604)
+
+def setup_module():
+    with db_session:
+        for mp_id in MP_IDS:
+            MP(id=mp_id, name=f"Shared MP {mp_id}", slug=f"shared-mp-{mp_id}", total_score=mp_id)
+    main.refresh_mp_scores()
+
+def teardown_module():
+    with db_session:
+        MP.select(lambda m: m.id in MP_IDS).delete(bulk=True)
+        MPScore.select(lambda s: s.mp_id in MP_IDS).delete(bulk=True)
+    main.invalidate_mp_cache()
+
+def test_snapshot_built_once_across_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.1)
+        return b"payload"
+
+    # Separate instances stand in for separate worker processes
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(SnapshotCache(path).get_or_build("k", "v1", build)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [b"payload"] * 4
+    assert len(builds) == 1
+
+    assert SnapshotCache(path).get_or_build("k", "v2", lambda: b"newer") == b"newer"
+    assert SnapshotCache(path).get("k", "v1") is None
+
+def test_other_worker_bump_is_picked_up():
+    before = scores.data_generation()
+    with db_session:
+        db.execute("UPDATE cachegeneration SET generation = generation + 1 WHERE name = 'scores'")
+    # Within the poll interval the cached value is served
+    assert scores.data_generation() == before
+    scores.SCORE_STATE["generation_checked"] = 0
+    assert scores.data_generation() == before + 1
+
+def test_other_worker_refresh_is_published():
+    import asyncio
+    from events import broker
+
+    scores.publish_score_changes()  # baseline
+    # "The leader" rewrites a score and bumps the generation
+    with db_session:
+        MPScore.get(mp_id=602).weekly_score += 7
+        new_score = MPScore.get(mp_id=602).weekly_score
+    scores._bump_row(scores.GENERATION_NAME)
+    scores.SCORE_STATE["generation_checked"] = 0
+
+    async def run():
+        queue = broker.subscribe()
+        try:
+            main._publish_data_changes()
+            return [queue.get_nowait()[1:] for _ in range(queue.qsize())]
+        finally:
+            broker.unsubscribe(queue)
+
+    events = dict(asyncio.run(run()))
+    assert events["generation"] == {"generation": scores.SCORE_STATE["generation"]}
+    assert events["scores"]["weekly_scores"] == {602: new_score}
+    # Nothing new -> nothing republished
+    assert scores.publish_score_changes() == {}
+
+def test_new_worker_loads_roster_from_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "shared_cache", SnapshotCache(str(tmp_path / "cache.sqlite")))
+    main.invalidate_mp_cache()
+    assert client.get("/mps").status_code == 200
+
+    # Change the data without bumping the generation, then start "another worker"
+    with db_session:
+        MP[601].name = "Renamed In DB"
+    monkeypatch.setitem(main.MP_CACHE, "generation", None)
+    monkeypatch.setitem(main.MP_CACHE, "last_updated", None)
+    names = {m["id"]: m["name"] for m in client.get("/mps").json()}
+    assert names[601] == "Shared MP 601"
+    assert shared_cache.SHARED_CACHE_STATS["hits"] > 0
+
+    # A bump from any worker invalidates the snapshot
+    main.invalidate_mp_cache()
+    names = {m["id"]: m["name"] for m in client.get("/mps").json()}
+    assert names[601] == "Renamed In DB"
+    assert [m["id"] for m in client.get("/scoreboard?window=all&limit=3").json()] == [603, 602, 601]
@@ -0,0 +1,26 @@
+import json
+import os
+import subprocess
+import sys
+
+os.environ['SYNC_API_KEY'] = 'test-key'
+
+import pytest
+from fastapi import HTTPException
+import main
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LAZY_MODULES = ("numpy", "apscheduler", "better_profanity")
+
+def test_import_skips_lazy_modules():
+    code = f"import json, sys, main; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                          env=dict(os.environ, SYNC_API_KEY="test-key"))
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+
+def test_profanity_filter_loads_on_first_use():
+    with pytest.raises(HTTPException):
+        main.sanitize_name("shit team")
+    assert main.sanitize_name("Good <Team>") == "Good &lt;Team&gt;"
+    assert main.get_profanity_filter() is main.get_profanity_filter()
@@ -0,0 +1,63 @@
+import asyncio
+
+import sync_log as sync_log_module
+from sync_log import SyncLog, capture
+
+def test_tail_across_rotated_files(tmp_path):
+    log = SyncLog(path=str(tmp_path / "sync.log"), max_bytes=1000, backups=5)
+    for i in range(30):
+        log.write(f"line {i}")
+    assert (tmp_path / "sync.log.1").exists()
+
+    # Older than the in-memory buffer: read from disk
+    log.recent.clear()
+    page = log.tail(since=0, limit=10)
+    assert [r["msg"] for r in page["records"]] == [f"line {i}" for i in range(10)]
+    assert page["next"] == 10
+    assert page["latest"] == 30
+
+    # A restarted process continues the sequence
+    assert SyncLog(path=str(tmp_path / "sync.log"), max_bytes=1000, backups=5).seq == 30
+
+def test_processes_share_one_sequence(tmp_path):
+    path = str(tmp_path / "sync.log")
+    # Separate instances stand in for separate worker processes
+    first, second = SyncLog(path=path, max_bytes=500), SyncLog(path=path, max_bytes=500)
+    assert first._seq is None  # nothing read until first use
+    for i in range(10):
+        (first if i % 3 else second).write(f"line {i}")
+    assert first.seq == second.seq == 10
+    # first's in-memory records have gaps, so the tail comes from disk
+    page = first.tail(since=0, limit=100)
+    assert [r["seq"] for r in page["records"]] == list(range(1, 11))
+    assert [r["msg"] for r in page["records"]] == [f"line {i}" for i in range(10)]
+
+def test_tail_from_memory(tmp_path):
+    log = SyncLog(path=str(tmp_path / "sync.log"))
+    log.write("BACKGROUND: Starting sync")
+    log.write("Sync ERROR: boom")
+    page = log.tail(since=1)
+    assert [(r["seq"], r["level"]) for r in page["records"]] == [(2, "error")]
+    assert log.tail(since=2)["records"] == []
+
+def test_capture_only_logs_the_capturing_task(tmp_path, monkeypatch):
+    log = SyncLog(path=str(tmp_path / "sync.log"))
+    monkeypatch.setattr(sync_log_module, "sync_log", log)
+
+    async def other_request():
+        await asyncio.sleep(0)
+        print("unrelated request output")
+
+    async def run():
+        with capture("sync") as run_id:
+            task = asyncio.create_task(asyncio.sleep(0))
+            print("step one")
+            await asyncio.to_thread(print, "from worker thread")
+            print("partial ", end="")
+        await asyncio.gather(task, other_request())
+        return run_id
+
+    run_id = asyncio.run(run())
+    records = log.tail()["records"]
+    assert [r["msg"] for r in records] == ["step one", "from worker thread", "partial"]
+    assert {r["run"] for r in records} == {run_id}
@@ -0,0 +1,195 @@
+"""
+Weekly score email rendering.
+
+Everything that is the same for every subscriber (MP weekly scores and their
+table rows, the leader score, the top MPs, registrations by email) is loaded
+once per run into an EmailContext. Rendering one subscriber's email is then
+a lookup and a string.Template substitution.
+"""
+from dataclasses import dataclass, field
+from string import Template
+from pony.orm import db_session, select, desc
+from models import MP, MPScore, LeaderboardEntry, Registration
+from scores import ensure_mp_scores_current
+
+MP_ROW = Template("""
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #eee;">$name</td>
+                <td style="padding: 10px; border-bottom: 1px solid #eee;">$party</td>
+                <td style="padding: 10px; border-bottom: 1px solid #eee; text-align: right; font-weight: bold;">$score</td>
+            </tr>""")
+
+TOP_ROW = Template("""
+            <tr>
+                <td style="padding: 8px;">$name</td>
+                <td style="padding: 8px;">$party</td>
+                <td style="padding: 8px; text-align: right;">$score</td>
+            </tr>""")
+
+HTML_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Fantasy Parliament Weekly Update</title>
+</head>
+<body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+    <div style="background: linear-gradient(135deg, #c41e3a 0%, #8b0000 100%); padding: 30px; border-radius: 12px 12px 0 0;">
+        <h1 style="color: #fff; margin: 0; font-size: 28px;">Fantasy Parliament</h1>
+        <p style="color: #fff; margin: 5px 0 0 0; opacity: 0.9;">Weekly Score Update</p>
+    </div>
+    
+    <div style="background: #fff; padding: 30px; border: 1px solid #e1e1e1; border-top: none; border-radius: 0 0 12px 12px;">
+        <p style="margin-top: 0;">Hi $name,</p>
+        
+        <div style="background: linear-gradient(135deg, #c41e3a 0%, #8b0000 100%); color: white; padding: 25px; border-radius: 12px; text-align: center; margin: 20px 0;">
+            <p style="margin: 0; font-size: 16px; opacity: 0.9;">Your Total Score</p>
+            <p style="margin: 10px 0 0 0; font-size: 48px; font-weight: bold;">$team_score</p>
+            <p style="margin: 10px 0 0 0; font-size: 14px; opacity: 0.8;">points this week</p>
+        </div>
+        
+        <h3 style="color: #1a1a2e; margin-bottom: 15px;">Your Team</h3>
+        <table style="width: 100%; border-collapse: collapse; margin-bottom: 25px; background: #f9f9f9; border-radius: 8px; overflow: hidden;">
+            <thead>
+                <tr style="background: #f0f0f0;">
+                    <th style="padding: 12px; text-align: left; font-size: 14px;">MP Name</th>
+                    <th style="padding: 12px; text-align: left; font-size: 14px;">Party</th>
+                    <th style="padding: 12px; text-align: right; font-size: 14px;">Score</th>
+                </tr>
+            </thead>
+            <tbody>
+                $mp_rows
+            </tbody>
+        </table>
+        
+        <h3 style="color: #1a1a2e; margin-bottom: 15px;">Top MPs This Week</h3>
+        <table style="width: 100%; border-collapse: collapse; margin-bottom: 25px; background: #f9f9f9; border-radius: 8px; overflow: hidden;">
+            <thead>
+                <tr style="background: #f0f0f0;">
+                    <th style="padding: 12px; text-align: left; font-size: 14px;">MP Name</th>
+                    <th style="padding: 12px; text-align: left; font-size: 14px;">Party</th>
+                    <th style="padding: 12px; text-align: right; font-size: 14px;">Score</th>
+                </tr>
+            </thead>
+            <tbody>
+                $top_rows
+            </tbody>
+        </table>
+        
+        <div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin-bottom: 20px;">
+            <p style="margin: 0; font-size: 14px;">
+                <strong>Party Leaders Benchmark:</strong> $leader_score points
+                $benchmark_msg
+            </p>
+        </div>
+        
+        <p style="margin-bottom: 0; font-size: 14px; color: #666;">
+            Visit <a href="https://fantasy-parliament.onrender.com" style="color: #667eea;">fantasy-parliament.onrender.com</a> to manage your team and check the full leaderboard.
+        </p>
+    </div>
+    
+    <div style="text-align: center; padding: 20px; color: #999; font-size: 12px;">
+        <p style="margin: 0;">You're receiving this because you subscribed to Fantasy Parliament updates.</p>
+        <p style="margin: 5px 0;"><a href="#" style="color: #999;">Unsubscribe</a></p>
+    </div>
+</body>
+</html>""")
+
+TEXT_TEMPLATE = Template("""Fantasy Parliament Weekly Score
+
+Hi $name,
+
+Your Total Score: $team_score points
+
+Your Team:
+$mp_lines
+
+Top MPs This Week:
+$top_lines
+
+Party Leaders Benchmark: $leader_score points
+$text_is_ahead
+
+Visit https://fantasy-parliament.onrender.com to manage your team.
+""")
+
+@dataclass
+class EmailContext:
+    # mp_id -> (name, party, weekly score)
+    mp_scores: dict
+    # mp_id -> pre-rendered HTML row / text line
+    mp_html_rows: dict
+    mp_text_lines: dict
+    leader_score: int
+    # Template with the per-run fields (top MPs, leader score) already filled in
+    html_template: Template
+    text_template: Template
+    # email -> (team_mp_ids, team_name) from the newest registration
+    registrations: dict = field(default_factory=dict)
+
+def build_email_context() -> EmailContext:
+    """Load everything shared by a run's emails with a handful of queries."""
+    ensure_mp_scores_current()
+    with db_session:
+        rows = select((m.id, m.name, m.party, s.weekly_score)
+                      for m in MP for s in MPScore if s.mp_id == m.id)[:]
+        leader = LeaderboardEntry.select().order_by(desc(LeaderboardEntry.score)).first()
+        leader_score = leader.score if leader else 0
+        top_details = [(m.name, m.party, m.total_score)
+                       for m in MP.select().order_by(desc(MP.total_score))[:3]]
+        registrations = {}
+        for email, team_mp_ids, team_name in select(
+                (r.email, r.team_mp_ids, r.team_name) for r in Registration if r.email).order_by(lambda: r.id):
+            registrations[email] = (team_mp_ids, team_name)
+
+    mp_scores = {mp_id: (name, party, score) for mp_id, name, party, score in rows}
+    mp_html_rows = {mp_id: MP_ROW.substitute(name=name, party=party, score=score)
+                    for mp_id, (name, party, score) in mp_scores.items()}
+    mp_text_lines = {mp_id: f"  - {name} ({party}): {score}"
+                     for mp_id, (name, party, score) in mp_scores.items()}
+    top_rows = "".join(TOP_ROW.substitute(name=n, party=p, score=s) for n, p, s in top_details)
+    top_lines = "\n".join(f"  - {n} ({p}): {s}" for n, p, s in top_details)
+
+    # Escape "$" so the partially filled templates can be substituted again
+    shared = {k: str(v).replace("$", "$$") for k, v in
+              {"leader_score": leader_score, "top_rows": top_rows, "top_lines": top_lines}.items()}
+    return EmailContext(
+        mp_scores=mp_scores,
+        mp_html_rows=mp_html_rows,
+        mp_text_lines=mp_text_lines,
+        leader_score=leader_score,
+        html_template=Template(HTML_TEMPLATE.safe_substitute(shared)),
+        text_template=Template(TEXT_TEMPLATE.safe_substitute(shared)),
+        registrations=registrations,
+    )
+
+def render_score_email(context: EmailContext, email: str, name: str, mp_ids) -> dict:
+    """Render one subscriber's email from a prepared context."""
+    # The user's current team comes from their registration, not the subscription
+    team_name = "Your Team"
+    if email in context.registrations:
+        mp_ids, team_name = context.registrations[email]
+        team_name = team_name or "Your Team"
+    mp_ids = [i for i in dict.fromkeys(mp_ids or []) if i in context.mp_scores]
+    team_score = sum(context.mp_scores[i][2] for i in mp_ids)
+    mp_ids.sort(key=lambda i: context.mp_scores[i][2], reverse=True)
+
+    is_ahead = team_score > context.leader_score
+    html_body = context.html_template.substitute(
+        name=name,
+        team_score=team_score,
+        mp_rows="".join(context.mp_html_rows[i] for i in mp_ids),
+        benchmark_msg="You are ahead of the Party Leaders!" if is_ahead else "Keep picking wisely to beat them!",
+    )
+    text_body = context.text_template.substitute(
+        name=name,
+        team_score=team_score,
+        mp_lines="\n".join(context.mp_text_lines[i] for i in mp_ids),
+        text_is_ahead="You are ahead!" if is_ahead else "Keep picking wisely!",
+    )
+    return {
+        "to": email,
+        "subject": f"Your Fantasy Parliament Score: {team_score} points",
+        "html": html_body,
+        "text": text_body,
+    }